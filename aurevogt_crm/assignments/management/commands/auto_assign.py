@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from packages.models import Package
+from packages.services import bulk_assign
 from assignments.models import AssignmentRule, AssignmentBatch
 
 class Command(BaseCommand):
@@ -26,7 +27,7 @@ class Command(BaseCommand):
             if not ids:
                 continue
             if not opts["dry_run"]:
-                Package.objects.filter(id__in=ids).update(assigned_driver=r.driver)
+                bulk_assign(Package.objects.filter(id__in=ids), r.driver)
             assigned += len(ids)
 
         batch = AssignmentBatch.objects.create(
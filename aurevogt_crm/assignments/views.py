@@ -131,13 +131,9 @@ def auto_assign_commit(request, pk):
     assignment = get_object_or_404(Assignment, pk=pk)
     qs = _filtered_unassigned_packages(request, limit=None)
 
-    pkg_ids = list(qs.values_list("id", flat=True))
-    if pkg_ids:
-        # Fijar driver y timestamp en bulk
-        Package.objects.filter(id__in=pkg_ids).update(
-            assigned_driver=assignment.driver,
-            assigned_at=timezone.now(),
-        )
+    # Un UPDATE condicional (sólo los aún sin asignar) y sus eventos "assigned" en bulk
+    from packages.services import bulk_assign
+    bulk_assign(qs, assignment.driver, request.user)
 
     updated_qs = _route_packages_for(assignment)
     return render(request, "assignments/fragments/route_list.html", {
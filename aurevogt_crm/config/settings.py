@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,7 +38,7 @@ INSTALLED_APPS = [
     'crispy_forms',
     'crispy_tailwind',
     'rest_framework','django_filters',
-    'users','drivers','packages.apps.PackagesConfig','assignments','imports','reports',
+    'core','users','drivers','packages.apps.PackagesConfig','assignments','imports','reports',
     
     
 ]
@@ -45,6 +46,10 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'PAGE_SIZE': 50,
 }
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'tailwind'
@@ -88,6 +93,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: transaction.atomic() toma el lock de escritura al empezar y las
+            # escrituras concurrentes esperan (timeout) en vez de fallar con "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Base de tests en archivo: la de memoria compartida bloquea por tabla sin esperar,
+        # y los tests con hilos (packages.tests.ConcurrentAttemptTests) necesitan el timeout.
+        # Va al directorio temporal, fuera del árbol de fuentes
+        'TEST': {'NAME': Path(tempfile.gettempdir()) / 'aurevogt_crm_test.sqlite3'},
     }
 }
 
@@ -54,10 +54,11 @@ from rest_framework.routers import DefaultRouter
 
 # ViewSets existentes (API)
 from drivers.views import DriverViewSet, PingViewSet
-from packages.views import PackageViewSet
+from packages.views import DeliveryViewSet, PackageViewSet, PodUploadViewSet
 
 # Reports (FBV - función)
 from reports.views import productivity_by_driver
+from core.views import metrics_view
 
 # Vistas HTML globales (dashboard / auth simples)
 from config.views import (
@@ -75,6 +76,8 @@ router = DefaultRouter()
 router.register('drivers', DriverViewSet, basename='drivers')
 router.register('pings', PingViewSet, basename='pings')
 router.register('packages', PackageViewSet, basename='packages')
+router.register('deliveries', DeliveryViewSet, basename='deliveries')
+router.register('pod-uploads', PodUploadViewSet, basename='pod-uploads')
 # Nota: cuando tengas ViewSets para assignments e imports, descomenta:
 # from assignments.views import AssignmentViewSet
 # router.register('assignments', AssignmentViewSet, basename='assignments')
@@ -107,5 +110,6 @@ urlpatterns = [
 
     # Reports (funciones)
     path('api/reports/productivity/', productivity_by_driver, name='productivity-by-driver'),
+    path('api/metrics/', metrics_view, name='api-metrics'),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -7,6 +7,7 @@ from django.urls import reverse
 from django.db.models import OuterRef, Subquery, Value, F
 from django.db.models.functions import Coalesce
 from drivers.models import Driver, LocationPing
+from reports.services import inventory_kpis
 
 # Dashboard principal
 @login_required
@@ -37,11 +38,7 @@ def dashboard_view(request):
     )
 
     context = {
-        "kpi": {
-            "today_total": 10,
-            "today_delivered": 8,
-            "today_failed": 2,
-        },
+        "kpi": inventory_kpis(),  # contadores de inventario: unas filas, no un GROUP BY sobre paquetes
         "admin_assignments_url": reverse("admin:index") + "assignments/assignment/",
         "admin_imports_url": reverse("admin:index") + "imports/importbatch/",
         "admin_packages_url": reverse("admin:index") + "packages/package/",
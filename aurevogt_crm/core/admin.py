@@ -1,3 +1,13 @@
 from django.contrib import admin
+from .models import ReasonCode, SpeedXConfig
 
-# Register your models here.
+
+@admin.register(SpeedXConfig)
+class SpeedXConfigAdmin(admin.ModelAdmin):
+    list_display = ("id", "enabled", "api_base")
+
+
+@admin.register(ReasonCode)
+class ReasonCodeAdmin(admin.ModelAdmin):
+    list_display = ("code", "label")
+    search_fields = ("code", "label")
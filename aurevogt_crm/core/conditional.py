@@ -0,0 +1,107 @@
+"""
+GET condicional (ETag / Last-Modified) para listados y detalles de la API.
+
+El validador de un scope (el queryset ya filtrado, sin paginar) sale de un
+único agregado, COUNT y MAX(updated_at). updated_at es auto_now y además lo
+sellan las escrituras masivas (upserts del import, bulk_transition,
+bulk_assign, recepción de camiones, sync), así que un paquete que entra o
+cambia dentro del scope sube el MAX, y uno que sale o se borra baja el
+COUNT. Con If-None-Match vigente la respuesta es 304 sin leer filas ni
+serializar.
+
+Coste: el agregado recorre todas las filas del scope (índice de updated_at
+más los del filtro), unos 3 ms por cada 20k paquetes en SQLite, y se paga
+también en las respuestas completas, porque son las que entregan el ETag
+que el cliente mandará después. Un cliente que no guarda respuestas
+(scripts, exportaciones) puede mandar Cache-Control: no-store y se lo salta.
+
+Last-Modified sólo va en los detalles: en un listado una baja no mueve el
+MAX, y un cliente que sólo mande If-Modified-Since vería datos viejos.
+Tampoco se envía si el último cambio cae en el segundo en curso, porque la
+cabecera tiene resolución de segundos.
+
+Cada respuesta cuenta en las métricas conditional_get.<scope>.hit (304),
+.miss (el cliente mandó validador pero cambió algo) y .full (sin validador).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import metrics
+
+METRIC_PREFIX = "conditional_get."
+
+
+def _etag(request, stats):
+    last = stats["last"]
+    parts = (
+        request.get_full_path(),
+        getattr(request, "accepted_media_type", ""),
+        str(request.user.pk),
+        str(stats["count"]),
+        last.isoformat() if last else "",
+    )
+    return 'W/"%s"' % hashlib.sha1("\n".join(parts).encode()).hexdigest()[:32]
+
+
+def _last_modified(last):
+    if last is None:
+        return None
+    seconds = int(last.timestamp())
+    # Otro cambio en este mismo segundo tendría el mismo Last-Modified
+    if timezone.now().timestamp() < seconds + 1:
+        return None
+    return seconds
+
+
+def _no_store(request):
+    directives = request.META.get("HTTP_CACHE_CONTROL", "").lower().replace(" ", "").split(",")
+    return "no-store" in directives
+
+
+def conditional_get(request, scope, queryset, render, *, field="updated_at", last_modified=False):
+    """
+    304 si el cliente ya tiene la versión vigente de `queryset`; si no,
+    devuelve render() con ETag (y Last-Modified si `last_modified`).
+    `request` es el Request de DRF, ya autenticado y con el renderer negociado.
+    """
+    validated = "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+    if not validated and _no_store(request):
+        # No va a revalidar: ni agregado ni ETag
+        metrics.incr(f"{METRIC_PREFIX}{scope}.full")
+        response = render()
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    stats = queryset.order_by().aggregate(count=Count("pk"), last=Max(field))
+    etag = _etag(request, stats)
+    modified = _last_modified(stats["last"]) if last_modified else None
+    response = get_conditional_response(request._request, etag=etag, last_modified=modified)
+    if response is not None:
+        if response.status_code == 304:
+            metrics.incr(f"{METRIC_PREFIX}{scope}.hit")
+    else:
+        metrics.incr(f"{METRIC_PREFIX}{scope}.{'miss' if validated else 'full'}")
+        response = render()
+        if not 200 <= response.status_code < 300:
+            return response
+    response["ETag"] = etag
+    if modified is not None:
+        response["Last-Modified"] = http_date(modified)
+    # Datos por usuario autenticado: sólo caché privada, y siempre revalidando
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def hit_rates():
+    """{scope: {hit, miss, full, hit_rate}}; hit_rate = 304 / peticiones con validador."""
+    scopes = {}
+    for name, value in metrics.snapshot(METRIC_PREFIX).items():
+        scope, outcome = name[len(METRIC_PREFIX):].rsplit(".", 1)
+        scopes.setdefault(scope, {"hit": 0, "miss": 0, "full": 0})[outcome] = value
+    for counts in scopes.values():
+        validated = counts["hit"] + counts["miss"]
+        counts["hit_rate"] = round(counts["hit"] / validated, 4) if validated else None
+    return scopes
@@ -0,0 +1,36 @@
+"""
+Contadores de operación sencillos sobre el cache de Django.
+
+Los valores viven en el cache, así que con un backend compartido (Redis,
+Memcached) suman lo de todos los workers; con LocMemCache, el default,
+cada proceso cuenta lo suyo. Los nombres se registran en el proceso que
+los incrementa: snapshot() lista los que este worker ya vio.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = "metrics:"
+
+_names = set()
+
+
+def _cache():
+    return caches[getattr(settings, "METRICS_CACHE", "default")]
+
+
+def incr(name, delta=1):
+    _names.add(name)
+    cache, key = _cache(), KEY_PREFIX + name
+    # add() no pisa un valor existente; incr() es atómico en los backends compartidos
+    if not cache.add(key, delta, timeout=None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:  # expulsado entre add() e incr()
+            cache.set(key, delta, timeout=None)
+
+
+def snapshot(prefix=""):
+    """{nombre: valor} de los contadores conocidos que empiezan por `prefix`."""
+    names = sorted(n for n in _names if n.startswith(prefix))
+    values = _cache().get_many([KEY_PREFIX + n for n in names])
+    return {n: values.get(KEY_PREFIX + n, 0) for n in names}
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReasonCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=40, unique=True)),
+                ('label', models.CharField(max_length=120)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SpeedXConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enabled', models.BooleanField(default=False)),
+                ('api_base', models.URLField(blank=True)),
+                ('api_key', models.CharField(blank=True, max_length=128)),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+from rest_framework.response import Response
+
+from .conditional import conditional_get
+from .serializers import serialize_values, values_plan
+
+
+class ValuesListMixin:
+    """
+    list() de sólo lectura sobre queryset.values(): no instancia modelos y
+    convierte cada columna con el campo DRF correspondiente, así que la
+    respuesta es la misma que con el serializer. Si el serializer tiene campos
+    que no salen de una columna, usa el list() normal.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = values_plan(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = {source for _, source, _ in plan}
+        # La paginación por keyset necesita la posición de cada fila aunque no se devuelva
+        columns.add(queryset.model._meta.pk.attname)
+        ordering_field = getattr(self.paginator, "ordering_field", None)
+        if ordering_field:
+            columns.add(ordering_field)
+        rows = queryset.values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_values(page, plan))
+        return Response(serialize_values(rows, plan))
+
+
+class ConditionalGetMixin:
+    """
+    list() y retrieve() con ETag (core.conditional): si el scope filtrado no
+    cambió, 304 antes de paginar o serializar. El detalle lleva además
+    Last-Modified. Las métricas van bajo el basename del router.
+    """
+    conditional_field = "updated_at"
+
+    def list(self, request, *args, **kwargs):
+        return conditional_get(
+            request, f"{self.basename}-list", self.filter_queryset(self.get_queryset()),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+            field=self.conditional_field,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        scope = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup]})
+        # Si no existe, el ETag (COUNT 0) no coincide con nada y retrieve() da el 404 de siempre
+        return conditional_get(
+            request, f"{self.basename}-detail", scope,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+            field=self.conditional_field, last_modified=True,
+        )
@@ -0,0 +1,193 @@
+"""
+Paginación por keyset (cursor) para listados grandes.
+
+En vez de COUNT(*) + OFFSET, cada página filtra a partir de la posición del
+último elemento visto, (campo, id) < (valor, id), y recorre el índice del
+campo de orden: la página 2.000 cuesta lo mismo que la primera. El id
+desempata filas con el mismo timestamp, así que nada se repite ni se salta.
+
+keyset_page() sirve para cualquier vista; KeysetPagination es la versión DRF.
+"""
+import base64
+import datetime
+import json
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk, reverse=False):
+    if isinstance(value, datetime.datetime):
+        value = {"dt": value.isoformat()}
+    payload = json.dumps({"v": value, "id": pk, "r": int(reverse)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(valor, id, reverse) o InvalidCursor."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value, pk, reverse = data["v"], int(data["id"]), bool(data.get("r"))
+        if isinstance(value, dict):
+            value = parse_datetime(value["dt"])
+            if value is None:
+                raise ValueError(cursor)
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursor(cursor) from e
+    return value, pk, reverse
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+def _position(item, field):
+    if isinstance(item, dict):  # querysets .values()
+        return item[field], item["id"]
+    return getattr(item, field), item.pk
+
+
+def keyset_page(queryset, field, cursor=None, size=50):
+    """
+    Una página de `queryset` en orden (-field, -id) a partir de `cursor`.
+
+    Pide size + 1 filas para saber si hay más; los cursores de la página
+    devuelta apuntan a su último elemento (siguiente) y al primero (anterior).
+    """
+    value = pk = None
+    reverse = False
+    if cursor:
+        value, pk, reverse = decode_cursor(cursor)
+    qs = queryset
+    if cursor:
+        op = "gt" if reverse else "lt"
+        # (field, id) < (valor, pk) escrito como field <= valor AND (field < valor OR id < pk):
+        # el primer término es un rango sobre el índice; con sólo el OR, SQLite recorre desde el principio
+        qs = qs.filter(Q(**{f"{field}__{op}e": value}), Q(**{f"{field}__{op}": value}) | Q(**{f"pk__{op}": pk}))
+    qs = qs.order_by(field, "pk") if reverse else qs.order_by(f"-{field}", "-pk")
+    items = list(qs[:size + 1])
+    more = len(items) > size
+    del items[size:]
+    if reverse:
+        items.reverse()
+    # Hacia atrás, "más" significa que quedan páginas anteriores
+    has_next, has_previous = (bool(cursor), more) if reverse else (more, bool(cursor))
+    page = KeysetPage(items)
+    if items and has_next:
+        page.next_cursor = encode_cursor(*_position(items[-1], field))
+    if items and has_previous:
+        page.previous_cursor = encode_cursor(*_position(items[0], field), reverse=True)
+    return page
+
+
+def estimated_count(model, using="default"):
+    """
+    Total aproximado de filas de la tabla sin COUNT(*): estadísticas del
+    planner en PostgreSQL, sqlite_stat1 (tras ANALYZE) en SQLite. None si no hay.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            elif connection.vendor == "sqlite":
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    total = int(str(row[0]).split()[0])
+    return total if total >= 0 else None
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre (ordering_field, id), sin COUNT.
+
+    Los clientes que piden ?page=N o un ?ordering= distinto siguen recibiendo
+    PageNumberPagination, con el mismo formato de siempre.
+    """
+    ordering_field = "created_at"
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    legacy_class = PageNumberPagination
+
+    def __init__(self):
+        self.legacy = None
+        self.page = None
+
+    def _use_legacy(self, request):
+        params = request.query_params
+        return "page" in params or api_settings.ORDERING_PARAM in params
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 50
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(requested, self.max_page_size) if requested > 0 else page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if self._use_legacy(request):
+            self.legacy = self.legacy_class()
+            return self.legacy.paginate_queryset(queryset, request, view)
+        try:
+            self.page = keyset_page(
+                queryset, self.ordering_field,
+                request.query_params.get(self.cursor_query_param), self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound("Cursor inválido.")
+        return self.page.items
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,27 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el encoder de DRF
+    orjson = None
+
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer con orjson. Fechas, Decimal, textos lazy y demás tipos que
+    orjson no maneja igual pasan por el encoder de DRF, así que la salida es
+    la misma. Con indentación (API navegable) o sin orjson instalado, usa el
+    renderer de DRF.
+    """
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_drf_default, option=self.options)
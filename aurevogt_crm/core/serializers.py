@@ -0,0 +1,133 @@
+"""
+Piezas compartidas de los serializers de la API.
+
+- SparseFieldsMixin: ?fields=a,b / ?exclude=c en peticiones GET.
+- values_plan() / serialize_values(): serializa filas de queryset.values()
+  con los mismos campos DRF del serializer, sin instanciar modelos ni pasar
+  por get_attribute. Lo usa core.mixins.ValuesListMixin en los listados.
+"""
+from rest_framework import fields as drf_fields
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer
+
+SAFE_METHODS = ("GET", "HEAD")
+
+# Su to_representation devuelve el valor tal cual llega de la BD
+_PASSTHROUGH = (
+    drf_fields.CharField, drf_fields.ChoiceField, drf_fields.IntegerField,
+    drf_fields.FloatField, drf_fields.BooleanField,
+)
+# Convierten el valor crudo de la columna igual que el atributo del modelo
+# (FileField, en cambio, necesita el FieldFile: esos serializers no usan este camino).
+# Valores iguales dan la misma salida, así que se memoizan por petición.
+_MEMOIZED = (
+    drf_fields.DateField, drf_fields.TimeField, drf_fields.DurationField,
+    drf_fields.DecimalField, drf_fields.UUIDField,
+)
+MEMO_SIZE = 4096
+
+
+def _param_set(request, name):
+    raw = request.query_params.get(name, "")
+    return {f.strip() for f in raw.split(",") if f.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,tracking_number,status devuelve sólo esos campos; ?exclude=
+    quita los indicados. Sólo en GET/HEAD: en escrituras el serializer
+    conserva todos sus campos para validar.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        only, exclude = _param_set(request, "fields"), _param_set(request, "exclude")
+        if not only and not exclude:
+            return
+        unknown = (only | exclude) - set(self.fields)
+        if unknown:
+            raise ValidationError({"fields": f"Campos desconocidos: {', '.join(sorted(unknown))}"})
+        for name in list(self.fields):
+            if (only and name not in only) or name in exclude:
+                self.fields.pop(name)
+
+
+def values_plan(serializer):
+    """
+    [(nombre, columna, conversión)] para serializar filas de .values(), o
+    None si algún campo no sale directo de una columna (métodos, anidados,
+    M2M, fuentes con puntos, archivos) y hay que usar el serializer normal.
+    """
+    concrete = {f.name for f in serializer.Meta.model._meta.concrete_fields}
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (BaseSerializer, ManyRelatedField)) or field.source not in concrete:
+            return None
+        if isinstance(field, RelatedField):
+            if not isinstance(field, PrimaryKeyRelatedField) or field.pk_field is not None:
+                return None
+            convert = None  # .values() ya trae el id
+        elif isinstance(field, _PASSTHROUGH):
+            convert = None
+        elif isinstance(field, drf_fields.DateTimeField):
+            convert = _datetime_converter(field)
+        elif isinstance(field, _MEMOIZED):
+            convert = _memoized(field.to_representation)
+        elif isinstance(field, drf_fields.JSONField):
+            convert = field.to_representation
+        else:
+            return None
+        plan.append((name, field.source, convert))
+    return plan
+
+
+def _memoized(convert):
+    cache = {}
+
+    def memo(value):
+        try:
+            return cache[value]
+        except KeyError:
+            result = convert(value)
+            if len(cache) < MEMO_SIZE:
+                cache[value] = result
+            return result
+    return memo
+
+
+def _datetime_converter(field):
+    """
+    DateTimeField.to_representation con la zona horaria resuelta una sola vez
+    (DRF la busca en cada valor). Formatos distintos de ISO 8601, o datetimes
+    naive, pasan por el campo.
+    """
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    tz = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if tz is None or output_format is None or output_format.lower() != drf_fields.ISO_8601:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def serialize_values(rows, plan):
+    """Lo mismo que serializer.to_representation, fila por fila, sobre dicts de .values()."""
+    data = []
+    for row in rows:
+        item = {}
+        for name, source, convert in plan:
+            value = row[source]
+            item[name] = value if convert is None or value is None else convert(value)
+        data.append(item)
+    return data
@@ -1,3 +1,168 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from drivers.models import Driver
+from packages.models import Package, Warehouse
+from packages.serializers import PackageSerializer
+from .renderers import ORJSONRenderer
+from .serializers import serialize_values
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana")
+        cls.package = Package.objects.create(
+            tracking_number="CG000001", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_partial_save_invalidates_without_touching_last_event_at(self):
+        etag = self.client.get("/api/packages/")["ETag"]
+        self.assertEqual(self.client.get("/api/packages/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        p = Package.objects.get(pk=self.package.pk)
+        p.note = "Dejar en recepción"
+        p.save(update_fields=["note"])
+        p.refresh_from_db()
+        self.assertIsNone(p.last_event_at)
+        self.assertGreater(p.updated_at, self.package.updated_at)
+
+        response = self.client.get("/api/packages/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_validators(self):
+        url = f"/api/packages/{self.package.pk}/"
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get("/api/packages/999999/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 404)
+
+    def test_no_store_skips_the_aggregate(self):
+        with self.assertNumQueries(4):  # sesión, usuario, agregado, página
+            self.client.get("/api/packages/")
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/packages/", HTTP_CACHE_CONTROL="no-store")
+        self.assertNotIn("ETag", response)
+        self.assertEqual(response.json()["results"][0]["tracking_number"], "CG000001")
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana")
+        for n in range(7):
+            Package.objects.create(
+                tracking_number=f"KS{n:06d}", recipient_name="Cliente", addr_street="1 Main St",
+                addr_city="Miami", addr_zip="33101", priority=n % 3,
+            )
+        # Empates en created_at: el id decide el orden dentro de cada grupo
+        now = timezone.now()
+        ids = list(Package.objects.order_by("pk").values_list("pk", flat=True))
+        Package.objects.filter(pk__in=ids[:4]).update(created_at=now)
+        Package.objects.filter(pk__in=ids[4:]).update(created_at=now - datetime.timedelta(hours=1))
+        cls.expected = list(Package.objects.order_by("-created_at", "-pk").values_list("pk", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _ids(self, body):
+        return [p["id"] for p in body["results"]]
+
+    def test_next_and_previous_links_round_trip(self):
+        pages, body = [], self.client.get("/api/packages/?page_size=2").json()
+        self.assertIsNone(body["previous"])
+        pages.append(self._ids(body))
+        while body["next"]:
+            body = self.client.get(body["next"]).json()
+            pages.append(self._ids(body))
+        self.assertNotIn("count", body)
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+        back = []
+        while body["previous"]:
+            body = self.client.get(body["previous"]).json()
+            back.append(self._ids(body))
+        self.assertEqual(back, pages[-2::-1])
+        self.assertIsNone(body["previous"])
+
+    def test_legacy_page_and_ordering_params(self):
+        body = self.client.get("/api/packages/?page=1").json()
+        self.assertEqual((body["count"], self._ids(body)), (7, self.expected))
+
+        body = self.client.get("/api/packages/?ordering=priority").json()
+        self.assertEqual(body["count"], 7)
+        self.assertEqual([p["priority"] for p in body["results"]], [0, 0, 0, 1, 1, 2, 2])
+
+    def test_malformed_cursor_is_404(self):
+        for cursor in ("garbage", "eyJ2IjoxfQ"):  # no es base64 de JSON / le falta el id
+            self.assertEqual(self.client.get(f"/api/packages/?cursor={cursor}").status_code, 404)
+
+
+class ValuesFastPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana")
+        driver = Driver.objects.create(user=User.objects.create_user("luis"), license_number="L-1")
+        warehouse = Warehouse.objects.create(name="Doral")
+        Package.objects.create(
+            tracking_number="VP000001", recipient_name="José Núñez", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", speedx_id="SX-1", priority=2, status="out_for_delivery",
+            weight=Decimal("1.50"), cod_amount=Decimal("20.00"), dest_lat=Decimal("25.774300"),
+            dest_lon=Decimal("-80.193700"), promised_date=datetime.date(2026, 10, 20),
+            warehouse=warehouse, assigned_driver=driver,
+            assigned_at=datetime.datetime(2026, 10, 17, 8, 30, 0, 123456, tzinfo=datetime.timezone.utc),
+            out_for_delivery_at=timezone.now(),
+        )
+        # Sin driver, almacén, decimales ni fechas: todo null
+        Package.objects.create(
+            tracking_number="VP000002", recipient_name="Cliente", addr_street="2 Main St",
+            addr_city="Miami", addr_zip="33101",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _expected(self, params=None):
+        """La página tal como la daría PackageSerializer con el JSONRenderer de DRF."""
+        request = Request(APIRequestFactory().get("/api/packages/", params or {}))
+        packages = Package.objects.order_by("-created_at", "-pk")
+        results = PackageSerializer(packages, many=True, context={"request": request}).data
+        return JSONRenderer().render({"next": None, "previous": None, "results": results})
+
+    def test_same_bytes_as_the_serializer(self):
+        for params in (None, {"fields": "id,assigned_driver,weight,assigned_at,promised_date"}, {"exclude": "note"}):
+            with mock.patch("core.mixins.serialize_values", wraps=serialize_values) as fast_path:
+                response = self.client.get("/api/packages/", params or {}, HTTP_CACHE_CONTROL="no-store")
+            fast_path.assert_called_once()
+            self.assertEqual(response.content, self._expected(params), params)
+        results = response.json()["results"]
+        self.assertEqual(results[1]["weight"], "1.50")
+        self.assertEqual(results[1]["assigned_at"], "2026-10-17T08:30:00.123456Z")
+        self.assertIsNone(results[0]["assigned_driver"])
+
+    def test_renderer_matches_drf_for_non_json_types(self):
+        data = {
+            "when": datetime.datetime(2026, 10, 17, 8, 30, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2026, 10, 17), "amount": Decimal("20.00"), "label": gettext_lazy("Recibido"),
+            "none": None, "ids": [1, 2],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
 
-# Create your tests here.
+    def test_unknown_sparse_field_is_400(self):
+        response = self.client.get("/api/packages/", {"fields": "id,bogus"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": "Campos desconocidos: bogus"})
@@ -1,3 +1,12 @@
-from django.shortcuts import render
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
-# Create your views here.
+from .conditional import hit_rates
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Métricas de operación de la API (por ahora, aciertos de GET condicional por vista)."""
+    return Response({"conditional_get": hit_rates()})
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0003_alter_locationping_options_driver_last_lat_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='locationping',
+            index=models.Index(fields=['captured_at', 'id'], name='drivers_loc_capture_86504e_idx'),
+        ),
+    ]
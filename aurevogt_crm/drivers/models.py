@@ -69,6 +69,7 @@ class LocationPing(models.Model):
         ordering = ["-captured_at"]
         indexes = [
             models.Index(fields=["driver", "captured_at"]),
+            models.Index(fields=["captured_at", "id"]),  # paginación por cursor de /api/pings/
         ]
 
 @receiver(post_save, sender=LocationPing)
@@ -1,12 +1,13 @@
 from rest_framework import serializers
+from core.serializers import SparseFieldsMixin
 from .models import Driver, LocationPing
 
-class DriverSerializer(serializers.ModelSerializer):
+class DriverSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Driver
         fields = '__all__'
 
-class LocationPingSerializer(serializers.ModelSerializer):
+class LocationPingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LocationPing
         fields = '__all__'
\ No newline at end of file
@@ -3,6 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
+from core.conditional import conditional_get
+from core.mixins import ValuesListMixin
+from core.pagination import KeysetPagination
 from .models import Driver, LocationPing
 from .serializers import DriverSerializer, LocationPingSerializer
 from django import forms
@@ -27,7 +30,7 @@ class DriverForm(forms.ModelForm):
             "vehicle": forms.Select(attrs={"class": "border rounded px-3 py-2 w-full"}),
         }
 
-class DriverViewSet(viewsets.ModelViewSet):
+class DriverViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Driver.objects.all().select_related('user','vehicle')
     serializer_class = DriverSerializer
     filterset_fields = ['status']
@@ -36,8 +39,12 @@ class DriverViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def assigned_packages(self, request, pk=None):
         d = self.get_object()
-        qs = d.assigned_packages.all().values('id','tracking_number','status','addr_city','addr_zip')
-        return Response(list(qs))
+        qs = d.assigned_packages.all()
+        # 304 mientras el manifiesto no cambie (ver core.conditional)
+        return conditional_get(
+            request, 'driver-manifest', qs,
+            lambda: Response(list(qs.values('id','tracking_number','status','addr_city','addr_zip'))),
+        )
 
     @action(detail=True, methods=['get'])
     def last_ping(self, request, pk=None):
@@ -47,9 +54,13 @@ class DriverViewSet(viewsets.ModelViewSet):
             ping['lng'] = ping.pop('lon')
         return Response(ping or {})
 
-class PingViewSet(viewsets.ModelViewSet):
+class PingPagination(KeysetPagination):
+    ordering_field = 'captured_at'
+
+class PingViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = LocationPing.objects.all().order_by('-captured_at')
     serializer_class = LocationPingSerializer
+    pagination_class = PingPagination
 
 @login_required
 @permission_required("drivers.view_driver", raise_exception=True)
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import ImportBatch, ImportErrorRow, TruckReceipt, TruckReceiptItem
 
 @admin.register(ImportBatch)
@@ -12,19 +12,23 @@ class ImportBatchAdmin(admin.ModelAdmin):
         "total_records",
         "success_count",
         "error_count",
+        "checkpoint_row",
     )
     list_filter = ("status", "source", "imported_at")
     search_fields = ("file_name", "created_by__username", "created_by__email")
     date_hierarchy = "imported_at"
-    readonly_fields = ("imported_at",)
+    readonly_fields = ("imported_at", "checkpoint_row", "checkpoint_at")
     actions = ["quick_import"]
 
-    @admin.action(description="Quick import selected batch")
+    @admin.action(description="Quick import selected batch (reanuda desde el checkpoint)")
     def quick_import(self, request, queryset):
+        from .tasks import resume_batch  # import local: tasks importa los servicios de import
+
         for batch in queryset:
-            # lógica placeholder de quick import
-            # aquí podrías llamar un servicio de procesamiento directo
-            self.message_user(request, f"Quick import triggered for batch {batch.id}")
+            if resume_batch(batch):
+                self.message_user(request, f"Batch {batch.id} reanudado desde la fila {batch.checkpoint_row}")
+            else:
+                self.message_user(request, f"Batch {batch.id} no se puede reanudar ({batch.status})", messages.WARNING)
 
 @admin.register(ImportErrorRow)
 class ImportErrorRowAdmin(admin.ModelAdmin):
@@ -0,0 +1,85 @@
+"""
+Generador de manifiestos SpeedX sintéticos para benchmarks de importación.
+
+Produce un CSV con las columnas que leen los importadores, con una fracción
+configurable de filas inválidas y de trackings repetidos. Es determinista
+para una misma semilla, así que dos corridas comparan el mismo archivo.
+"""
+import csv
+import random
+from datetime import date, timedelta
+
+COLUMNS = [
+    "tracking_number", "speedx_id", "recipient_name", "customer_phone",
+    "addr_street", "addr_city", "addr_state", "addr_zip",
+    "note", "weight", "cod_amount", "dest_lat", "dest_lon",
+    "promised_date", "priority", "warehouse", "driver_username",
+]
+
+FIRST_NAMES = ["Maria", "José", "Ana", "Luis", "Carmen", "Carlos", "Laura", "Pedro", "Sofia", "Miguel", "John", "Emily"]
+LAST_NAMES = ["Garcia", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Perez", "Smith", "Johnson", "Diaz"]
+STREETS = ["NW 7th St", "SW 8th St", "Biscayne Blvd", "Flagler St", "Coral Way", "NW 36th St", "Collins Ave", "Bird Rd"]
+AREAS = [  # (ciudad, zips, lat, lon)
+    ("Miami", ["33101", "33125", "33130", "33135"], 25.7617, -80.1918),
+    ("Doral", ["33166", "33172", "33178"], 25.8195, -80.3553),
+    ("Hialeah", ["33010", "33012", "33016"], 25.8576, -80.2781),
+    ("Miami Beach", ["33139", "33140", "33141"], 25.7907, -80.1300),
+    ("Kendall", ["33156", "33176", "33183"], 25.6793, -80.3173),
+]
+WAREHOUSES = ["MIA-01", "MIA-02", "DOR-01"]
+NOTES = ["", "", "", "Dejar en recepción", "Llamar antes", "Frágil", "Portón negro"]
+
+
+def _bad_row(rnd, row):
+    """Estropea la fila de una forma que el normalizador rechaza."""
+    kind = rnd.randrange(3)
+    if kind == 0:
+        row["recipient_name"] = ""
+    elif kind == 1:
+        row["tracking_number"] = ""
+    else:
+        row["priority"] = "alta"
+    return row
+
+
+def generate_manifest(path, rows, *, error_rate=0.01, dup_rate=0.02, drivers=(), seed=42):
+    """
+    Escribe `rows` filas en `path`. `drivers` son usernames para preasignar
+    (se mezcla alguno inexistente, como en los manifiestos reales).
+    """
+    rnd = random.Random(seed)
+    drivers = list(drivers) + ["driver_inexistente"]
+    today = date.today()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=COLUMNS)
+        w.writeheader()
+        for i in range(rows):
+            if i and rnd.random() < dup_rate:
+                n = rnd.randrange(i)  # re-envío de un tracking anterior
+            else:
+                n = i
+            city, zips, lat, lon = rnd.choice(AREAS)
+            promised = today + timedelta(days=rnd.randrange(0, 5))
+            row = {
+                "tracking_number": f"SPXUS{n:010d}",
+                "speedx_id": f"SX{n:09d}",
+                "recipient_name": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                "customer_phone": f"({rnd.choice(['305', '786'])}) {rnd.randrange(200, 999)}-{rnd.randrange(10000):04d}",
+                "addr_street": f"{rnd.randrange(1, 19999)} {rnd.choice(STREETS)}",
+                "addr_city": city,
+                "addr_state": "FL",
+                "addr_zip": rnd.choice(zips),
+                "note": rnd.choice(NOTES),
+                "weight": f"{rnd.uniform(0.1, 30):.2f}",
+                "cod_amount": f"{rnd.uniform(5, 200):.2f}" if rnd.random() < 0.05 else "",
+                "dest_lat": f"{lat + rnd.uniform(-0.05, 0.05):.6f}",
+                "dest_lon": f"{lon + rnd.uniform(-0.05, 0.05):.6f}",
+                # ambos formatos que acepta el importador
+                "promised_date": promised.isoformat() if rnd.random() < 0.8 else promised.strftime("%m/%d/%Y"),
+                "priority": str(rnd.choice([0, 0, 0, 1, 2])),
+                "warehouse": rnd.choice(WAREHOUSES),
+                "driver_username": rnd.choice(drivers) if rnd.random() < 0.1 else "",
+            }
+            if rnd.random() < error_rate:
+                row = _bad_row(rnd, row)
+            w.writerow(row)
@@ -1,45 +1,48 @@
-import csv, os
+import os
 from django.core.management.base import BaseCommand, CommandError
-from django.utils import timezone
-from packages.models import Package
 from imports.models import ImportBatch
+from imports.normalizers import read_csv
+from imports.services import PackageUpserter, finish_batch
+from imports.validation import DRY_RUN_MAX_ERRORS, dry_run
 
 class Command(BaseCommand):
     help = "Importa paquetes desde CSV (cabeceras: tracking_number,recipient_name,addr_street,addr_city,addr_state,addr_zip,customer_phone)"
 
     def add_arguments(self, parser):
         parser.add_argument('csv_path', type=str)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Sólo valida el archivo (columnas, errores por tipo); no escribe nada')
+        parser.add_argument('--max-errors', type=int, default=DRY_RUN_MAX_ERRORS,
+                            help='--dry-run: se detiene tras N errores')
+        parser.add_argument('--sample', type=float, default=1.0,
+                            help='--dry-run: fracción de filas a validar (0-1)')
 
     def handle(self, *args, **opts):
         path = opts['csv_path']
         if not os.path.exists(path):
             raise CommandError(f'No existe {path}')
-        ib = ImportBatch.objects.create(source='csv', file_name=os.path.basename(path), status='running')
-        total = ok = err = 0
-        with open(path, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                total += 1
-                try:
-                    Package.objects.update_or_create(
-                        tracking_number=row['tracking_number'],
-                        defaults=dict(
-                            recipient_name=row.get('recipient_name',''),
-                            addr_street=row.get('addr_street',''),
-                            addr_city=row.get('addr_city',''),
-                            addr_state=row.get('addr_state',''),
-                            addr_zip=row.get('addr_zip',''),
-                            customer_phone=row.get('customer_phone',''),
-                            status='received',
-                        )
-                    )
-                    ok += 1
-                except Exception as e:
-                    err += 1
-                    self.stderr.write(f'Error fila {total}: {e}')
-        ib.total_records = total
-        ib.success_count = ok
-        ib.error_count = err
-        ib.status = 'done'
-        ib.save()
-        self.stdout.write(self.style.SUCCESS(f'Importados OK={ok} ERR={err}'))
\ No newline at end of file
+        if opts['dry_run']:
+            try:
+                with open(path, newline='', encoding='utf-8') as f:
+                    report = dry_run(f, max_errors=opts['max_errors'], sample=opts['sample'])
+            except UnicodeDecodeError as e:
+                raise CommandError(f'{path} no es UTF-8: {e}')
+            for line in report.lines():
+                self.stdout.write(line)
+            return
+        # Mismo normalizador y upserter que el import web: el --dry-run predice lo que pasa aquí
+        ib = ImportBatch.objects.create(source='csv', file_name=os.path.basename(path), status='processing')
+        upserter = PackageUpserter(ib, status='received')
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                _, rows = read_csv(f)
+                for idx, row in enumerate(rows, start=1):
+                    upserter.feed(idx, row)
+        except UnicodeDecodeError as e:
+            ImportBatch.objects.filter(pk=ib.pk).update(status='failed')
+            raise CommandError(f'{path} no es UTF-8: {e}')
+        upserter.close()
+        finish_batch(ib, upserter)
+        if upserter.errors:
+            self.stderr.write(f'{upserter.errors} filas con error; detalle en el batch {ib.pk}')
+        self.stdout.write(self.style.SUCCESS(f'Importados OK={upserter.success} ERR={upserter.errors}'))
@@ -0,0 +1,206 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from drivers.models import Driver
+from imports.bench import WAREHOUSES, generate_manifest
+from imports.models import ImportBatch
+from packages.models import Warehouse
+
+PATHS = ("web", "speedx", "generic")
+DRIVERS = ["bench_driver_1", "bench_driver_2", "bench_driver_3"]
+
+
+class _QueryCounter:
+    """execute_wrapper que sólo cuenta (CaptureQueriesContext guardaría 1M de SQL en memoria)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de los importadores (web, import_speedx_csv y el comando CSV genérico) "
+        "sobre manifiestos SpeedX sintéticos. Cada corrida usa una BD SQLite nueva en un "
+        "subproceso y reporta filas/s, nº de queries y pico de RSS; los resultados se guardan en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+        parser.add_argument("--error-rate", type=float, default=0.01, help="Fracción de filas inválidas")
+        parser.add_argument("--dup-rate", type=float, default=0.02, help="Fracción de trackings repetidos")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Archivo JSON de resultados (por defecto benchmarks/imports-<fecha>.json)")
+        parser.add_argument("--compare", help="JSON de una corrida anterior para comparar filas/s")
+        parser.add_argument("--keep-files", action="store_true", help="No borra los CSV ni las BDs temporales")
+        # Uso interno: una corrida aislada dentro del subproceso
+        parser.add_argument("--child", choices=PATHS, help=argparse.SUPPRESS)
+        parser.add_argument("--csv", help=argparse.SUPPRESS)
+        parser.add_argument("--db", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **opts):
+        if opts["child"]:
+            return self._run_child(opts)
+
+        workdir = tempfile.mkdtemp(prefix="bench_imports_")
+        results = []
+        try:
+            for size in opts["sizes"]:
+                csv_path = os.path.join(workdir, f"speedx_{size}.csv")
+                generate_manifest(
+                    csv_path, size, error_rate=opts["error_rate"], dup_rate=opts["dup_rate"],
+                    drivers=DRIVERS, seed=opts["seed"],
+                )
+                for path in opts["paths"]:
+                    result = self._spawn(path, csv_path, os.path.join(workdir, f"{path}_{size}.sqlite3"))
+                    if result is None:
+                        continue
+                    result["rows"] = size
+                    results.append(result)
+                    self.stdout.write(
+                        f"{path:>8} {size:>9} filas  {result['seconds']:>8.2f}s  "
+                        f"{result['rows_per_sec']:>9.0f} filas/s  {result['queries']:>8} queries  "
+                        f"{result['peak_rss_mb']:>7.1f} MB"
+                    )
+        finally:
+            if opts["keep_files"]:
+                self.stdout.write(f"Archivos en {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "git_rev": self._git_rev(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpu_count": os.cpu_count(),
+            "params": {k: opts[k] for k in ("sizes", "paths", "error_rate", "dup_rate", "seed")},
+            "results": results,
+        }
+        output = opts["output"] or os.path.join(
+            settings.BASE_DIR, "benchmarks", f"imports-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Resultados en {output}"))
+
+        if opts["compare"]:
+            self._compare(opts["compare"], results)
+
+    # ---------- proceso padre ----------
+    def _spawn(self, path, csv_path, db_path):
+        manage_py = os.path.join(settings.BASE_DIR, "manage.py")
+        proc = subprocess.run(
+            [sys.executable, manage_py, "bench_imports", "--child", path, "--csv", csv_path, "--db", db_path],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            self.stderr.write(f"{path}: la corrida falló\n{proc.stderr}")
+            return None
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def _compare(self, previous_path, results):
+        try:
+            with open(previous_path, encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"No se pudo leer {previous_path}: {e}")
+        before = {(r["path"], r["rows"]): r["rows_per_sec"] for r in previous.get("results", [])}
+        for r in results:
+            old = before.get((r["path"], r["rows"]))
+            if not old:
+                continue
+            delta = (r["rows_per_sec"] - old) / old * 100
+            style = self.style.ERROR if delta < -10 else self.style.SUCCESS
+            self.stdout.write(style(f"{r['path']:>8} {r['rows']:>9} filas  {old:.0f} → {r['rows_per_sec']:.0f} filas/s ({delta:+.1f}%)"))
+
+    def _git_rev(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    # ---------- subproceso ----------
+    def _run_child(self, opts):
+        conn = connections["default"]
+        conn.close()
+        conn.settings_dict["NAME"] = opts["db"]
+        settings.MEDIA_ROOT = os.path.join(os.path.dirname(opts["db"]), "media")
+        call_command("migrate", verbosity=0)
+
+        warehouse = Warehouse.objects.create(name=WAREHOUSES[0])
+        User = get_user_model()
+        for username in DRIVERS:
+            Driver.objects.create(user=User.objects.create_user(username=username), license_number=username)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        counter = _QueryCounter()
+        runner = getattr(self, f"_path_{opts['child']}")
+        with conn.execute_wrapper(counter):
+            t0 = time.perf_counter()
+            batch = runner(opts["csv"], warehouse)
+            seconds = time.perf_counter() - t0
+        batch.refresh_from_db()
+
+        # ru_maxrss está en KB en Linux; el parseo en paralelo cuenta en RUSAGE_CHILDREN
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        self.stdout.write(json.dumps({
+            "path": opts["child"],
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(batch.total_records / seconds, 1) if seconds else 0,
+            "queries": counter.count,
+            "peak_rss_mb": round(peak / 1024, 1),
+            "rss_before_mb": round(rss_before / 1024, 1),
+            "total": batch.total_records,
+            "success": batch.success_count,
+            "errors": batch.error_count,
+        }))
+
+    def _path_web(self, csv_path, warehouse):
+        """Lo que ejecuta el worker en segundo plano de imports:form."""
+        from imports.services import finish_batch
+        from imports.tasks import import_local_file
+
+        batch = ImportBatch.objects.create(source="speedx_csv", file_name=os.path.basename(csv_path))
+        finish_batch(batch, import_local_file(batch, csv_path))
+        return batch
+
+    def _path_speedx(self, csv_path, warehouse):
+        call_command("import_speedx_csv", csv_path, warehouse_id=warehouse.id, stdout=io.StringIO())
+        return ImportBatch.objects.latest("id")
+
+    def _path_generic(self, csv_path, warehouse):
+        from imports.management.commands import Command as GenericImportCommand
+
+        call_command(GenericImportCommand(), csv_path, stdout=io.StringIO(), stderr=io.StringIO())
+        return ImportBatch.objects.latest("id")
@@ -1,59 +1,57 @@
-import csv
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from packages.models import Package, Warehouse
-from imports.models import ImportBatch, ImportErrorRow
-
-CHUNK = 1000  # tamaño de lote
+from django.core.management.base import BaseCommand, CommandError
+from packages.models import Warehouse
+from imports.models import ImportBatch
+from imports.parallel import default_workers, import_csv_path
+from imports.services import finish_batch
+from imports.validation import DRY_RUN_MAX_ERRORS, dry_run
 
 class Command(BaseCommand):
     help = "Importa paquetes desde un CSV de SpeedX"
 
     def add_arguments(self, parser):
         parser.add_argument("csv_path")
-        parser.add_argument("--warehouse-id", type=int, required=True)
+        parser.add_argument("--warehouse-id", type=int, help="Obligatorio salvo con --dry-run")
+        parser.add_argument("--workers", type=int, default=default_workers(),
+                            help="Procesos de parseo/validación (por defecto: nº de CPUs)")
+        parser.add_argument("--resume", type=int, metavar="BATCH_ID",
+                            help="Continúa un import caído desde su checkpoint en vez de crear otro batch")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Sólo valida el archivo (columnas, errores por tipo); no escribe nada")
+        parser.add_argument("--max-errors", type=int, default=DRY_RUN_MAX_ERRORS,
+                            help="--dry-run: se detiene tras N errores")
+        parser.add_argument("--sample", type=float, default=1.0,
+                            help="--dry-run: fracción de filas a validar (0-1)")
 
     def handle(self, *args, **opts):
         csv_path = opts["csv_path"]
+        if opts["dry_run"]:
+            try:
+                with open(csv_path, newline="", encoding="utf-8") as f:
+                    report = dry_run(f, max_errors=opts["max_errors"], sample=opts["sample"], start=2)
+            except UnicodeDecodeError as e:
+                raise CommandError(f"{csv_path} no es UTF-8: {e}")
+            for line in report.lines():
+                self.stdout.write(line)
+            return
+        if opts["warehouse_id"] is None:
+            raise CommandError("--warehouse-id es obligatorio")
         wh = Warehouse.objects.get(id=opts["warehouse_id"])
 
-        batch = ImportBatch.objects.create(source="speedx_csv", file_name=csv_path, status="processing")
-        to_create = []
-        successes = errors = 0
-
-        with open(csv_path, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader, start=2):  # header = 1
-                try:
-                    pkg = Package(
-                        tracking_number=row["tracking_number"].strip(),
-                        speedx_id=row.get("speedx_id") or None,
-                        recipient_name=row["recipient_name"].strip(),
-                        customer_phone=row.get("customer_phone",""),
-                        addr_street=row["addr_street"].strip(),
-                        addr_city=(row.get("addr_city") or "").strip(),
-                        addr_state=(row.get("addr_state") or "").strip(),
-                        addr_zip=(row.get("addr_zip") or "").strip(),
-                        warehouse=wh,
-                        status="received",
-                    )
-                    to_create.append(pkg)
-                    if len(to_create) >= CHUNK:
-                        Package.objects.bulk_create(to_create, ignore_conflicts=True)
-                        successes += len(to_create)
-                        to_create = []
-                except Exception as e:
-                    errors += 1
-                    ImportErrorRow.objects.create(batch=batch, row_number=i, payload=row, error=str(e))
-
-        if to_create:
-            Package.objects.bulk_create(to_create, ignore_conflicts=True)
-            successes += len(to_create)
-
-        batch.total_records = successes + errors
-        batch.success_count = successes
-        batch.error_count = errors
-        batch.status = "done" if errors == 0 else "failed"
-        batch.save()
-
-        self.stdout.write(self.style.SUCCESS(f"Import OK: {successes}, errors: {errors}"))
\ No newline at end of file
+        if opts["resume"]:
+            batch = ImportBatch.objects.filter(pk=opts["resume"]).first()
+            if batch is None or batch.status not in ("processing", "failed"):
+                raise CommandError(f"El batch {opts['resume']} no existe o ya terminó")
+            if batch.status == "failed":
+                ImportBatch.objects.filter(pk=batch.pk).update(status="processing")
+            self.stdout.write(f"Reanudando batch {batch.pk} desde la fila {batch.checkpoint_row}")
+        else:
+            batch = ImportBatch.objects.create(source="speedx_csv", file_name=csv_path, status="processing")
+        # Parseo en `--workers` procesos; este proceso es el único que escribe.
+        # Las filas se numeran por línea del archivo (cabecera = 1).
+        upserter = import_csv_path(
+            batch, csv_path, workers=opts["workers"], start=2,
+            warehouse_id=wh.id, status="received",
+        )
+        finish_batch(batch, upserter)
+
+        self.stdout.write(self.style.SUCCESS(f"Import OK: {upserter.success}, errors: {upserter.errors}"))
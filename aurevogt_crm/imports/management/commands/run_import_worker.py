@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from imports.tasks import pending_batches, run_batch
+
+
+class Command(BaseCommand):
+    help = "Procesa los ImportBatch en cola (status=processing sin worker asignado o con un worker caído)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Vacía la cola y termina")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Segundos entre sondeos")
+
+    def handle(self, *args, **opts):
+        while True:
+            ids = list(pending_batches().values_list("id", flat=True))
+            for batch_id in ids:
+                if run_batch(batch_id):
+                    self.stdout.write(self.style.SUCCESS(f"Batch {batch_id} procesado"))
+            if opts["once"]:
+                break
+            if not ids:
+                time.sleep(opts["sleep"])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0003_importerrorrow_truckreceipt_truckreceiptitem_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='processed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='upload_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0004_importbatch_processed_count_importbatch_started_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='created_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='unchanged_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='updated_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
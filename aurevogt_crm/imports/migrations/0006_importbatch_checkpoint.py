@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0005_importbatch_created_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='checkpoint_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='checkpoint_row',
+            field=models.IntegerField(default=0),
+        ),
+    ]
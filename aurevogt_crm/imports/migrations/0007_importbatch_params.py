@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0006_importbatch_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
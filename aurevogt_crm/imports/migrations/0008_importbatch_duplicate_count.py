@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0007_importbatch_params'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='duplicate_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:14
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_items(apps, schema_editor):
+    # Escaneos concurrentes pudieron duplicar inesperados: se conserva el primero
+    TruckReceiptItem = apps.get_model('imports', 'TruckReceiptItem')
+    duplicated = (
+        TruckReceiptItem.objects.values('receipt_id', 'tracking_number')
+        .annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1)
+    )
+    for dup in duplicated:
+        TruckReceiptItem.objects.filter(
+            receipt_id=dup['receipt_id'], tracking_number=dup['tracking_number'],
+        ).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0008_importbatch_duplicate_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='truckreceiptitem',
+            constraint=models.UniqueConstraint(fields=('receipt', 'tracking_number'), name='unique_receipt_tracking'),
+        ),
+    ]
@@ -13,7 +13,17 @@ class ImportBatch(models.Model):
     total_records = models.IntegerField(default=0)
     success_count = models.IntegerField(default=0)
     error_count = models.IntegerField(default=0)
+    processed_count = models.IntegerField(default=0)  # filas leídas hasta ahora (progreso)
+    created_count = models.IntegerField(default=0)    # paquetes nuevos
+    updated_count = models.IntegerField(default=0)    # paquetes existentes con cambios
+    unchanged_count = models.IntegerField(default=0)  # filas idénticas a lo guardado (sin escritura)
+    duplicate_count = models.IntegerField(default=0)  # filas pisadas por otra con el mismo tracking
     report_path = models.CharField(max_length=255, blank=True)  # CSV con errores
+    upload_path = models.CharField(max_length=255, blank=True)  # archivo subido (default_storage)
+    params = models.JSONField(default=dict, blank=True)  # filtros del import por API (date_from, date_to, filter)
+    started_at = models.DateTimeField(null=True, blank=True)  # nulo = en cola, sin worker
+    checkpoint_row = models.IntegerField(default=0)  # última fila confirmada (para reanudar)
+    checkpoint_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ("-imported_at",)
@@ -22,6 +32,31 @@ class ImportBatch(models.Model):
     def __str__(self):
         return f"Import {self.id} {self.source} {self.file_name}"
 
+    @property
+    def can_resume(self):
+        """
+        Un import caído se puede reanudar desde su checkpoint: si falló, o si
+        sigue en 'processing' pero lleva IMPORT_STALE_MINUTES sin confirmar un bloque.
+        """
+        if not self.upload_path and self.source != "speedx_api":
+            return False
+        if self.status == "failed":
+            return True
+        if self.status != "processing" or self.started_at is None:
+            return False
+        from datetime import timedelta
+        from django.utils import timezone
+        stale = timedelta(minutes=getattr(settings, "IMPORT_STALE_MINUTES", 10))
+        return timezone.now() - (self.checkpoint_at or self.started_at) > stale
+
+    @property
+    def report_url(self):
+        """Descarga del reporte de errores (CSV gzip), si el import generó uno."""
+        if not self.report_path:
+            return ""
+        from django.urls import reverse
+        return reverse("imports:report", args=[self.pk])
+
 class ImportErrorRow(models.Model):
     batch = models.ForeignKey(ImportBatch, related_name="errors", on_delete=models.CASCADE)
     row_number = models.IntegerField()
@@ -41,5 +76,10 @@ class TruckReceipt(models.Model):
 class TruckReceiptItem(models.Model):
     receipt = models.ForeignKey(TruckReceipt, related_name="items", on_delete=models.CASCADE)
     tracking_number = models.CharField(max_length=64, db_index=True)
-    status = models.CharField(max_length=20, default="staged")  # staged|received|missing
-    notes = models.CharField(max_length=200, blank=True)
\ No newline at end of file
+    status = models.CharField(max_length=20, default="staged")  # staged|received|missing|unexpected
+    notes = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["receipt", "tracking_number"], name="unique_receipt_tracking"),
+        ]
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Normalización de filas del CSV de SpeedX.
+
+Módulo sin dependencias de Django: lo usan el importador web, los comandos
+de gestión y los procesos del parseo en paralelo (que no inicializan Django).
+La cabecera también se lee aquí (clean_header / read_csv), para que el dry
+run, el import en serie y el paralelo vean las mismas columnas.
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Orden de las claves devueltas por normalize_row(); los procesos de parseo
+# devuelven tuplas en este orden para no serializar un dict por fila.
+NORMALIZED_FIELDS = (
+    "tracking_number", "speedx_id", "priority", "recipient_name", "customer_phone",
+    "addr_street", "addr_city", "addr_state", "addr_zip", "note",
+    "weight", "cod_amount", "dest_lat", "dest_lon", "promised_date",
+    "warehouse_name", "driver_username",
+)
+
+# Columnas del CSV que lee normalize_row ("tracking" es alias de
+# "tracking_number") y las que tiene que traer toda fila importable.
+INPUT_COLUMNS = (
+    "tracking_number", "tracking", "speedx_id", "priority", "recipient_name", "customer_phone",
+    "addr_street", "addr_city", "addr_state", "addr_zip", "note",
+    "weight", "cod_amount", "dest_lat", "dest_lon", "promised_date",
+    "warehouse", "driver_username",
+)
+REQUIRED_COLUMNS = ("tracking_number", "recipient_name", "addr_street", "addr_city", "addr_zip")
+# Columnas que normalize_row deja en None si no las entiende (sin error)
+LENIENT_COLUMNS = ("weight", "cod_amount", "dest_lat", "dest_lon", "promised_date")
+
+
+def _s(row, key):
+    return (row.get(key) or "").strip()
+
+
+def _d(n):
+    if n is None:
+        return None
+    s = str(n).strip()
+    if not s:
+        return None
+    try:
+        return Decimal(s)
+    except InvalidOperation:
+        return None
+
+
+def _date(v):
+    if not v:
+        return None
+    s = str(v).strip()
+    if not s:
+        return None
+    # intenta YYYY-MM-DD, luego MM/DD/YYYY
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def normalize_row(row):
+    """
+    Valida y normaliza una fila del CSV de SpeedX.
+
+    Devuelve un dict con los campos de Package más dos claves auxiliares
+    (`warehouse_name`, `driver_username`) que se resuelven por bloque.
+    Lanza ValueError si la fila no es importable.
+    """
+    tracking = (row.get("tracking_number") or row.get("tracking") or "").strip()
+    if not tracking:
+        raise ValueError("Falta número de tracking (tracking_number)")
+
+    recipient_name = _s(row, "recipient_name")
+    addr_street = _s(row, "addr_street")
+    addr_city = _s(row, "addr_city")
+    addr_zip = _s(row, "addr_zip")
+    if not recipient_name or not addr_street or not addr_city or not addr_zip:
+        raise ValueError("Faltan columnas mínimas: recipient_name, addr_street, addr_city, addr_zip")
+
+    return {
+        "tracking_number": tracking,
+        "speedx_id": _s(row, "speedx_id") or None,
+        "priority": int(str(row.get("priority") or "0").strip() or 0),
+        "recipient_name": recipient_name,
+        "customer_phone": _s(row, "customer_phone"),
+        "addr_street": addr_street,
+        "addr_city": addr_city,
+        "addr_state": _s(row, "addr_state"),
+        "addr_zip": addr_zip,
+        "note": _s(row, "note"),
+        "weight": _d(row.get("weight")),
+        "cod_amount": _d(row.get("cod_amount")),
+        "dest_lat": _d(row.get("dest_lat")),
+        "dest_lon": _d(row.get("dest_lon")),
+        "promised_date": _date(row.get("promised_date")),
+        "warehouse_name": _s(row, "warehouse"),
+        "driver_username": _s(row, "driver_username"),
+    }
+
+
+def to_tuple(fields):
+    return tuple(fields[k] for k in NORMALIZED_FIELDS)
+
+
+def from_tuple(values):
+    return dict(zip(NORMALIZED_FIELDS, values))
+
+
+def clean_header(names):
+    """Nombres de columna tal como los busca normalize_row: sin BOM ni espacios alrededor."""
+    return [name.lstrip("\ufeff").strip() for name in names]
+
+
+def read_csv(text_file):
+    """
+    (cabecera, filas) de un CSV abierto en modo texto; cada fila es un dict
+    cabecera -> valor. Las líneas vacías se saltan, como en DictReader.
+    """
+    reader = csv.reader(text_file)
+    header = clean_header(next(reader, []))
+    return header, (dict(zip(header, values)) for values in reader if values)
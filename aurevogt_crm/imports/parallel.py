@@ -0,0 +1,130 @@
+"""
+Parseo/validación en paralelo de CSV grandes de SpeedX.
+
+El archivo se parte en rangos de bytes alineados a fin de línea; cada rango
+lo decodifica y normaliza un proceso de un ProcessPoolExecutor, que devuelve
+tuplas compactas (ver normalizers.NORMALIZED_FIELDS). Un único escritor, en
+el proceso que llama, consume los rangos en orden y hace los upserts.
+
+Supone que ningún campo trae saltos de línea dentro de comillas (los
+manifiestos de SpeedX no los traen); si pudiera ocurrir, usar el import serie.
+
+Este módulo no importa Django al cargarse: los procesos hijos sólo necesitan
+`normalizers`.
+"""
+import csv
+import heapq
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+from .normalizers import clean_header, normalize_row, to_tuple, from_tuple
+
+RANGE_BYTES = 4 * 1024 * 1024  # ~40k filas por rango
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # por debajo no compensa arrancar procesos
+
+
+def read_header(path):
+    """Devuelve (columnas, offset donde empiezan los datos)."""
+    with open(path, "rb") as f:
+        line = f.readline()
+        return clean_header(next(csv.reader([line.decode("utf-8")]), [])), f.tell()
+
+
+def split_ranges(path, data_start, range_bytes=RANGE_BYTES):
+    """Parte [data_start, EOF) en rangos de ~range_bytes que terminan en '\\n'."""
+    size = os.path.getsize(path)
+    ranges = []
+    start = data_start
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + range_bytes, size))
+            f.readline()  # avanza hasta el final de la línea en curso
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(path, start, end, header):
+    """
+    Proceso hijo: normaliza las filas de [start, end).
+
+    Devuelve (n_filas, ok, errores) con ok = [(idx_local, tupla)] y
+    errores = [(idx_local, fila_cruda, mensaje)]; idx_local empieza en 0.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start).decode("utf-8")
+    ok, errors = [], []
+    n = 0
+    for values in csv.reader(io.StringIO(data, newline="")):
+        if not values:
+            continue  # igual que DictReader: las líneas vacías no cuentan
+        row = dict(zip(header, values))
+        try:
+            ok.append((n, to_tuple(normalize_row(row))))
+        except Exception as e:
+            errors.append((n, row, str(e)))
+        n += 1
+    return n, ok, errors
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def iter_parsed_ranges(path, *, workers=None, range_bytes=RANGE_BYTES):
+    """
+    Genera (n_filas, ok, errores) por rango, en el orden del archivo.
+
+    Mantiene como mucho 2*workers rangos en vuelo para acotar la memoria
+    si el escritor va más lento que el parseo.
+    """
+    workers = workers or default_workers()
+    header, data_start = read_header(path)
+    ranges = split_ranges(path, data_start, range_bytes)
+    # spawn: el pool puede arrancar desde un hilo del pool de importación
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        in_flight = deque()
+        it = iter(ranges)
+        for start, end in it:
+            in_flight.append(pool.submit(parse_range, path, start, end, header))
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            result = in_flight.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                in_flight.append(pool.submit(parse_range, path, nxt[0], nxt[1], header))
+            yield result
+
+
+def import_csv_path(batch, path, *, workers=None, start=1, on_progress=None,
+                    range_bytes=RANGE_BYTES, **upserter_kwargs):
+    """
+    Importa `path` parseando en paralelo y escribiendo desde este proceso.
+
+    `start` es el número de la primera fila de datos (1 en la web, 2 en el
+    comando que numera por línea de archivo). Devuelve el upserter.
+    """
+    from .services import PackageUpserter
+
+    upserter = PackageUpserter(batch, **upserter_kwargs)
+    base = start
+    for n, ok, errors in iter_parsed_ranges(path, workers=workers, range_bytes=range_bytes):
+        # En orden de archivo: el checkpoint del upserter es la última fila vista.
+        for item in heapq.merge(ok, errors, key=itemgetter(0)):
+            if len(item) == 3:
+                upserter.reject(base + item[0], item[1], item[2])
+            else:
+                upserter.add(base + item[0], from_tuple(item[1]))
+        base += n
+        if on_progress:
+            on_progress(upserter)
+    upserter.close()
+    return upserter
@@ -0,0 +1,113 @@
+"""
+Recepción de camiones: escaneo de trackings contra lo esperado en un TruckReceipt.
+
+El estado sale siempre de la BD, así que varios workers pueden escanear el
+mismo camión. Por lote de escaneos, dentro de una transacción:
+
+- un SELECT ... FOR UPDATE del estado de los items escaneados, que decide
+  qué se recibe ahora (staged/missing), qué se repite (received/unexpected)
+  y qué no estaba en el recibo;
+- un UPDATE condicional de items y de Package (received → in_warehouse);
+- un bulk_create de los inesperados con ignore_conflicts: la restricción
+  única (receipt, tracking_number) descarta el que otro worker insertó a la vez.
+
+Los totales son un COUNT por estado sobre los items del recibo.
+Un tracking marcado 'missing' al cerrar que aparece después pasa a 'received'.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from packages.models import Package, PackageEvent
+from .models import TruckReceipt, TruckReceiptItem
+
+
+def _clean(scans):
+    return {s.strip() for s in scans if s and s.strip()}
+
+
+def scan_batch(receipt, scans):
+    """
+    Concilia un lote de escaneos (lista de trackings, puede traer repetidos).
+
+    Devuelve un resumen con los trackings recibidos, repetidos e inesperados
+    de este lote y los totales del recibo.
+    """
+    codes = _clean(scans)
+    with transaction.atomic():
+        # Bloqueados hasta el commit: otro lote con los mismos trackings espera y los ve recibidos
+        status_of = dict(
+            TruckReceiptItem.objects.select_for_update()
+            .filter(receipt=receipt, tracking_number__in=codes)
+            .values_list("tracking_number", "status")
+        ) if codes else {}
+        received = {t for t, status in status_of.items() if status in ("staged", "missing")}
+        repeated = {t for t, status in status_of.items() if status in ("received", "unexpected")}
+        unexpected = codes - status_of.keys()
+
+        if received:
+            TruckReceiptItem.objects.filter(
+                receipt=receipt, tracking_number__in=received, status__in=("staged", "missing")
+            ).update(status="received")
+            _move_to_warehouse(receipt, received)
+        if unexpected:
+            TruckReceiptItem.objects.bulk_create(
+                [TruckReceiptItem(receipt=receipt, tracking_number=t, status="unexpected") for t in unexpected],
+                ignore_conflicts=True,
+            )
+
+    return {
+        "received": sorted(received),
+        "repeated": sorted(repeated),
+        "unexpected": sorted(unexpected),
+        **summary(receipt),
+    }
+
+
+def _move_to_warehouse(receipt, trackings):
+    # Filas bloqueadas hasta el commit: los eventos corresponden a lo que mueve el UPDATE
+    ids = list(
+        Package.objects.select_for_update()
+        .filter(tracking_number__in=trackings, status="received")
+        .values_list("id", flat=True)
+    )
+    if not ids:
+        return
+    now = timezone.now()
+    Package.objects.filter(id__in=ids, status="received").update(
+        status="in_warehouse", warehouse_id=receipt.warehouse_id, last_event_at=now, updated_at=now,
+    )
+    PackageEvent.objects.bulk_create([
+        PackageEvent(
+            package_id=pk, type="updated", status_from="received", status_to="in_warehouse",
+            metadata={"truck_receipt": receipt.code},
+        )
+        for pk in ids
+    ])
+
+
+def summary(receipt):
+    """Totales del recibo: esperados, recibidos, pendientes e inesperados."""
+    counts = dict(
+        TruckReceiptItem.objects.filter(receipt=receipt).order_by()
+        .values_list("status").annotate(n=Count("id"))
+    )
+    unexpected = counts.pop("unexpected", 0)
+    expected = sum(counts.values())
+    return {
+        "expected_total": expected,
+        "received_total": counts.get("received", 0),
+        "pending_total": expected - counts.get("received", 0),
+        "unexpected_total": unexpected,
+    }
+
+
+def close_receipt(receipt):
+    """
+    Cierra la descarga: lo esperado que no se escaneó queda como 'missing'.
+    Devuelve cuántos items faltaron.
+    """
+    with transaction.atomic():
+        missing = TruckReceiptItem.objects.filter(receipt=receipt, status="staged").update(status="missing")
+        TruckReceipt.objects.filter(pk=receipt.pk).update(received_at=timezone.now())
+    return missing
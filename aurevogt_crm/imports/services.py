@@ -0,0 +1,515 @@
+"""
+Servicios de importación de paquetes (SpeedX).
+
+La escritura es set-based: las filas se normalizan en Python y se escriben
+por bloques con un único INSERT ... ON CONFLICT (tracking_number) DO UPDATE.
+Almacenes y conductores se resuelven una vez por bloque desde mapas en memoria,
+en lugar de un get_or_create / get por fila.
+
+Imports delta: cada Package guarda la huella (`import_hash`) de los campos que
+escribe el importador; las filas cuya huella no cambió no se escriben.
+
+Como los upserts no pasan por save(), el importador escribe él mismo los
+PackageEvent 'created'/'updated' de cada bloque (un bulk_create por bloque).
+"""
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import json
+from io import TextIOWrapper
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from drivers.models import Driver
+from packages.models import Package, PackageEvent, Warehouse
+from .models import ImportBatch, ImportErrorRow
+from .normalizers import clean_header, normalize_row, read_csv
+
+CHUNK_SIZE = 2000  # filas por INSERT
+PROGRESS_EVERY = 1000  # cada cuántas filas se publican los contadores del batch
+ERROR_ROWS_DB_LIMIT = 1000  # errores guardados en BD por batch; el reporte los lleva todos
+REPORT_DIR = "imports/reports"  # en default_storage
+REPORT_HEADER = ["row_number", "tracking_number", "error", "payload"]
+
+# Campos que el importador sobrescribe cuando el tracking ya existe.
+# `status` queda fuera a propósito: re-enviar el manifiesto no debe devolver
+# a 'in_warehouse' un paquete ya entregado saltándose la FSM.
+UPSERT_FIELDS = [
+    "speedx_id", "priority", "recipient_name", "customer_phone",
+    "addr_street", "addr_city", "addr_state", "addr_zip",
+    "note", "weight", "cod_amount", "dest_lat", "dest_lon",
+    "warehouse", "promised_date", "assigned_driver",
+]
+# Columnas (attname) que entran en la huella: exactamente lo que escribe el upsert.
+FINGERPRINT_ATTNAMES = [Package._meta.get_field(name).attname for name in UPSERT_FIELDS]
+
+
+def import_fingerprint(pkg):
+    """Huella (32 hex) de los campos del import de `pkg`, con FKs ya resueltas."""
+    raw = "\x1f".join(
+        "\x00" if v is None else str(v)
+        for v in (getattr(pkg, attname) for attname in FINGERPRINT_ATTNAMES)
+    )
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ErrorSink:
+    """
+    Destino de las filas con error de un import.
+
+    Las acumula y, en cada flush, escribe el reporte completo de esas filas
+    como una parte CSV gzip en default_storage (REPORT_DIR/batch_<id>/, una
+    parte por flush nombrada por su primera fila) y guarda en ImportErrorRow,
+    con un bulk_create, sólo las primeras `db_limit` para mostrarlas en el
+    detalle sin inflar la tabla. La descarga concatena las partes en orden
+    (report_chunks): miembros gzip seguidos forman un único .csv.gz.
+    Con `buffer_size=None` sólo escribe cuando se le pide (lo usa el upserter
+    para que los errores se confirmen junto con su bloque).
+
+    La parte se escribe dentro de la transacción del bloque, pero el storage
+    no participa de ella: si el bloque se revierte, la parte queda. Por eso
+    al crear el sink se borran las partes posteriores al checkpoint del
+    batch. Un import reanudado vuelve a escribir esas filas una sola vez.
+    """
+
+    def __init__(self, batch, *, buffer_size=CHUNK_SIZE, db_limit=None):
+        self.batch = batch
+        self.buffer_size = buffer_size
+        self.db_limit = error_rows_db_limit() if db_limit is None else db_limit
+        self.report_path = batch.report_path
+        self.stored = batch.errors.count() if batch.report_path else 0
+        self._rows = []      # filas del reporte
+        self._db_rows = []   # ImportErrorRow pendientes
+        self._discard_uncommitted()
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def add(self, row_number, row, error):
+        error = str(error)
+        tracking = (row.get("tracking_number") or row.get("tracking") or "") if row else ""
+        self._rows.append([row_number, tracking, error, json.dumps(row, default=str, ensure_ascii=False)])
+        if self.stored + len(self._db_rows) < self.db_limit:
+            self._db_rows.append(ImportErrorRow(batch=self.batch, row_number=row_number, payload=row, error=error))
+        if self.buffer_size and len(self._rows) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._db_rows:
+            ImportErrorRow.objects.bulk_create(self._db_rows)
+            self.stored += len(self._db_rows)
+            self._db_rows = []
+        if self._rows:
+            self._write_part(self._rows)
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        if self.report_path and self.batch.report_path != self.report_path:
+            ImportBatch.objects.filter(pk=self.batch.pk).update(report_path=self.report_path)
+            self.batch.report_path = self.report_path
+
+    def _report_dir(self):
+        return f"{REPORT_DIR}/batch_{self.batch.pk}"
+
+    def _discard_uncommitted(self):
+        if self.report_path.endswith(".gz"):
+            return  # reporte de un solo archivo, de antes de las partes
+        for name in report_parts(self._report_dir()):
+            if int(name.rsplit("/", 1)[1].split(".", 1)[0]) > self.batch.checkpoint_row:
+                default_storage.delete(name)
+
+    def _write_part(self, rows):
+        if not self.report_path:
+            self.report_path = self._report_dir()
+        name = f"{self.report_path}/{min(row[0] for row in rows):010d}.csv.gz"
+        if default_storage.exists(name):
+            default_storage.delete(name)  # las mismas filas otra vez: se reemplazan
+        default_storage.save(name, ContentFile(_gzip_csv(rows)))
+
+
+def error_rows_db_limit():
+    return getattr(settings, "IMPORT_ERROR_ROWS_DB_LIMIT", ERROR_ROWS_DB_LIMIT)
+
+
+def _gzip_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return gzip.compress(buffer.getvalue().encode("utf-8"))
+
+
+def report_parts(report_path):
+    """Archivos del reporte en default_storage, en orden de fila ([] si ya no existen)."""
+    if report_path.endswith(".gz"):  # reporte de un solo archivo, de antes de las partes
+        return [report_path] if default_storage.exists(report_path) else []
+    try:
+        _, files = default_storage.listdir(report_path)
+    except FileNotFoundError:
+        return []
+    return [f"{report_path}/{name}" for name in sorted(files)]
+
+
+def report_chunks(report_path, parts, *, chunk_size=64 * 1024):
+    """Bytes del reporte .csv.gz: la cabecera y cada parte, tal cual, en orden."""
+    if not report_path.endswith(".gz"):
+        yield _gzip_csv([REPORT_HEADER])
+    for name in parts:
+        with default_storage.open(name, "rb") as fh:
+            yield from iter(lambda: fh.read(chunk_size), b"")
+
+
+class PackageUpserter:
+    """
+    Acumula filas del manifiesto y las escribe en bloques de `chunk_size`.
+
+        up = PackageUpserter(batch)
+        for idx, row in enumerate(reader, start=1):
+            up.feed(idx, row)
+        up.close()
+
+    Las filas inválidas (validación o error de BD) van al ErrorSink con su
+    número de fila; el resto del bloque se escribe igual.
+    Con `warehouse_id` todas las filas van a ese almacén (se ignora la columna).
+
+    Cada bloque (paquetes, errores y contadores) se confirma en su propia
+    transacción junto con `batch.checkpoint_row`. Un upserter creado sobre un
+    batch con checkpoint parte de sus contadores y descarta las filas ya
+    confirmadas sin normalizarlas: así se reanuda un import caído.
+    """
+
+    def __init__(self, batch, *, chunk_size=CHUNK_SIZE, status="in_warehouse", warehouse_id=None):
+        self.batch = batch
+        self.chunk_size = chunk_size
+        self.status = status
+        self.warehouse_id = warehouse_id
+        self.checkpoint = self._last_row = batch.checkpoint_row
+        self.total = batch.total_records if self.checkpoint else 0
+        self.success = batch.success_count if self.checkpoint else 0
+        self.errors = batch.error_count if self.checkpoint else 0
+        self.created = batch.created_count if self.checkpoint else 0
+        self.updated = batch.updated_count if self.checkpoint else 0
+        self.unchanged = batch.unchanged_count if self.checkpoint else 0
+        self.duplicates = batch.duplicate_count if self.checkpoint else 0
+        self.sink = ErrorSink(batch, buffer_size=None)
+        self._pending = []      # [(row_number, raw_row | None, fields)]
+        self._warehouses = {}   # name -> id
+        self._drivers = {}      # username -> id | None
+
+    # ---------- API pública ----------
+    def feed(self, row_number, row):
+        """Normaliza y encola una fila cruda del CSV."""
+        if row_number <= self.checkpoint:
+            return
+        try:
+            fields = normalize_row(row)
+        except Exception as e:
+            self.reject(row_number, row, e)
+            return
+        self.add(row_number, fields, row)
+
+    def add(self, row_number, fields, row=None):
+        """Encola una fila ya normalizada (p. ej. por un proceso de parseo)."""
+        if row_number <= self.checkpoint:
+            return
+        self.total += 1
+        self._last_row = row_number
+        self._pending.append((row_number, row, fields))
+        self._maybe_flush()
+
+    def reject(self, row_number, row, error):
+        """Cuenta una fila inválida detectada antes de llegar al upserter."""
+        if row_number <= self.checkpoint:
+            return
+        self.total += 1
+        self._last_row = row_number
+        self._error(row_number, row, error)
+        self._maybe_flush()
+
+    def flush(self):
+        """Confirma el bloque en curso: paquetes, errores y checkpoint en una transacción."""
+        pending, self._pending = self._pending, []
+        if not pending and not self.sink.pending:
+            return
+        if pending:
+            if self.warehouse_id is None:
+                self._resolve_warehouses({f["warehouse_name"] for _, _, f in pending if f["warehouse_name"]})
+            self._resolve_drivers({f["driver_username"] for _, _, f in pending if f["driver_username"]})
+        with transaction.atomic():
+            if pending:
+                self._write_pending(pending)
+            self.sink.flush()
+            self._save_checkpoint()
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+    # ---------- internos ----------
+    def _maybe_flush(self):
+        if len(self._pending) + self.sink.pending >= self.chunk_size:
+            self.flush()
+
+    def _write_pending(self, pending):
+        # Un tracking repetido dentro del bloque: gana la última fila,
+        # igual que con update_or_create fila a fila.
+        by_tracking = {}
+        for item in pending:
+            by_tracking[item[2]["tracking_number"]] = item
+        # Las filas pisadas por un duplicado posterior no se escriben: cuentan aparte.
+        self.success += len(pending) - len(by_tracking)
+        self.duplicates += len(pending) - len(by_tracking)
+
+        # Delta: una sola lectura por bloque de las huellas guardadas; lo idéntico no se escribe.
+        # La misma lectura da id y estado de los existentes para sus eventos.
+        existing = {
+            tracking: (pk, import_hash, status)
+            for tracking, pk, import_hash, status in Package.objects.filter(
+                tracking_number__in=list(by_tracking)
+            ).values_list("tracking_number", "id", "import_hash", "status")
+        }
+        changed = []
+        for n, row, fields in by_tracking.values():
+            obj = self._build(fields)
+            prev = existing.get(obj.tracking_number)
+            if prev is not None and prev[1] == obj.import_hash:
+                self.unchanged += 1
+                self.success += 1
+            else:
+                changed.append((n, row, obj, prev))
+        if not changed:
+            return
+
+        written = []
+        try:
+            with transaction.atomic():
+                self._write([obj for _, _, obj, _ in changed])
+        except DatabaseError:
+            # El bloque falló entero: se reintenta fila a fila para aislar la culpable.
+            for n, row, obj, prev in changed:
+                try:
+                    with transaction.atomic():
+                        self._write([obj])
+                except DatabaseError as e:
+                    self._error(n, row or _payload(obj), e)
+                    continue
+                written.append((obj, prev))
+        else:
+            written = [(obj, prev) for _, _, obj, prev in changed]
+        for _, prev in written:
+            self._count_written(prev is None)
+        self._log_events(written)
+
+    def _log_events(self, written):
+        """
+        Eventos 'created'/'updated' de lo escrito en el bloque, en un solo
+        INSERT: bulk_create no dispara los signals de packages.
+        """
+        if not written:
+            return
+        # Los backends sin RETURNING no asignan pk a los nuevos
+        missing = [obj.tracking_number for obj, prev in written if prev is None and obj.pk is None]
+        ids = dict(
+            Package.objects.filter(tracking_number__in=missing).values_list("tracking_number", "id")
+        ) if missing else {}
+        metadata = {"import_batch": self.batch.pk}
+        events = []
+        for obj, prev in written:
+            if prev is None:
+                events.append(PackageEvent(
+                    package_id=obj.pk or ids[obj.tracking_number], type="created",
+                    status_from="", status_to=obj.status, metadata=metadata,
+                ))
+            else:
+                # El import no cambia el estado (ver UPSERT_FIELDS)
+                pk, _, status = prev
+                events.append(PackageEvent(
+                    package_id=pk, type="updated",
+                    status_from=status, status_to=status, metadata=metadata,
+                ))
+        PackageEvent.objects.bulk_create(events)
+
+    def _save_checkpoint(self):
+        self.checkpoint = self._last_row
+        ImportBatch.objects.filter(pk=self.batch.pk).update(
+            checkpoint_row=self.checkpoint,
+            checkpoint_at=timezone.now(),
+            total_records=self.total,
+            processed_count=self.total,
+            success_count=self.success,
+            error_count=self.errors,
+            created_count=self.created,
+            updated_count=self.updated,
+            unchanged_count=self.unchanged,
+            duplicate_count=self.duplicates,
+            report_path=self.sink.report_path,
+        )
+
+    def _count_written(self, is_new):
+        self.success += 1
+        if is_new:
+            self.created += 1
+        else:
+            self.updated += 1
+
+    def _build(self, fields):
+        fields = dict(fields)
+        wh_name = fields.pop("warehouse_name")
+        username = fields.pop("driver_username")
+        if self.warehouse_id is not None:
+            warehouse_id = self.warehouse_id
+        else:
+            warehouse_id = self._warehouses.get(wh_name) if wh_name else None
+        pkg = Package(
+            status=self.status,
+            warehouse_id=warehouse_id,
+            assigned_driver_id=self._drivers.get(username) if username else None,
+            **fields,
+        )
+        pkg.import_hash = import_fingerprint(pkg)
+        return pkg
+
+    def _write(self, objs):
+        # bulk_create no pasa por Package.save(): se sellan last_event_at y updated_at aquí
+        now = timezone.now()
+        for obj in objs:
+            obj.last_event_at = obj.updated_at = now
+        Package.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=["tracking_number"],
+            update_fields=UPSERT_FIELDS + ["import_hash", "last_event_at", "updated_at"],
+        )
+
+    def _resolve_warehouses(self, names):
+        missing = names - self._warehouses.keys()
+        if not missing:
+            return
+        for wid, name in Warehouse.objects.filter(name__in=missing).order_by("id").values_list("id", "name"):
+            self._warehouses.setdefault(name, wid)
+        to_create = missing - self._warehouses.keys()
+        if to_create:
+            Warehouse.objects.bulk_create([Warehouse(name=name) for name in to_create])
+            for wid, name in Warehouse.objects.filter(name__in=to_create).order_by("id").values_list("id", "name"):
+                self._warehouses.setdefault(name, wid)
+
+    def _resolve_drivers(self, usernames):
+        missing = usernames - self._drivers.keys()
+        if not missing:
+            return
+        found = dict(Driver.objects.filter(user__username__in=missing).values_list("user__username", "id"))
+        for username in missing:
+            self._drivers[username] = found.get(username)  # None si no existe: se ignora
+
+    def _error(self, row_number, row, exc):
+        self.errors += 1
+        self.sink.add(row_number, row, exc)
+
+
+def _payload(obj):
+    """Payload JSON de respaldo cuando no se conserva la fila cruda."""
+    return {"tracking_number": obj.tracking_number, "recipient_name": obj.recipient_name}
+
+
+def save_progress(batch, upserter):
+    """
+    Publica las filas leídas entre checkpoints. El resto de contadores sólo
+    se escribe al confirmar cada bloque, para que coincidan con lo guardado.
+    """
+    ImportBatch.objects.filter(pk=batch.pk).update(processed_count=upserter.total)
+
+
+def import_csv_file(batch, fileobj, *, progress_every=PROGRESS_EVERY):
+    """
+    Importa un CSV de SpeedX (archivo binario) sobre `batch`.
+
+    Cada bloque se confirma en su propia transacción para que los contadores
+    de progreso sean visibles desde otras conexiones mientras el import avanza.
+    Si el batch tiene checkpoint, continúa desde ahí.
+    """
+    _, rows = read_csv(TextIOWrapper(fileobj, encoding="utf-8", newline=""))
+    upserter = PackageUpserter(batch)
+    for idx, row in enumerate(rows, start=1):
+        upserter.feed(idx, row)
+        if idx % progress_every == 0:
+            save_progress(batch, upserter)
+    upserter.close()
+    return upserter
+
+
+class CSVStreamImport:
+    """
+    Importa un CSV que llega por trozos de bytes (p. ej. mientras se sube).
+
+        stream = CSVStreamImport(batch)
+        for chunk in chunks:
+            stream.feed(chunk)
+        upserter = stream.close()
+
+    Sólo pasa al parser registros completos: una línea con comillas abiertas
+    espera a la siguiente (campos con saltos de línea). Numera las filas, lee
+    la cabecera y publica el progreso igual que import_csv_file.
+    """
+
+    def __init__(self, batch, *, progress_every=PROGRESS_EVERY):
+        self.batch = batch
+        self.progress_every = progress_every
+        self.upserter = PackageUpserter(batch)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._record = ""   # registro incompleto (cola del último trozo)
+        self._header = None
+        self._row_number = 0
+
+    def feed(self, data):
+        lines = (self._record + self._decoder.decode(data)).splitlines(keepends=True)
+        self._record = ""
+        records = []
+        for line in lines:
+            self._record += line
+            # Un registro termina en salto de línea y con las comillas cerradas
+            if self._record[-1] in "\r\n" and self._record.count('"') % 2 == 0:
+                records.append(self._record)
+                self._record = ""
+        self._parse(records)
+
+    def close(self):
+        tail = self._record + self._decoder.decode(b"", final=True)
+        self._record = ""
+        if tail:
+            self._parse([tail])
+        self.upserter.close()
+        return self.upserter
+
+    def _parse(self, records):
+        for values in csv.reader(records):
+            if not values:
+                continue  # igual que read_csv: las líneas vacías no cuentan
+            if self._header is None:
+                self._header = clean_header(values)
+                continue
+            self._row_number += 1
+            self.upserter.feed(self._row_number, dict(zip(self._header, values)))
+            if self._row_number % self.progress_every == 0:
+                save_progress(self.batch, self.upserter)
+
+
+def finish_batch(batch, upserter):
+    """Deja el batch en su estado final a partir de los contadores del upserter."""
+    batch.total_records = batch.processed_count = upserter.total
+    batch.success_count = upserter.success
+    batch.error_count = upserter.errors
+    batch.created_count = upserter.created
+    batch.updated_count = upserter.updated
+    batch.unchanged_count = upserter.unchanged
+    batch.duplicate_count = upserter.duplicates
+    batch.status = "done" if upserter.errors == 0 else "completed_with_errors"
+    batch.save(update_fields=[
+        "total_records", "processed_count", "success_count", "error_count",
+        "created_count", "updated_count", "unchanged_count", "duplicate_count", "status",
+    ])
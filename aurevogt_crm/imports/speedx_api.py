@@ -0,0 +1,179 @@
+"""
+Importador de la API de SpeedX (source='speedx_api').
+
+Las páginas del manifiesto se piden en paralelo desde un event loop que
+corre en un hilo aparte: cada GET (urllib) va a un pool de hilos propio,
+con un semáforo que acota las peticiones en vuelo y reintentos con backoff
+exponencial para 429/5xx y errores de red. El hilo que llama recibe las
+páginas en orden y las pasa al PackageUpserter (el ORM no puede usarse desde
+el event loop), así que 50 páginas tardan lo que las más lentas, no la suma.
+
+La API esperada (configurable en core.SpeedXConfig.api_base):
+
+    GET {api_base}/manifests/?page=N&page_size=M[&date_from&date_to&filter]
+    Authorization: Bearer {api_key}
+    -> {"count": total_filas, "results": [{tracking_number, ...}, ...]}
+
+Las filas se numeran por página ((page - 1) * page_size + i), de modo que un
+batch reanudado empieza en la página de su checkpoint sin volver a pedir las
+anteriores.
+"""
+import asyncio
+import json
+import logging
+import math
+import queue
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # segundos; se duplica en cada reintento
+TIMEOUT = 30
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class SpeedXAPIError(Exception):
+    pass
+
+
+def get_config():
+    """La configuración activa de la API, o SpeedXAPIError si no hay."""
+    from core.models import SpeedXConfig
+
+    config = SpeedXConfig.objects.filter(enabled=True).exclude(api_base="").first()
+    if config is None:
+        raise SpeedXAPIError("La API de SpeedX no está configurada (core.SpeedXConfig).")
+    return config
+
+
+def page_url(api_base, page, page_size, params):
+    query = {"page": page, "page_size": page_size}
+    query.update({k: v for k, v in (params or {}).items() if v})
+    return f"{api_base.rstrip('/')}/manifests/?{urllib.parse.urlencode(query)}"
+
+
+def _get_json(url, api_key, timeout):
+    request = urllib.request.Request(url, headers={
+        "Accept": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    })
+    with urllib.request.urlopen(request, timeout=timeout) as resp:
+        return json.load(resp)
+
+
+class _PageFetcher:
+    """Lado asyncio: pide las páginas y las deja en `out` como (tipo, página, dato)."""
+
+    def __init__(self, api_base, api_key, params, out, stop, *, page_size, concurrency, start_page):
+        self.api_base, self.api_key, self.params = api_base, api_key, params
+        self.out, self.stop = out, stop
+        self.page_size, self.concurrency, self.start_page = page_size, concurrency, start_page
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self.out.put(("error", None, e))
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.sem = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="speedx-api") as self.pool:
+            first = await self._fetch(self.start_page)
+            pages = max(math.ceil(first.get("count", 0) / self.page_size), self.start_page)
+            self.out.put(("pages", None, pages))
+            self.out.put(("page", self.start_page, first.get("results") or []))
+            tasks = [asyncio.ensure_future(self._fetch_into_queue(p)) for p in range(self.start_page + 1, pages + 1)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _fetch_into_queue(self, page):
+        data = await self._fetch(page)
+        self.out.put(("page", page, data.get("results") or []))
+
+    async def _fetch(self, page):
+        url = page_url(self.api_base, page, self.page_size, self.params)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self.sem:
+                    if self.stop.is_set():  # el consumidor abandonó (error al escribir)
+                        raise SpeedXAPIError("Importación interrumpida")
+                    return await self.loop.run_in_executor(self.pool, _get_json, url, self.api_key, TIMEOUT)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                    raise SpeedXAPIError(f"SpeedX respondió {e.code} en la página {page}") from e
+                error = e
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt == MAX_RETRIES:
+                    raise SpeedXAPIError(f"Sin respuesta de SpeedX en la página {page}: {e}") from e
+                error = e
+            except ValueError as e:
+                raise SpeedXAPIError(f"Respuesta inválida de SpeedX en la página {page}") from e
+            delay = BACKOFF_BASE * 2 ** attempt * (1 + random.random() / 2)
+            logger.warning("SpeedX page %s failed (%s), retrying in %.1fs", page, error, delay)
+            await asyncio.sleep(delay)
+
+
+def iter_pages(api_base, api_key, params=None, *, page_size=PAGE_SIZE, concurrency=None, start_page=1):
+    """
+    Genera (página, filas) en orden de página, desde `start_page`, mientras
+    las siguientes se siguen descargando en paralelo.
+    """
+    concurrency = concurrency or getattr(settings, "SPEEDX_API_CONCURRENCY", 8)
+    out, stop = queue.Queue(), threading.Event()
+    fetcher = _PageFetcher(
+        api_base, api_key, params, out, stop,
+        page_size=page_size, concurrency=concurrency, start_page=start_page,
+    )
+    thread = threading.Thread(target=fetcher.run, name="speedx-api-loop", daemon=True)
+    thread.start()
+    ready, next_page, last_page = {}, start_page, None
+    try:
+        while last_page is None or next_page <= last_page:
+            kind, page, data = out.get()
+            if kind == "error":
+                raise data
+            if kind == "pages":
+                last_page = data
+                continue
+            ready[page] = data
+            while next_page in ready:
+                yield next_page, ready.pop(next_page)
+                next_page += 1
+    finally:
+        stop.set()
+        thread.join()
+
+
+def import_speedx_api(batch, params=None, *, page_size=PAGE_SIZE, concurrency=None):
+    """
+    Importa el manifiesto de la API sobre `batch`. Si el batch tiene
+    checkpoint, empieza en la página que lo contiene. Devuelve el upserter.
+    """
+    from .services import PackageUpserter, save_progress
+
+    config = get_config()
+    upserter = PackageUpserter(batch)
+    start_page = batch.checkpoint_row // page_size + 1
+    for page, rows in iter_pages(
+        config.api_base, config.api_key, params,
+        page_size=page_size, concurrency=concurrency, start_page=start_page,
+    ):
+        base = (page - 1) * page_size
+        for i, row in enumerate(rows, start=1):
+            upserter.feed(base + i, row)
+        save_progress(batch, upserter)
+    upserter.close()
+    return upserter
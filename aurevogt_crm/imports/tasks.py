@@ -0,0 +1,127 @@
+"""
+Importaciones en segundo plano.
+
+La cola vive en la BD: un ImportBatch en 'processing' con `started_at` nulo
+está pendiente. Un pool local de hilos lo reclama con un UPDATE condicional
+(sólo un worker gana) y procesa el archivo guardado en `upload_path`, o
+descarga el manifiesto de la API de SpeedX si source='speedx_api'.
+Si el proceso muere, `manage.py run_import_worker` recoge lo que quedó en cola,
+y también lo que un worker reclamó y dejó de avanzar: un batch sin bloque
+confirmado en IMPORT_STALE_MINUTES vuelve a estar pendiente.
+Cada bloque confirmado deja un checkpoint en el batch; `resume_batch` vuelve a
+encolar un import caído y el worker continúa desde ahí.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ImportBatch
+from .parallel import PARALLEL_MIN_BYTES, default_workers, import_csv_path
+from .services import finish_batch, import_csv_file, save_progress
+from .speedx_api import import_speedx_api
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMPORT_WORKERS", 2),
+            thread_name_prefix="imports",
+        )
+    return _executor
+
+
+def enqueue_batch(batch):
+    """Encola el batch en el pool local en cuanto la transacción actual confirme."""
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, batch.pk))
+
+
+def pending_batches():
+    """
+    Batches en cola: sin worker, o con un worker que lleva IMPORT_STALE_MINUTES
+    sin confirmar un bloque (murió tras reclamarlo; ver ImportBatch.can_resume).
+    """
+    stale = timezone.now() - timedelta(minutes=getattr(settings, "IMPORT_STALE_MINUTES", 10))
+    abandoned = Q(started_at__lt=stale) & (Q(checkpoint_at__isnull=True) | Q(checkpoint_at__lt=stale))
+    return (
+        ImportBatch.objects.filter(status="processing")
+        .filter(Q(started_at__isnull=True) | abandoned)
+        .filter(Q(source="speedx_api") | ~Q(upload_path=""))
+        .order_by("imported_at", "id")
+    )
+
+
+def resume_batch(batch):
+    """
+    Vuelve a encolar un batch caído (ver ImportBatch.can_resume).
+    Devuelve False si no se puede reanudar o si otro ya lo hizo.
+    """
+    if not batch.can_resume:
+        return False
+    resumed = ImportBatch.objects.filter(
+        pk=batch.pk, status=batch.status, started_at=batch.started_at
+    ).update(status="processing", started_at=None)
+    if not resumed:
+        return False
+    enqueue_batch(batch)
+    return True
+
+
+def _run_in_thread(batch_id):
+    close_old_connections()
+    try:
+        run_batch(batch_id)
+    finally:
+        connection.close()
+
+
+def run_batch(batch_id):
+    """
+    Reclama y procesa un batch. Devuelve False si otro worker ya lo tomó.
+    El reclamo renueva started_at, así que un batch abandonado que se
+    recupera deja de estar pendiente para los demás workers.
+    """
+    claimed = pending_batches().filter(pk=batch_id).update(started_at=timezone.now())
+    if not claimed:
+        return False
+
+    batch = ImportBatch.objects.get(pk=batch_id)
+    try:
+        if batch.source == "speedx_api":
+            upserter = import_speedx_api(batch, batch.params)
+        else:
+            upserter = _import_upload(batch)
+        finish_batch(batch, upserter)
+    except Exception:
+        logger.exception("Import batch %s failed", batch_id)
+        ImportBatch.objects.filter(pk=batch_id).update(status="failed")
+    return True
+
+
+def _import_upload(batch):
+    try:
+        path = default_storage.path(batch.upload_path)
+    except NotImplementedError:  # storage remoto: no hay ruta local
+        with default_storage.open(batch.upload_path, "rb") as fh:
+            return import_csv_file(batch, fh)
+    return import_local_file(batch, path)
+
+
+def import_local_file(batch, path):
+    """Parseo en paralelo para archivos grandes; en serie para el resto."""
+    processes = getattr(settings, "IMPORT_PARSE_PROCESSES", None) or default_workers()
+    if processes > 1 and os.path.getsize(path) >= PARALLEL_MIN_BYTES:
+        return import_csv_path(batch, path, workers=processes, on_progress=lambda up: save_progress(batch, up))
+    with open(path, "rb") as fh:
+        return import_csv_file(batch, fh)
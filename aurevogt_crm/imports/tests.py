@@ -1,3 +1,445 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import SpeedXConfig
+from packages.models import Package, PackageEvent, Warehouse
+from . import parallel, receiving
+from .bench import generate_manifest
+from .models import ImportBatch, TruckReceipt, TruckReceiptItem
+from .normalizers import normalize_row
+from .speedx_api import SpeedXAPIError, import_speedx_api
+from .services import CSVStreamImport, PackageUpserter, import_csv_file, report_chunks, report_parts
+from .tasks import pending_batches, run_batch
+from .validation import dry_run
+
+HEADER = "tracking_number,recipient_name,addr_street,addr_city,addr_zip,customer_phone\n"
+
+
+def manifest(rows):
+    """CSV de SpeedX con una fila por (tracking, nombre)."""
+    return HEADER + "".join(f"{t},{name},1 Main St,Miami,33101,305-555-0100\n" for t, name in rows)
+
+
+class MediaTestCase(TestCase):
+    """MEDIA_ROOT temporal para los reportes y archivos subidos."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ImportWorkerTests(MediaTestCase):
+    def _batch(self, **fields):
+        path = default_storage.save("imports/uploads/test.csv", ContentFile(manifest([("T1", "Ana"), ("T2", "Luis")])))
+        return ImportBatch.objects.create(source="speedx_csv", status="processing", upload_path=path, **fields)
+
+    def test_abandoned_claim_is_picked_up_again(self):
+        old = timezone.now() - timedelta(hours=1)
+        queued = self._batch()
+        abandoned = self._batch(started_at=old, checkpoint_at=old)
+        running = self._batch(started_at=old, checkpoint_at=timezone.now())
+        self.assertEqual(set(pending_batches()), {queued, abandoned})
+
+        self.assertTrue(run_batch(abandoned.pk))
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.success_count), ("done", 2))
+        # Ya reclamado de nuevo: no vuelve a la cola ni lo toma otro worker
+        self.assertFalse(run_batch(abandoned.pk))
+        self.assertFalse(run_batch(running.pk))
+        self.assertEqual(Package.objects.count(), 2)
+
+
+class ErrorReportTests(MediaTestCase):
+    @override_settings(IMPORT_ERROR_ROWS_DB_LIMIT=2)
+    def test_report_keeps_every_error_and_page_flags_truncation(self):
+        rows = manifest([("T1", "Ana")]) + ",sin tracking,1 Main St,Miami,33101,\n" * 3
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        upserter = import_csv_file(batch, io.BytesIO(rows.encode()))
+        self.assertEqual((upserter.success, upserter.errors), (1, 3))
+        batch.refresh_from_db()
+        self.assertEqual(batch.errors.count(), 2)
+        self.assertTrue(default_storage.exists(batch.report_path))
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        response = self.client.get(reverse("imports:report", args=[batch.pk]))
+        report = list(csv.reader(io.StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())))
+        self.assertEqual(report[0], ["row_number", "tracking_number", "error", "payload"])
+        self.assertEqual([r[0] for r in report[1:]], ["2", "3", "4"])
+
+        response = self.client.get(reverse("imports:detail", args=[batch.pk]))
+        self.assertTrue(response.context["errors_truncated"])
+        self.assertContains(response, "sólo los primeros 2 de 3 errores")
+
+
+class ResumeTests(MediaTestCase):
+    ROWS = manifest([("T1", "Ana"), ("", "sin tracking"), ("T3", "Luis"), ("", "sin tracking")])
+
+    def _report_rows(self, batch):
+        data = b"".join(report_chunks(batch.report_path, report_parts(batch.report_path)))
+        return [r[0] for r in csv.reader(io.StringIO(gzip.decompress(data).decode()))][1:]
+
+    def test_rolled_back_chunk_is_not_reported_twice(self):
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        save_checkpoint = PackageUpserter._save_checkpoint
+        calls = []
+
+        def crash_on_second_chunk(upserter):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("worker murió")
+            save_checkpoint(upserter)
+
+        with mock.patch.object(PackageUpserter, "_save_checkpoint", crash_on_second_chunk):
+            up = PackageUpserter(batch, chunk_size=2)
+            with self.assertRaises(RuntimeError):
+                for n, row in enumerate(csv.DictReader(io.StringIO(self.ROWS)), start=1):
+                    up.feed(n, row)
+        batch.refresh_from_db()
+        self.assertEqual(batch.checkpoint_row, 2)
+
+        # Reanudado: la parte del bloque revertido se descarta y sus filas se escriben una vez
+        up = PackageUpserter(batch, chunk_size=2)
+        self.assertEqual(report_parts(batch.report_path), [f"{batch.report_path}/0000000002.csv.gz"])
+        for n, row in enumerate(csv.DictReader(io.StringIO(self.ROWS)), start=1):
+            up.feed(n, row)
+        up.close()
+        batch.refresh_from_db()
+        self.assertEqual((up.success, up.errors, batch.errors.count()), (2, 2, 2))
+        self.assertEqual((batch.created_count, batch.updated_count), (2, 0))
+        self.assertEqual(self._report_rows(batch), ["2", "4"])
+
+
+class ImportFormTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    def _post(self, headers=None, **extra):
+        upload = SimpleUploadedFile("manifest.csv", manifest([("T1", "Ana")]).encode(), content_type="text/csv")
+        data = {"source": "speedx_csv", "upload": upload, **extra}
+        return self.client.post(reverse("imports:form"), data, headers=headers)
+
+    def _files(self):
+        return [name for _, _, names in os.walk(self.media) for name in names]
+
+    def test_upload_with_csrf_header_is_imported_while_it_streams(self):
+        self.client.get(reverse("imports:form"))
+        token = self.client.cookies["csrftoken"].value
+        response = self._post(csrfmiddlewaretoken=token, headers={"X-CSRFToken": token})
+        batch = ImportBatch.objects.get()
+        self.assertRedirects(response, reverse("imports:detail", args=[batch.pk]), fetch_redirect_response=False)
+        # Importado en la petición, sin temporal ni copia guardada
+        self.assertEqual((batch.status, batch.success_count, batch.upload_path), ("done", 1, ""))
+        self.assertIsNotNone(batch.started_at)
+        self.assertFalse(batch.can_resume)
+        self.assertEqual(list(Package.objects.values_list("tracking_number", flat=True)), ["T1"])
+        self.assertEqual(self._files(), [])
+
+    def test_form_post_without_header_is_saved_and_queued(self):
+        self.client.get(reverse("imports:form"))
+        response = self._post(csrfmiddlewaretoken=self.client.cookies["csrftoken"].value)
+        batch = ImportBatch.objects.get()
+        self.assertRedirects(response, reverse("imports:detail", args=[batch.pk]), fetch_redirect_response=False)
+        # Encolado para el pool, no importado en la petición
+        self.assertEqual((batch.status, batch.started_at, Package.objects.count()), ("processing", None, 0))
+        with default_storage.open(batch.upload_path) as fh:
+            self.assertEqual(fh.read().decode(), manifest([("T1", "Ana")]))
+
+    def test_cross_site_post_writes_nothing(self):
+        self.client.get(reverse("imports:form"))
+        for headers in (None, {"X-CSRFToken": "x" * 32}):
+            response = self._post(headers=headers)
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(ImportBatch.objects.exists())
+        self.assertFalse(Package.objects.exists())
+        self.assertEqual(self._files(), [])
+
+    def test_stream_parser_matches_the_file_import(self):
+        rows = (
+            "\ufefftracking_number, recipient_name,addr_street,addr_city,addr_zip,note\r\n"
+            'T1,José Ñúñez,1 Main St,Miami,33101,"línea 1\r\nlínea 2, con ""comillas"""\r\n'
+            "\r\n"
+            ",sin tracking,1 Main St,Miami,33101,\r\n"
+            "T3,Ana,2 Main St,Miami,33101,sin salto final"
+        ).encode("utf-8")
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        expected = import_csv_file(batch, io.BytesIO(rows))
+        notes = dict(Package.objects.values_list("tracking_number", "note"))
+        Package.objects.all().delete()
+
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        stream = CSVStreamImport(batch)
+        for i in range(0, len(rows), 3):  # corta caracteres multibyte y registros
+            stream.feed(rows[i:i + 3])
+        upserter = stream.close()
+        self.assertEqual((upserter.success, upserter.errors), (expected.success, expected.errors))
+        self.assertEqual(dict(Package.objects.values_list("tracking_number", "note")), notes)
+        self.assertEqual(list(batch.errors.values_list("row_number", flat=True)), [2])
+
+
+class UpsertCountTests(TestCase):
+    def _import(self, rows):
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        return import_csv_file(batch, io.BytesIO(manifest(rows).encode()))
+
+    def test_duplicate_trackings_in_a_chunk_are_counted_apart(self):
+        up = self._import([("T1", "Ana"), ("T2", "Luis"), ("T1", "Ana María")])
+        self.assertEqual((up.created, up.updated, up.duplicates, up.success), (2, 0, 1, 3))
+        # Gana la última fila del tracking repetido
+        self.assertEqual(Package.objects.get(tracking_number="T1").recipient_name, "Ana María")
+
+    def test_reimport_skips_unchanged_rows(self):
+        self._import([("T1", "Ana"), ("T2", "Luis"), ("T3", "Eva")])
+        before = dict(Package.objects.values_list("tracking_number", "updated_at"))
+        events = PackageEvent.objects.count()
+
+        up = self._import([("T1", "Ana"), ("T2", "Luis Gómez"), ("T3", "Eva"), ("T4", "Noa")])
+
+        self.assertEqual((up.created, up.updated, up.unchanged, up.success), (1, 1, 2, 4))
+        after = dict(Package.objects.values_list("tracking_number", "updated_at"))
+        self.assertEqual((after["T1"], after["T3"]), (before["T1"], before["T3"]))
+        self.assertGreater(after["T2"], before["T2"])
+        self.assertEqual(PackageEvent.objects.count(), events + 2)  # T2 updated, T4 created
+
+    def test_one_event_per_created_or_updated_row(self):
+        self._import([("T1", "Ana"), ("T2", "Luis")])
+        last = PackageEvent.objects.order_by("-pk").values_list("pk", flat=True).first()
+
+        self._import([("T1", "Ana"), ("T2", "Luis Gómez"), ("T3", "Eva")])
+
+        new = PackageEvent.objects.filter(pk__gt=last)
+        self.assertEqual(
+            sorted(new.values_list("package__tracking_number", "type")), [("T2", "updated"), ("T3", "created")]
+        )
+        self.assertFalse(new.filter(package__tracking_number="T1").exists())
+
+
+class ReceivingTests(TestCase):
+    def setUp(self):
+        warehouse = Warehouse.objects.create(name="Doral")
+        self.receipt = TruckReceipt.objects.create(code="TRK-1", warehouse=warehouse)
+        for tracking in ("T1", "T2"):
+            Package.objects.create(
+                tracking_number=tracking, recipient_name="Cliente", addr_street="1 Main St",
+                addr_city="Miami", addr_zip="33101",
+            )
+            TruckReceiptItem.objects.create(receipt=self.receipt, tracking_number=tracking)
+
+    def test_scans_reconcile_against_the_database(self):
+        result = receiving.scan_batch(self.receipt, ["T1", "X9", " T1 ", ""])
+        self.assertEqual((result["received"], result["unexpected"], result["repeated"]), (["T1"], ["X9"], []))
+        self.assertEqual(
+            (result["expected_total"], result["received_total"], result["pending_total"], result["unexpected_total"]),
+            (2, 1, 1, 1),
+        )
+        # Otro lote (otro worker): lo ya visto se repite y no se vuelve a escribir
+        result = receiving.scan_batch(self.receipt, ["T1", "X9"])
+        self.assertEqual((result["received"], result["unexpected"], result["repeated"]), ([], [], ["T1", "X9"]))
+        self.assertEqual(TruckReceiptItem.objects.filter(tracking_number="X9").count(), 1)
+        self.assertEqual(Package.objects.get(tracking_number="T1").status, "in_warehouse")
+        self.assertEqual(PackageEvent.objects.filter(metadata__truck_receipt="TRK-1").count(), 1)
+
+        self.assertEqual(receiving.close_receipt(self.receipt), 1)
+        result = receiving.scan_batch(self.receipt, ["T2"])
+        self.assertEqual((result["received"], result["pending_total"]), (["T2"], 0))
+
+
+class _StubSpeedX(BaseHTTPRequestHandler):
+    """Manifiesto paginado de la API de SpeedX; `fail` = {página: [códigos a devolver antes de responder]}."""
+    rows, fail, requests = [], {}, []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        page, size = int(query["page"][0]), int(query["page_size"][0])
+        self.requests.append((page, self.headers["Authorization"], query.get("date_from", [""])[0]))
+        pending = self.fail.get(page)
+        if pending:
+            self.send_error(pending.pop(0))
+            return
+        body = json.dumps({"count": len(self.rows), "results": self.rows[(page - 1) * size:page * size]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch("imports.speedx_api.BACKOFF_BASE", 0.001)
+class SpeedXAPITests(TestCase):
+    def setUp(self):
+        _StubSpeedX.rows = [
+            {"tracking_number": f"API{n}", "recipient_name": "Cliente", "addr_street": "1 Main St",
+             "addr_city": "Miami", "addr_zip": "33101"}
+            for n in range(1, 6)
+        ]
+        _StubSpeedX.fail, _StubSpeedX.requests = {}, []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSpeedX)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        SpeedXConfig.objects.create(enabled=True, api_base=f"http://127.0.0.1:{server.server_port}/v1", api_key="k")
+
+    def _import(self, **batch_fields):
+        batch = ImportBatch.objects.create(source="speedx_api", status="processing", **batch_fields)
+        return batch, import_speedx_api(batch, {"date_from": "2026-10-01"}, page_size=2, concurrency=2)
+
+    def test_pages_are_fetched_with_retries_and_imported_in_order(self):
+        _StubSpeedX.fail = {2: [503, 429]}
+        with self.assertLogs("imports.speedx_api", "WARNING") as logs:
+            batch, up = self._import()
+        self.assertEqual(len(logs.records), 2)  # un reintento con backoff por cada fallo
+        self.assertEqual((up.total, up.created), (5, 5))
+        self.assertEqual(sorted(page for page, _, _ in _StubSpeedX.requests), [1, 2, 2, 2, 3])
+        self.assertTrue(all(auth == "Bearer k" and since == "2026-10-01" for _, auth, since in _StubSpeedX.requests))
+        batch.refresh_from_db()
+        self.assertEqual(batch.checkpoint_row, 5)
+
+    def test_resume_starts_at_the_checkpoint_page(self):
+        batch, up = self._import(checkpoint_row=2, total_records=2, success_count=2, created_count=2)
+        self.assertEqual(sorted(page for page, _, _ in _StubSpeedX.requests), [2, 3])
+        self.assertEqual((up.total, up.created), (5, 5))
+        self.assertEqual(sorted(Package.objects.values_list("tracking_number", flat=True)), ["API3", "API4", "API5"])
+
+    def test_client_errors_are_not_retried(self):
+        _StubSpeedX.fail = {1: [404]}
+        with self.assertRaises(SpeedXAPIError):
+            self._import()
+        self.assertEqual(len(_StubSpeedX.requests), 1)
+
+
+class DryRunTests(MediaTestCase):
+    ROWS = manifest([("T1", "Ana")]) + "T2,Luis,,Miami,33101,\n"  # sin addr_street
+
+    def test_dry_run_predicts_the_generic_command(self):
+        from imports.management.commands import Command as GenericImportCommand
+
+        path = os.path.join(self.media, "manifest.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.ROWS)
+        out = io.StringIO()
+        call_command(GenericImportCommand(), path, dry_run=True, stdout=out)
+        self.assertIn("1 OK, 1 con error", out.getvalue())
+
+        out = io.StringIO()
+        call_command(GenericImportCommand(), path, stdout=out, stderr=io.StringIO())
+        self.assertIn("OK=1 ERR=1", out.getvalue())
+        self.assertEqual(list(Package.objects.values_list("tracking_number", "status")), [("T1", "received")])
+
+    def test_dry_run_and_import_read_the_same_header(self):
+        from imports.management.commands import Command as GenericImportCommand
+
+        # Cabecera con espacios tras las comas y BOM, como la exporta Excel
+        data = "\ufeff" + HEADER.replace(",", ", ") + "T1,Ana,1 Main St,Miami,33101,\nT2,Luis,,Miami,33101,\n"
+        report = dry_run(io.StringIO(data))
+        self.assertEqual((report.ok, report.errors), (1, 1))
+
+        batch = ImportBatch.objects.create(source="speedx_csv", file_name="m.csv", status="processing")
+        upserter = import_csv_file(batch, io.BytesIO(data.encode("utf-8")))
+        self.assertEqual((upserter.success, upserter.errors), (report.ok, report.errors))
+
+        Package.objects.all().delete()
+        path = os.path.join(self.media, "manifest.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        out = io.StringIO()
+        call_command(GenericImportCommand(), path, stdout=out, stderr=io.StringIO())
+        self.assertIn(f"OK={report.ok} ERR={report.errors}", out.getvalue())
+
+    def test_web_dry_run_rejects_non_utf8_files(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        upload = SimpleUploadedFile("manifest.csv", (HEADER + "T1,José,1 Main St,Miami,33101,\n").encode("latin-1"))
+        response = self.client.post(reverse("imports:form") + "?dry_run=1", {"upload": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "no está en UTF-8")
+
+
+class ParallelImportTests(MediaTestCase):
+    ERROR_ROWS = (1, 7, 15, 16, 33, 40)
+
+    def _manifest(self):
+        rows = [("" if n in self.ERROR_ROWS else f"T{n}", f"Cliente {n}") for n in range(1, 41)]
+        rows[20] = ("T3", "Cliente 3 repetido")  # duplicado de la fila 3
+        lines = manifest(rows).replace(HEADER, "\ufeff" + HEADER.replace(",", ", ")).splitlines(keepends=True)
+        lines.insert(12, "\n")  # las líneas vacías no cuentan como fila
+        return "".join(lines)
+
+    def _import(self, run):
+        Package.objects.all().delete()
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        up = run(batch)
+        counts = (up.created, up.updated, up.unchanged, up.duplicates, up.success, up.errors)
+        return counts, list(batch.errors.order_by("pk").values_list("row_number", "payload__tracking_number"))
+
+    def test_small_ranges_number_rows_like_the_serial_path(self):
+        data = self._manifest()
+        path = os.path.join(self.media, "manifest.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        header, data_start = parallel.read_header(path)
+        self.assertEqual(header[:2], ["tracking_number", "recipient_name"])
+        self.assertGreater(len(parallel.split_ranges(path, data_start, 256)), 4)
+
+        serial = self._import(lambda batch: import_csv_file(batch, io.BytesIO(data.encode("utf-8"))))
+        in_ranges = self._import(lambda batch: parallel.import_csv_path(batch, path, workers=2, range_bytes=256))
+        self.assertEqual(in_ranges, serial)
+        self.assertEqual([n for n, _ in in_ranges[1]], list(self.ERROR_ROWS))
+        self.assertEqual(in_ranges[0][4:], (34, 6))
+
+
+class BenchManifestTests(MediaTestCase):
+    def _read(self, **kwargs):
+        path = os.path.join(self.media, "bench.csv")
+        generate_manifest(path, 2000, **kwargs)
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def _mix(self, data):
+        """(filas, filas que el import rechaza, trackings repetidos)"""
+        rows = list(csv.DictReader(io.StringIO(data)))
+        errors, seen, repeated = 0, set(), 0
+        for row in rows:
+            try:
+                normalize_row(row)
+            except ValueError:
+                errors += 1
+            tracking = row["tracking_number"]
+            repeated += tracking in seen
+            seen.add(tracking)
+        return len(rows), errors, repeated
+
+    def test_error_and_duplicate_mix(self):
+        data = self._read(error_rate=0.05, dup_rate=0.1, seed=7)
+        self.assertEqual(data, self._read(error_rate=0.05, dup_rate=0.1, seed=7))  # determinista
+        rows, errors, repeated = self._mix(data)
+        self.assertEqual(rows, 2000)
+        self.assertTrue(60 <= errors <= 140, errors)
+        self.assertTrue(140 <= repeated <= 260, repeated)
+
+        self.assertEqual(self._mix(self._read(error_rate=0, dup_rate=0)), (2000, 0, 0))
@@ -0,0 +1,113 @@
+"""
+Upload handler que importa el CSV de SpeedX mientras se sube.
+
+En lugar de volcar la subida a un archivo temporal y leerla después, cada
+trozo recibido pasa directo a CSVStreamImport, que confirma bloques de filas
+a medida que llegan: subida e importación se solapan y no queda copia del
+archivo. Se instala sólo en imports:form (ver views.import_form).
+
+El handler corre al parsear el cuerpo, antes de que la vista pueda leer el
+campo csrfmiddlewaretoken, así que el CSRF se valida con la cabecera
+X-CSRFToken (la manda el formulario vía fetch) antes de crear el batch. Sin
+esa cabecera, o si no es válida, el archivo sigue el camino normal de Django
+y la vista lo rechaza o lo guarda y encola.
+
+Como no hay archivo guardado, un batch importado así no se puede reanudar.
+"""
+import copy
+import logging
+from io import BytesIO
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+
+from .models import ImportBatch
+from .services import CSVStreamImport, finish_batch
+
+logger = logging.getLogger(__name__)
+
+
+def csrf_header_valid(request):
+    """
+    La petición pasa el CSRF sólo con la cabecera X-CSRFToken (y Origin/Referer
+    en HTTPS), sin leer request.POST, que todavía se está parseando.
+    """
+    # Con otro método el middleware no mira el cuerpo: sólo cookie y cabecera
+    probe = copy.copy(request)
+    probe.method = "PUT"
+    rejected = CsrfViewMiddleware(lambda request: None).process_view(probe, lambda request: None, (), {})
+    return rejected is None
+
+
+class StreamedCSVUpload(UploadedFile):
+    """Lo que queda en request.FILES: sin contenido, sólo el batch ya importado."""
+
+    def __init__(self, batch, name, size):
+        super().__init__(file=BytesIO(), name=name, content_type="text/csv", size=size)
+        self.batch = batch
+
+
+class SpeedXCSVUploadHandler(FileUploadHandler):
+    upload_field = "upload"  # el <input type="file"> del formulario CSV
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.batch = None
+        self.stream = None
+        self.active = False  # el archivo en curso es el CSV que importamos
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = False
+        if field_name != self.upload_field or self.batch is not None:
+            return
+        if not csrf_header_valid(self.request):
+            return  # lo guardan los handlers de Django; la vista aplica el CSRF
+        user = getattr(self.request, "user", None)
+        # started_at: lo procesa esta petición, el pool de importación no lo toma
+        self.batch = ImportBatch.objects.create(
+            source="speedx_csv",
+            file_name=file_name,
+            created_by=user if user is not None and user.is_authenticated else None,
+            status="processing",
+            started_at=timezone.now(),
+        )
+        self.stream = CSVStreamImport(self.batch)
+        self.active = True
+        raise StopFutureHandlers  # ni memoria ni archivo temporal para este campo
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.stream is not None:
+            try:
+                self.stream.feed(raw_data)
+            except Exception:
+                logger.exception("Streamed import batch %s failed", self.batch.pk)
+                self._fail()
+        return None  # el trozo no sigue a otros handlers
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.stream is not None:
+            try:
+                finish_batch(self.batch, self.stream.close())
+            except Exception:
+                logger.exception("Streamed import batch %s failed", self.batch.pk)
+                self._fail()
+        self.batch.refresh_from_db()
+        return StreamedCSVUpload(self.batch, self.file_name, file_size)
+
+    def upload_interrupted(self):
+        if self.active and self.stream is not None:
+            logger.warning("Upload interrupted, import batch %s left incomplete", self.batch.pk)
+            self._fail()
+
+    def _fail(self):
+        # Lo confirmado hasta el último checkpoint se queda; el resto de la subida se descarta.
+        self.stream = None
+        ImportBatch.objects.filter(pk=self.batch.pk).update(status="failed")
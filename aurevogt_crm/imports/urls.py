@@ -7,6 +7,12 @@ urlpatterns = [
     path('', views.import_list, name='list'),
     path('new/', views.import_form, name='form'),
     path('<int:pk>/', views.import_detail, name='detail'),
+    path('<int:pk>/progress/', views.import_progress, name='progress'),
+    path('<int:pk>/report/', views.import_report, name='report'),
+    path('<int:pk>/resume/', views.import_resume, name='resume'),
     path('<int:pk>/edit/', views.import_edit, name='edit'),
     path('<int:pk>/delete/', views.import_delete, name='delete'),
+    path('receipts/<str:code>/', views.truck_receipt, name='truck_receipt'),
+    path('receipts/<str:code>/scan/', views.truck_receipt_scan, name='truck_receipt_scan'),
+    path('receipts/<str:code>/close/', views.truck_receipt_close, name='truck_receipt_close'),
 ]
\ No newline at end of file
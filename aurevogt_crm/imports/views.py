@@ -1,15 +1,27 @@
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.paginator import Paginator
-from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from .models import ImportBatch, ImportErrorRow
-import csv
-from io import TextIOWrapper
+from packages.models import Package
+from . import receiving
+from .models import ImportBatch, ImportErrorRow, TruckReceipt
+from .services import report_chunks, report_parts
+from .speedx_api import get_config
+from .tasks import enqueue_batch, resume_batch
+from .validation import dry_run
+from .uploadhandlers import SpeedXCSVUploadHandler
 from django import forms
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_POST
+import json
+from io import TextIOWrapper
+
+ERROR_PREVIEW_ROWS = 50  # errores mostrados en el detalle
+SCANS_PER_REQUEST = 500  # tope de escaneos por lote en truck_receipt_scan
 
 class ImportBatchForm(forms.ModelForm):
     """
@@ -46,25 +58,74 @@ def import_list(request):
 @login_required
 def import_detail(request, pk):
     batch = get_object_or_404(ImportBatch, pk=pk)
-    errors_qs = ImportErrorRow.objects.filter(batch=batch).order_by('row_number')
-
-    # Paginación de errores (por si son muchos)
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(errors_qs, 50)
-    page_obj = paginator.get_page(page_number)
+    # Sólo una muestra: el listado completo está en el reporte descargable
+    errors = ImportErrorRow.objects.filter(batch=batch).order_by('row_number')[:ERROR_PREVIEW_ROWS]
+    # En BD sólo quedan los primeros error_rows_db_limit(); el reporte los lleva todos
+    errors_stored = batch.errors.count() if batch.error_count else 0
 
     return render(
         request,
         'imports/import_detail.html',
         {
             'batch': batch,
-            'errors': page_obj,  # iteración en template: for e in errors
-            'paginator': paginator,
-            'page_obj': page_obj,
+            'errors': errors,
+            'error_preview_rows': ERROR_PREVIEW_ROWS,
+            'errors_stored': errors_stored,
+            'errors_truncated': batch.error_count > errors_stored,
         },
     )
 
 
+@login_required
+def import_report(request, pk):
+    """
+    Descarga en streaming del reporte de errores (CSV gzip) escrito durante el import.
+    """
+    batch = get_object_or_404(ImportBatch, pk=pk)
+    if not batch.report_path:
+        raise Http404('Este import no tiene reporte de errores.')
+    parts = report_parts(batch.report_path)
+    if not parts:
+        raise Http404('El reporte ya no existe.')
+    response = StreamingHttpResponse(report_chunks(batch.report_path, parts), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="batch_{batch.pk}_errors.csv.gz"'
+    return response
+
+
+@login_required
+def import_progress(request, pk):
+    """
+    Parcial HTMX con los contadores del batch. Lee sólo las columnas de progreso;
+    mientras el batch siga en 'processing' el parcial se vuelve a pedir solo.
+    """
+    progress = get_object_or_404(
+        ImportBatch.objects.values(
+            'id', 'status', 'processed_count', 'success_count', 'error_count',
+            'created_count', 'updated_count', 'unchanged_count', 'duplicate_count',
+        ),
+        pk=pk,
+    )
+    response = render(request, 'imports/fragments/import_progress.html', {'progress': progress})
+    if request.htmx and progress['status'] != 'processing':
+        # Terminado: recarga el detalle completo para mostrar errores/reporte
+        response['HX-Refresh'] = 'true'
+    return response
+
+
+@user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
+@require_POST
+def import_resume(request, pk):
+    """
+    Reanuda un import caído desde su checkpoint (las filas ya confirmadas no se reprocesan).
+    """
+    batch = get_object_or_404(ImportBatch, pk=pk)
+    if resume_batch(batch):
+        messages.success(request, f'Import reanudado desde la fila {batch.checkpoint_row}.')
+    else:
+        messages.error(request, 'Este import no se puede reanudar.')
+    return redirect('imports:detail', pk=batch.pk)
+
+
 @user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
 def import_edit(request, pk):
     """
@@ -106,16 +167,67 @@ def import_delete(request, pk):
 
 
 
+@csrf_exempt
 @user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
 def import_form(request):
     """
     Vista para subir CSV (source='speedx_csv') o disparar importación por API (source='speedx_api').
     No depende del admin. Deja mensajes de estado y redirige a la lista.
+
+    Con ?dry_run=1 sólo valida el CSV (ver validation) y muestra el resumen.
+
+    Con IMPORT_STREAM_UPLOADS (por defecto activo) el CSV se importa mientras
+    se sube (ver uploadhandlers). El handler tiene que instalarse antes de
+    leer request.POST, así que esta vista es csrf_exempt y el CSRF se valida
+    en _import_form; el handler sólo escribe si la cabecera X-CSRFToken ya
+    es válida, y si no el archivo se guarda y se encola como siempre.
     """
+    if (
+        request.method == 'POST'
+        and not request.GET.get('dry_run')
+        and getattr(settings, 'IMPORT_STREAM_UPLOADS', True)
+    ):
+        request.upload_handlers.insert(0, SpeedXCSVUploadHandler(request))
+    return _import_form(request)
+
+
+@csrf_protect
+def _import_form(request):
     if request.method == 'POST':
         source = (request.POST.get('source') or '').strip()
         upload = request.FILES.get('upload')
 
+        if request.GET.get('dry_run'):
+            # Sólo validación: ni batch ni escrituras
+            if not upload:
+                messages.error(request, 'Debes adjuntar un archivo CSV.')
+                return redirect('imports:form')
+            try:
+                report = dry_run(TextIOWrapper(upload.file, encoding='utf-8', newline=''))
+            except UnicodeDecodeError:
+                messages.error(request, 'El archivo no está en UTF-8. Expórtalo como CSV UTF-8 y vuelve a validarlo.')
+                return render(request, 'imports/import_form.html')
+            return render(request, 'imports/import_form.html', {
+                'report': report.as_dict(), 'report_file': upload.name,
+            })
+
+        streamed = getattr(upload, 'batch', None)
+        if streamed is not None:
+            # Ya importado durante la subida: sólo queda informar
+            if streamed.status == 'failed':
+                messages.error(request, 'La importación falló durante la subida. Revisa el detalle.')
+            elif streamed.error_count:
+                messages.warning(
+                    request,
+                    f'Importación finalizada con {streamed.error_count} errores. Revisa el detalle.'
+                )
+            else:
+                messages.success(
+                    request,
+                    f'Importación completada. Registros: {streamed.total_records}, exitosos: {streamed.success_count}.'
+                )
+            return redirect('imports:detail', pk=streamed.pk)
+
         if source not in ('speedx_csv', 'speedx_api'):
             messages.error(request, 'Fuente inválida. Usa CSV de SpeedX o API.')
             return redirect('imports:form')
@@ -128,8 +240,6 @@ def import_form(request):
             status='processing',
         )
 
-        total = success = errors = 0
-
         try:
             if source == 'speedx_csv':
                 if not upload:
@@ -138,148 +248,27 @@ def import_form(request):
                     batch.save(update_fields=['status'])
                     return redirect('imports:form')
 
-                # Lectura en streaming del CSV
-                wrapped = TextIOWrapper(upload.file, encoding='utf-8', newline='')
-                # Espera columnas: tracking_number, recipient_name, addr_street, addr_city, addr_state, addr_zip (mínimo)
-                reader = csv.DictReader(wrapped)
-
-                # ---------- helpers locales ----------
-                from decimal import Decimal, InvalidOperation
-                from datetime import datetime
-
-                def _d(n):
-                    if n is None:
-                        return None
-                    s = str(n).strip()
-                    if not s:
-                        return None
-                    try:
-                        return Decimal(s)
-                    except InvalidOperation:
-                        return None
-
-                def _date(v):
-                    if not v:
-                        return None
-                    s = str(v).strip()
-                    if not s:
-                        return None
-                    # intenta YYYY-MM-DD, luego MM/DD/YYYY
-                    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
-                        try:
-                            return datetime.strptime(s, fmt).date()
-                        except ValueError:
-                            pass
-                    return None
-                # -------------------------------------
-
-                with transaction.atomic():
-                    for idx, row in enumerate(reader, start=1):
-                        total += 1
-                        try:
-                            # Validaciones mínimas + creación/actualización de Package
-                            tracking = (row.get('tracking_number') or row.get('tracking') or '').strip()
-                            if not tracking:
-                                raise ValueError('Falta número de tracking (tracking_number)')
-
-                            # Importaciones locales para evitar ciclos
-                            from packages.models import Package, Warehouse
-                            from drivers.models import Driver
-
-                            recipient_name = (row.get('recipient_name') or '').strip()
-                            addr_street    = (row.get('addr_street') or '').strip()
-                            addr_city      = (row.get('addr_city') or '').strip()
-                            addr_state     = (row.get('addr_state') or '').strip()
-                            addr_zip       = (row.get('addr_zip') or '').strip()
-
-                            if not recipient_name or not addr_street or not addr_city or not addr_zip:
-                                raise ValueError('Faltan columnas mínimas: recipient_name, addr_street, addr_city, addr_zip')
-
-                            note        = (row.get('note') or '').strip()
-                            weight      = _d(row.get('weight'))
-                            cod_amount  = _d(row.get('cod_amount'))
-                            dest_lat    = _d(row.get('dest_lat'))
-                            dest_lon    = _d(row.get('dest_lon'))
-                            promised    = _date(row.get('promised_date'))
-                            priority    = int(str(row.get('priority') or '0').strip() or 0)
-
-                            # Warehouse por nombre (opcional)
-                            wh = None
-                            wh_name = (row.get('warehouse') or '').strip()
-                            if wh_name:
-                                wh, _ = Warehouse.objects.get_or_create(name=wh_name)
-
-                            # Preasignación opcional por username
-                            assigned_driver = None
-                            drv_username = (row.get('driver_username') or '').strip()
-                            if drv_username:
-                                try:
-                                    assigned_driver = Driver.objects.select_related('user').get(user__username=drv_username)
-                                except Driver.DoesNotExist:
-                                    assigned_driver = None  # lo ignoramos si no existe
-
-                            # Construye defaults
-                            pkg_defaults = {
-                                'status': 'in_warehouse',
-                                'priority': priority,
-                                'recipient_name': recipient_name,
-                                'customer_phone': (row.get('customer_phone') or '').strip(),
-                                'addr_street': addr_street,
-                                'addr_city': addr_city,
-                                'addr_state': addr_state,
-                                'addr_zip': addr_zip,
-                                'note': note,
-                                'weight': weight,
-                                'cod_amount': cod_amount,
-                                'dest_lat': dest_lat,
-                                'dest_lon': dest_lon,
-                                'warehouse': wh,
-                                'promised_date': promised,
-                                'assigned_driver': assigned_driver,
-                            }
-
-                            Package.objects.update_or_create(
-                                tracking_number=tracking,
-                                defaults=pkg_defaults,
-                            )
-
-                            success += 1
-                        except Exception as e:
-                            ImportErrorRow.objects.create(
-                                batch=batch,
-                                row_number=idx,
-                                payload=row,
-                                error=str(e),
-                            )
-                            errors += 1
+                # El archivo se guarda y lo procesa el pool de importación;
+                # la petición sólo encola y redirige al detalle con el progreso.
+                batch.upload_path = default_storage.save(f'imports/uploads/{batch.pk}_{upload.name}', upload)
+                batch.save(update_fields=['upload_path'])
+                enqueue_batch(batch)
+                messages.info(request, 'Archivo recibido. La importación se procesa en segundo plano.')
+                return redirect('imports:detail', pk=batch.pk)
 
             elif source == 'speedx_api':
-                # Placeholder para llamada a API externa (SpeedX).
-                # Aquí deberías implementar el fetch y el parseo.
-                # Por ahora no hace nada, sólo marca el batch como sin cambios.
-                messages.info(request, 'Importación por API aún no implementada.')
-                total = success = errors = 0
-
-            # Actualizamos el batch
-            batch.total_records = total
-            batch.success_count = success
-            batch.error_count = errors
-            batch.status = 'done' if errors == 0 else 'completed_with_errors'
-            batch.save()
-
-            if errors:
-                messages.warning(
-                    request,
-                    f'Importación finalizada con {errors} errores. Revisa el detalle.'
-                )
+                # Las páginas se descargan en paralelo desde el pool de importación
+                # (ver speedx_api); aquí sólo se validan la config y los filtros.
+                get_config()
+                batch.params = {
+                    key: (request.POST.get(key) or '').strip()
+                    for key in ('date_from', 'date_to', 'filter')
+                }
+                batch.save(update_fields=['params'])
+                enqueue_batch(batch)
+                messages.info(request, 'Sincronización con SpeedX en curso.')
                 return redirect('imports:detail', pk=batch.pk)
 
-            messages.success(
-                request,
-                f'Importación completada. Registros: {total}, exitosos: {success}.'
-            )
-            return redirect('imports:list')
-
         except Exception as e:
             # Falla no controlada
             batch.status = 'failed'
@@ -292,9 +281,61 @@ def import_form(request):
 
 
 @user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
-def truck_receipt(request):
+def truck_receipt(request, code):
     """
-    Render simple de recibo de camión. Puedes ajustar el contexto según tu dominio.
+    Recibo de camión: resumen de lo esperado y pantalla de escaneo.
     """
-    context = {}
-    return render(request, 'imports/truck_receipt.html', context)
\ No newline at end of file
+    receipt = get_object_or_404(TruckReceipt.objects.select_related('warehouse'), code=code)
+    expected = Package.objects.filter(
+        tracking_number__in=receipt.items.exclude(status='unexpected').values('tracking_number')
+    )
+    summary = expected.aggregate(
+        unique_zips=Count('addr_zip', distinct=True), total_weight=Sum('weight'),
+    )
+    summary.update(receiving.summary(receipt))
+    summary['total_packages'] = summary['expected_total']
+    context = {
+        'receipt': receipt,
+        'warehouse': receipt.warehouse,
+        'summary': summary,
+        'sample_packages': expected.order_by('tracking_number')[:50],
+        'scan_max': SCANS_PER_REQUEST,
+    }
+    return render(request, 'imports/truck_receipt.html', context)
+
+
+@user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
+@require_POST
+def truck_receipt_scan(request, code):
+    """
+    Lote de escaneos de la pistola: JSON {"scans": [...]} o campo `scans`
+    con un tracking por línea. Responde con lo conciliado y los totales.
+    """
+    receipt = get_object_or_404(TruckReceipt, code=code)
+    if request.content_type == 'application/json':
+        try:
+            scans = json.loads(request.body).get('scans') or []
+        except (ValueError, AttributeError):
+            return JsonResponse({'detail': 'JSON inválido.'}, status=400)
+    else:
+        scans = (request.POST.get('scans') or '').splitlines()
+    if not isinstance(scans, list) or not all(isinstance(s, str) for s in scans):
+        return JsonResponse({'detail': '`scans` debe ser una lista de trackings.'}, status=400)
+    if len(scans) > SCANS_PER_REQUEST:
+        return JsonResponse({'detail': f'Máximo {SCANS_PER_REQUEST} escaneos por lote.'}, status=400)
+    return JsonResponse(receiving.scan_batch(receipt, scans))
+
+
+@user_passes_test(_can_manage_imports, login_url='login', redirect_field_name=None)
+@require_POST
+def truck_receipt_close(request, code):
+    """
+    Cierra la descarga: lo no escaneado queda como faltante.
+    """
+    receipt = get_object_or_404(TruckReceipt, code=code)
+    missing = receiving.close_receipt(receipt)
+    if missing:
+        messages.warning(request, f'Descarga cerrada con {missing} paquetes faltantes.')
+    else:
+        messages.success(request, 'Descarga cerrada sin faltantes.')
+    return redirect('imports:truck_receipt', code=receipt.code)
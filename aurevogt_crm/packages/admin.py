@@ -1,11 +1,11 @@
 from django.contrib import admin, messages
-from django.http import HttpResponse
 from django import forms
 from django.contrib.admin.helpers import ActionForm
-import csv
 
 from drivers.models import Driver
 from .models import Package, Warehouse
+from .exports import stream_csv
+from .services import bulk_assign, bulk_transition
 
 
 # --- Actions ---
@@ -21,38 +21,31 @@ def assign_by_zip(modeladmin, request, queryset):
     except (ValueError, Driver.DoesNotExist):
         messages.error(request, f"Driver {zip_driver} no existe.")
         return
-    updated = queryset.update(assigned_driver=driver)
+    updated = bulk_assign(queryset, driver, request.user)
     messages.success(request, f"Asignados {updated} paquetes a {driver}.")
 
 
+def _report_transition(request, result, label):
+    done = sum(result["transitioned"].values())
+    messages.success(request, f"{done} paquetes {label}.")
+    if result["rejected"]:
+        detail = ", ".join(f"{n} en {status}" for status, n in sorted(result["rejected"].items()))
+        messages.warning(request, f"Sin cambios por transición no permitida: {detail}.")
+
+
 @admin.action(description="Marcar Out for delivery")
 def mark_ofd(modeladmin, request, queryset):
-    updated = queryset.update(status="out_for_delivery")
-    messages.success(request, f"{updated} paquetes marcados OFD.")
+    _report_transition(request, bulk_transition(queryset, "out_for_delivery", request.user), "marcados OFD")
 
 
 @admin.action(description="Marcar Delivered")
 def mark_delivered(modeladmin, request, queryset):
-    updated = queryset.update(status="delivered")
-    messages.success(request, f"{updated} paquetes entregados.")
+    _report_transition(request, bulk_transition(queryset, "delivered", request.user), "entregados")
 
 
-@admin.action(description="Exportar CSV (básico)")
+@admin.action(description="Exportar CSV")
 def export_csv(modeladmin, request, queryset):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = "attachment; filename=packages.csv"
-    writer = csv.writer(response)
-    writer.writerow(["tracking_number", "status", "assigned_driver", "addr_city", "addr_zip", "created_at"])
-    for p in queryset.select_related("assigned_driver"):
-        writer.writerow([
-            getattr(p, "tracking_number", ""),
-            getattr(p, "status", ""),
-            getattr(p.assigned_driver, "name", "") if getattr(p, "assigned_driver", None) else "",
-            getattr(p, "addr_city", ""),
-            getattr(p, "addr_zip", ""),
-            getattr(p, "created_at", ""),
-        ])
-    return response
+    return stream_csv(queryset.order_by(*modeladmin.get_ordering(request)))
 
 
 # --- ActionForm para meter el Driver ID sin templates personalizados ---
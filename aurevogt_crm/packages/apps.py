@@ -1,4 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, using, **kwargs):
+    from .search import install
+    install(using)
 
 
 class PackagesConfig(AppConfig):
@@ -7,3 +13,4 @@ class PackagesConfig(AppConfig):
 
     def ready(self):
         import packages.signals  # noqa
+        post_migrate.connect(install_search_index, sender=self)
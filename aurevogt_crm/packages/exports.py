@@ -0,0 +1,72 @@
+import csv
+import io
+from itertools import islice
+
+from django.db.models import CharField, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (CSV header, values_list expression); "assigned_driver" is annotated below
+EXPORT_COLUMNS = (
+    ("tracking_number", "tracking_number"),
+    ("status", "status"),
+    ("assigned_driver", "assigned_driver_name"),
+    ("addr_city", "addr_city"),
+    ("addr_zip", "addr_zip"),
+    ("created_at", "created_at"),
+)
+
+
+def driver_name_expression(prefix="assigned_driver__user__"):
+    """SQL twin of str(Driver): full name, else username, else email."""
+    full_name = Trim(Concat(
+        f"{prefix}first_name", Value(" "), f"{prefix}last_name", output_field=CharField(),
+    ))
+    return Coalesce(
+        NullIf(full_name, Value("")),
+        NullIf(f"{prefix}username", Value("")),
+        f"{prefix}email",
+        Value(""),
+        output_field=CharField(),
+    )
+
+
+def export_rows(queryset, *, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterate the export rows of `queryset` as tuples, driver names joined in SQL.
+
+    Uses values_list().iterator(), so no model instances are built and only
+    one chunk of rows is held in memory at a time.
+    """
+    return (
+        queryset.annotate(assigned_driver_name=driver_name_expression())
+        .values_list(*(expr for _, expr in EXPORT_COLUMNS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def csv_chunks(queryset, *, chunk_size=EXPORT_CHUNK_SIZE):
+    """CSV text of `queryset` (header first), one string per `chunk_size` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        if len(chunk) < chunk_size:
+            return
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_csv(queryset, filename=None):
+    """StreamingHttpResponse with the CSV export of `queryset`, in its current order."""
+    filename = filename or f"packages-{timezone.localdate():%Y%m%d}.csv"
+    response = StreamingHttpResponse(csv_chunks(queryset), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
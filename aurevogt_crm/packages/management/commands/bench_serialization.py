@@ -0,0 +1,101 @@
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.renderers import ORJSONRenderer
+from core.serializers import serialize_values, values_plan
+from packages.models import Package
+from packages.serializers import PackageSerializer
+
+MOBILE_FIELDS = "id,tracking_number,status,recipient_name,addr_street,addr_zip"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el costo de serializar paquetes para la API: serializer + JSONRenderer "
+        "(como antes) contra values() + ORJSONRenderer, con todos los campos y con "
+        "?fields= de la app móvil. Crea filas sintéticas dentro de una transacción "
+        "que se deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--fields", default=MOBILE_FIELDS, help="Campos del caso ?fields=")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._seed(opts["rows"])
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rows):
+        now = timezone.now()
+        Package.objects.bulk_create([
+            Package(
+                tracking_number=f"BENCHSER{i:09d}", recipient_name=f"Cliente {i}", customer_phone="(305) 555-0100",
+                addr_street=f"{i} Main St", addr_city="Miami", addr_state="FL", addr_zip="33101",
+                weight=Decimal("1.25"), cod_amount=Decimal("10.00"), dest_lat=Decimal("25.774270"),
+                dest_lon=Decimal("-80.193660"), promised_date=now.date(), last_event_at=now,
+            )
+            for i in range(rows)
+        ], batch_size=2000)
+
+    def _run(self, opts):
+        rows, repeat = opts["rows"], opts["repeat"]
+        qs = Package.objects.filter(tracking_number__startswith="BENCHSER").order_by("-created_at")
+        factory = APIRequestFactory()
+        full = {"request": Request(factory.get("/api/packages/"))}
+        sparse = {"request": Request(factory.get("/api/packages/", {"fields": opts["fields"]}))}
+
+        def instances(context, renderer):
+            def run():
+                return renderer.render(PackageSerializer(list(qs), many=True, context=context).data)
+            return run
+
+        def values(context, renderer):
+            def run():
+                plan = values_plan(PackageSerializer(context=context))
+                return renderer.render(serialize_values(qs.values(*{c for _, c, _ in plan}), plan))
+            return run
+
+        cases = [
+            ("serializer + JSONRenderer (antes)", instances(full, JSONRenderer())),
+            ("serializer + ORJSONRenderer", instances(full, ORJSONRenderer())),
+            ("values() + ORJSONRenderer", values(full, ORJSONRenderer())),
+            ("?fields= serializer + JSONRenderer", instances(sparse, JSONRenderer())),
+            ("?fields= values() + ORJSONRenderer", values(sparse, ORJSONRenderer())),
+        ]
+        # Mismo JSON por los dos caminos (comparado ya parseado: el espaciado puede diferir)
+        for a, b in ((0, 2), (3, 4)):
+            if json.loads(cases[a][1]()) != json.loads(cases[b][1]()):
+                self.stderr.write(self.style.ERROR(f"Salida distinta: {cases[a][0]} / {cases[b][0]}"))
+
+        baseline = None
+        self.stdout.write(f"{rows} paquetes, mediana de {repeat} corridas, ms por 1.000 paquetes:")
+        for label, run in cases:
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                body = run()
+                times.append(time.perf_counter() - t0)
+            per_1000 = statistics.median(times) * 1000 * 1000 / rows
+            baseline = baseline or per_1000
+            self.stdout.write(
+                f"  {label:40} {per_1000:8.1f} ms  x{baseline / per_1000:4.1f}  ({len(body) / rows:.0f} KB/1.000)"
+            )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from packages.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las subidas POD sin terminar que llevan POD_UPLOAD_EXPIRE_HOURS "
+        "(24 por defecto) sin recibir datos, junto con sus archivos .part, y los "
+        ".part huérfanos de esa antigüedad. Pensado para un cron diario."
+    )
+
+    def handle(self, *args, **opts):
+        uploads, files = expire_uploads()
+        self.stdout.write(self.style.SUCCESS(f"{uploads} subidas y {files} archivos .part borrados."))
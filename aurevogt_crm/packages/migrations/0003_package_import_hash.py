@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_alter_package_options_package_addr_city_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
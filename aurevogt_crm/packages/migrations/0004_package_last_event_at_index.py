@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0004_locationping_captured_at_id_index'),
+        ('packages', '0003_package_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['last_event_at'], name='packages_pa_last_ev_2af768_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0004_locationping_captured_at_id_index'),
+        ('packages', '0004_package_last_event_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('op', models.CharField(max_length=16)),
+                ('result', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_operations', to='drivers.driver')),
+                ('package', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_operations', to='packages.package')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='packages_sy_created_61e4f5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('driver', 'key'), name='unique_driver_sync_key')],
+            },
+        ),
+    ]
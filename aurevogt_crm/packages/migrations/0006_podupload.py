@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_syncoperation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PodUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=16)),
+                ('size_bytes', models.PositiveIntegerField()),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('expected_checksum', models.CharField(blank=True, max_length=64)),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('mime_type', models.CharField(blank=True, max_length=64)),
+                ('path_local', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pod_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['checksum'], name='packages_po_checksu_968524_idx'), models.Index(fields=['created_by', 'expected_checksum'], name='packages_po_created_9c156b_idx')],
+            },
+        ),
+    ]
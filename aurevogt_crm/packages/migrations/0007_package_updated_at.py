@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0004_locationping_captured_at_id_index'),
+        ('packages', '0006_podupload'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='package',
+            name='packages_pa_last_ev_2af768_idx',
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['updated_at'], name='packages_pa_updated_90f7a4_idx'),
+        ),
+    ]
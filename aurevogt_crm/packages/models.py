@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
@@ -65,6 +68,8 @@ class Warehouse(models.Model):
 class Package(models.Model):
     tracking_number = models.CharField(max_length=64, unique=True)
     speedx_id = models.CharField(max_length=64, blank=True, null=True)
+    # Huella de los campos que escribe el importador; si no cambia, la fila se omite
+    import_hash = models.CharField(max_length=32, blank=True, editable=False)
     status = models.CharField(max_length=32, choices=PACKAGE_STATUS, default="received", db_index=True)
     priority = models.IntegerField(default=0)
 
@@ -96,15 +101,56 @@ class Package(models.Model):
     attempt_count = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
     last_event_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Any write to the row; the API's ETag validator (core.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Status as loaded from the DB (None for new instances or when `status` was deferred)
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get("fields")
+        if fields is None or "status" in fields:
+            self._loaded_status = self.__dict__.get("status")
+
+    def save(self, *args, **kwargs):
+        # updated_at (auto_now) must be written too, or a partial save keeps clients' ETags valid
+        update_fields = kwargs.get("update_fields")
+        if update_fields and "updated_at" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "updated_at"]
+        super().save(*args, **kwargs)
+        # Only a save that wrote status moves the DB value; the post_save signal
+        # consumes the pending log_transition_as() event when it logs the transition
+        if update_fields is None or "status" in update_fields:
+            self._loaded_status = self.status
+
+    def previous_status(self):
+        """Status stored in the DB; only queries if it was not loaded with the instance."""
+        if self._loaded_status is None and self.pk:
+            self._loaded_status = (
+                type(self).objects.filter(pk=self.pk).values_list("status", flat=True).first()
+            )
+        return self._loaded_status
+
+    def log_transition_as(self, type, **fields):
+        """
+        Make the next save() that changes status log a PackageEvent of this
+        type (with extra fields such as driver, lat, lon, notes) instead of
+        the generic "updated" event.
+        """
+        self._transition_event = {"type": type, **fields}
 
     def clean(self):
         """Validate that the new status is reachable from the previous one."""
         # If this is an update (has pk), enforce finite-state transition rules
         if self.pk:
-            try:
-                previous_status = type(self).objects.only("status").get(pk=self.pk).status
-            except type(self).DoesNotExist:
-                previous_status = None
+            previous_status = self.previous_status()
             # Only validate when the status actually changes
             if previous_status and self.status != previous_status:
                 allowed = VALID_NEXT_STATUS.get(previous_status, set())
@@ -130,6 +176,7 @@ class Package(models.Model):
             models.Index(fields=["addr_zip"]),
             models.Index(fields=["addr_city"]),
             models.Index(fields=["created_at"]),
+            models.Index(fields=["updated_at"]),
         ]
         constraints = [
             models.CheckConstraint(check=models.Q(attempt_count__gte=0), name="packages_attempt_count_gte_0"),
@@ -206,5 +253,80 @@ class PodPhoto(models.Model):
             models.Index(fields=["taken_at"]),
         ]
 
+    @property
+    def url(self):
+        """MEDIA_URL of the photo, or None when path_local isn't a file under MEDIA_ROOT/pod/."""
+        # Older clients sent the photo's path on the device ("/storage/...", "content://...")
+        parts = self.path_local.split("/")
+        if parts[0] != "pod" or ".." in parts or ":" in self.path_local:
+            return None
+        return settings.MEDIA_URL + self.path_local
+
+    def __str__(self):
+        return f"POD {self.package.tracking_number} • {self.path_local}"
+
+class SyncOperation(models.Model):
+    """An offline-sync operation applied for a driver, keyed by the client's idempotency key."""
+    driver = models.ForeignKey("drivers.Driver", on_delete=models.CASCADE, related_name="sync_operations")
+    key = models.CharField(max_length=64)
+    op = models.CharField(max_length=16)
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, null=True, blank=True, related_name="sync_operations")
+    # Per-item result returned to the client, replayed verbatim on retries
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["driver", "key"], name="unique_driver_sync_key"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_id} • {self.key} • {self.op}"
+
+
+UPLOAD_STATUS = (
+    ("uploading", "Uploading"),
+    ("complete", "Complete"),
+    ("failed", "Failed"),
+)
+
+
+class PodUpload(models.Model):
+    """
+    Chunked, resumable upload of a POD image (see packages.uploads). Once
+    complete it points at the content-addressed file for its SHA-256.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="pod_uploads")
+    status = models.CharField(max_length=16, choices=UPLOAD_STATUS, default="uploading")
+    size_bytes = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)  # bytes received so far
+    expected_checksum = models.CharField(max_length=64, blank=True)  # SHA-256 announced by the client
+    checksum = models.CharField(max_length=64, blank=True)  # SHA-256 computed while receiving
+    mime_type = models.CharField(max_length=64, blank=True)
+    path_local = models.CharField(max_length=255, blank=True)  # MEDIA_ROOT relative path
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["checksum"]),
+            models.Index(fields=["created_by", "expected_checksum"]),
+        ]
+
+    def photo_fields(self):
+        """PodPhoto fields filled from the received file."""
+        return {
+            "path_local": self.path_local, "mime_type": self.mime_type,
+            "size_bytes": self.size_bytes, "checksum": self.checksum,
+        }
+
+    @property
+    def url(self):
+        return settings.MEDIA_URL + self.path_local if self.path_local else None
+
     def __str__(self):
-        return f"POD {self.package.tracking_number} • {self.path_local}"
\ No newline at end of file
+        return f"{self.id} • {self.status} • {self.offset}/{self.size_bytes}"
@@ -0,0 +1,212 @@
+"""
+Indexed substring search over tracking_number, recipient_name and customer_phone.
+
+- SQLite: an FTS5 table with the trigram tokenizer, filled by triggers on
+  packages_package, so save(), bulk_create/upserts from the importers and
+  queryset.update() all keep it in sync without Python code on the write path.
+- PostgreSQL: pg_trgm GIN indexes, queried with ILIKE.
+- Anything else: plain icontains.
+
+Phones are indexed without the punctuation in _PHONE_CHARS, so "305-555"
+finds "(305) 555-1234". Every backend strips that same set (SQLite with
+replace(), PostgreSQL with translate(), the search term with phone_key()),
+because the SQLite triggers can only use built-in functions; anything else
+in the column, like "ext 12", is kept. Trigram indexes need at least 3
+characters; shorter terms fall back to icontains. install() is idempotent and runs on post_migrate: Django's SQLite
+schema editor rebuilds tables on ALTER, which drops their triggers, so the
+next migrate recreates them and reindexes.
+"""
+import logging
+import re
+import sqlite3
+
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Package
+
+logger = logging.getLogger(__name__)
+
+MIN_TERM_LENGTH = 3
+FTS_TABLE = "packages_package_search"
+PHONE_LIKE = re.compile(r"[0-9 ().+\-/]+")
+
+# Phone punctuation stripped before indexing; the SQLite trigger can't run a regex
+_PHONE_CHARS = " -()+./"
+
+
+def phone_key(value):
+    """The phone as indexed: `value` without _PHONE_CHARS."""
+    return (value or "").translate({ord(char): None for char in _PHONE_CHARS})
+
+
+def _sqlite_phone(column):
+    sql = f"coalesce({column}, '')"
+    for char in _PHONE_CHARS:
+        sql = f"replace({sql}, '{char}', '')"
+    return sql
+
+
+def _postgres_phone(column):
+    return f"translate(coalesce({column}, ''), '{_PHONE_CHARS}', '')"
+
+
+def _column(connection, name):
+    qn = connection.ops.quote_name
+    return f"{qn(Package._meta.db_table)}.{qn(name)}"
+
+
+def _fts5_trigram_available():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(a, tokenize='trigram')")
+    except sqlite3.Error:
+        return False
+    return True
+
+
+FTS5_TRIGRAM = _fts5_trigram_available()
+
+
+def _icontains(term):
+    return Q(tracking_number__icontains=term) | Q(recipient_name__icontains=term) | Q(customer_phone__icontains=term)
+
+
+def _phone_term(term):
+    """Digits to search in the phone column, or "" if the term doesn't look like a phone."""
+    digits = phone_key(term)
+    if len(digits) >= MIN_TERM_LENGTH and PHONE_LIKE.fullmatch(term):
+        return digits
+    return ""
+
+
+# --- SQLite FTS5 ---
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _sqlite_term(term):
+    match = "{tracking_number recipient_name} : " + _fts_phrase(term)
+    digits = _phone_term(term)
+    if digits:
+        match += " OR phone : " + _fts_phrase(digits)
+    return Q(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+
+
+def _sqlite_triggers(table):
+    return {
+        f"{FTS_TABLE}_ai": f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {FTS_TABLE} (rowid, tracking_number, recipient_name, phone)
+                VALUES (new.id, new.tracking_number, new.recipient_name, {_sqlite_phone("new.customer_phone")});
+            END""",
+        f"{FTS_TABLE}_au": f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {table}
+            WHEN old.tracking_number IS NOT new.tracking_number
+                OR old.recipient_name IS NOT new.recipient_name
+                OR old.customer_phone IS NOT new.customer_phone
+            BEGIN
+                UPDATE {FTS_TABLE}
+                SET tracking_number = new.tracking_number, recipient_name = new.recipient_name,
+                    phone = {_sqlite_phone("new.customer_phone")}
+                WHERE rowid = new.id;
+            END""",
+        f"{FTS_TABLE}_ad": f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN
+                DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+            END""",
+    }
+
+
+def _install_sqlite(connection, cursor):
+    table = Package._meta.db_table
+    triggers = _sqlite_triggers(connection.ops.quote_name(table))
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+    missing = set(triggers) - {name for (name,) in cursor.fetchall()}
+    if not missing:
+        return
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(tracking_number, recipient_name, phone, tokenize='trigram')"
+    )
+    for name in missing:
+        cursor.execute(triggers[name])
+    # Without a trigger some writes went unindexed: rebuild from the table
+    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    cursor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, tracking_number, recipient_name, phone) "
+        f"SELECT id, tracking_number, recipient_name, {_sqlite_phone('customer_phone')} "
+        f"FROM {connection.ops.quote_name(table)}"
+    )
+
+
+# --- PostgreSQL pg_trgm ---
+
+def _like_pattern(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _postgres_term(connection, term):
+    sql = f"({_column(connection, 'tracking_number')} ILIKE %s OR {_column(connection, 'recipient_name')} ILIKE %s"
+    params = [_like_pattern(term)] * 2
+    digits = _phone_term(term)
+    if digits:
+        sql += f" OR {_postgres_phone(_column(connection, 'customer_phone'))} LIKE %s"
+        params.append(_like_pattern(digits))
+    return Q(RawSQL(sql + ")", params, output_field=BooleanField()))
+
+
+def _install_postgres(connection, cursor):
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception:
+        logger.warning("pg_trgm not available; package search will not be indexed", exc_info=True)
+        return
+    qn = connection.ops.quote_name
+    table = Package._meta.db_table
+    # Superseded by the translate() index, which matches what the SQLite triggers store
+    cursor.execute(f"DROP INDEX IF EXISTS {qn(table + '_phone_trgm')}")
+    for suffix, expression in (
+        ("tracking_trgm", qn("tracking_number")),
+        ("recipient_trgm", qn("recipient_name")),
+        ("phone_key_trgm", f"({_postgres_phone(qn('customer_phone'))})"),
+    ):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_{suffix}')} ON {qn(table)} "
+            f"USING gin ({expression} gin_trgm_ops)"
+        )
+
+
+def _term_filter(connection):
+    if connection.vendor == "sqlite" and FTS5_TRIGRAM:
+        return _sqlite_term
+    if connection.vendor == "postgresql":
+        return lambda term: _postgres_term(connection, term)
+    return None
+
+
+def search_packages(queryset, terms):
+    """
+    Filter a Package queryset by search terms (a string is split on whitespace).
+    Every term must match tracking number, recipient name or phone, as in DRF's SearchFilter.
+    """
+    if isinstance(terms, str):
+        terms = terms.split()
+    indexed = _term_filter(connections[queryset.db])
+    for term in terms:
+        if indexed is not None and len(term) >= MIN_TERM_LENGTH:
+            queryset = queryset.filter(indexed(term))
+        else:
+            queryset = queryset.filter(_icontains(term))
+    return queryset
+
+
+def install(using="default"):
+    """Create or repair the search index for the database `using`."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite" and FTS5_TRIGRAM:
+            _install_sqlite(connection, cursor)
+        elif connection.vendor == "postgresql":
+            _install_postgres(connection, cursor)
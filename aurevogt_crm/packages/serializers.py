@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from core.serializers import SparseFieldsMixin
 from .models import Package, PackageEvent, DeliveryAttempt, PodPhoto
 
-class PackageSerializer(serializers.ModelSerializer):
+class PackageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Package
         fields = '__all__'
@@ -9,4 +10,31 @@ class PackageSerializer(serializers.ModelSerializer):
 class DeliveryAttemptSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeliveryAttempt
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class PackageEventSerializer(serializers.ModelSerializer):
+    driver_name = serializers.StringRelatedField(source='driver')
+
+    class Meta:
+        model = PackageEvent
+        exclude = ['package']
+
+class PodPhotoSerializer(serializers.ModelSerializer):
+    url = serializers.ReadOnlyField()
+
+    class Meta:
+        model = PodPhoto
+        exclude = ['package', 'attempt']
+
+class TimelineAttemptSerializer(serializers.ModelSerializer):
+    driver_name = serializers.StringRelatedField(source='driver')
+    photos = PodPhotoSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = DeliveryAttempt
+        exclude = ['package']
+
+class TimelineSerializer(serializers.Serializer):
+    """packages.timeline.Timeline: eventos (más recientes primero) e intentos con sus fotos."""
+    events = PackageEventSerializer(many=True)
+    attempts = TimelineAttemptSerializer(many=True)
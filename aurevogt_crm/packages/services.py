@@ -0,0 +1,139 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import VALID_NEXT_STATUS, DeliveryAttempt, Package, PackageEvent
+
+# Timestamp column stamped when a package enters each status
+TRANSITION_TIMESTAMPS = {
+    "out_for_delivery": "out_for_delivery_at",
+    "delivered": "delivered_at",
+}
+# Ids per "id IN (...)" UPDATE, under SQLite's bound-parameter limit
+UPDATE_BATCH_SIZE = 2000
+# PackageEvent.type written for each target status ("updated" otherwise)
+TRANSITION_EVENT_TYPES = {
+    "out_for_delivery": "ofd",
+    "delivered": "delivered",
+    "failed_attempt": "failed",
+    "returned": "returned",
+}
+
+
+def bulk_transition(queryset, to_status, actor=None, *, notes=""):
+    """
+    Move every package in `queryset` to `to_status` where VALID_NEXT_STATUS allows it.
+
+    One SELECT ... FOR UPDATE reads (id, status, driver) for the events, then
+    the locked ids of each allowed source status are updated by primary key
+    (so the queryset's filters aren't re-evaluated) and the events are
+    written in a single bulk insert.
+    Packages whose current status can't reach `to_status` are left untouched.
+    `actor` (the user triggering it) is recorded in the events' metadata.
+
+    Returns {"transitioned": {from_status: n}, "rejected": {status: n}}.
+    """
+    sources = {status for status, allowed in VALID_NEXT_STATUS.items() if to_status in allowed}
+    queryset = queryset.order_by()
+    now = timezone.now()
+    changes = {"status": to_status, "last_event_at": now, "updated_at": now}
+    if to_status in TRANSITION_TIMESTAMPS:
+        changes[TRANSITION_TIMESTAMPS[to_status]] = now
+    metadata = {"bulk": True}
+    if actor is not None:
+        metadata["actor"] = actor.pk
+    event_type = TRANSITION_EVENT_TYPES.get(to_status, "updated")
+
+    transitioned, rejected = {}, {}
+    with transaction.atomic():
+        by_status = defaultdict(list)
+        rows = queryset.select_for_update().values_list("id", "status", "assigned_driver_id")
+        for pk, status, driver_id in rows:
+            by_status[status].append((pk, driver_id))
+
+        events = []
+        for status, items in by_status.items():
+            if status not in sources:
+                rejected[status] = len(items)
+                continue
+            # Conditional on the source status: rows changed since the SELECT are skipped
+            ids = [pk for pk, _ in items]
+            transitioned[status] = sum(
+                Package.objects.filter(id__in=ids[i:i + UPDATE_BATCH_SIZE], status=status).update(**changes)
+                for i in range(0, len(ids), UPDATE_BATCH_SIZE)
+            )
+            events.extend(
+                PackageEvent(
+                    package_id=pk, type=event_type, status_from=status, status_to=to_status,
+                    driver_id=driver_id, notes=notes, metadata=metadata,
+                )
+                for pk, driver_id in items
+            )
+        PackageEvent.objects.bulk_create(events, batch_size=2000)
+    return {"transitioned": transitioned, "rejected": rejected}
+
+
+def bulk_assign(queryset, driver, actor=None):
+    """
+    Assign every package in `queryset` to `driver` and log one "assigned" event each.
+
+    The queryset's (id, status) rows are read with SELECT ... FOR UPDATE, so
+    a package another dispatcher claims in the meantime either is locked
+    before this read (and a filter like assigned_driver__isnull=True then
+    leaves it out) or waits for this transaction. The locked ids are updated
+    by primary key and the events, built from the same rows, are written in
+    one bulk insert, all inside a single transaction.
+
+    Returns the number of packages assigned.
+    """
+    now = timezone.now()
+    metadata = {"bulk": True}
+    if actor is not None:
+        metadata["actor"] = actor.pk
+    with transaction.atomic():
+        rows = list(queryset.order_by().select_for_update().values_list("id", "status"))
+        ids = [pk for pk, _ in rows]
+        assigned = sum(
+            Package.objects.filter(id__in=ids[i:i + UPDATE_BATCH_SIZE]).update(
+                assigned_driver=driver, assigned_at=now, last_event_at=now, updated_at=now
+            )
+            for i in range(0, len(ids), UPDATE_BATCH_SIZE)
+        )
+        PackageEvent.objects.bulk_create(
+            [
+                PackageEvent(
+                    package_id=pk, type="assigned", status_from=status, status_to=status,
+                    driver=driver, metadata=metadata,
+                )
+                for pk, status in rows
+            ],
+            batch_size=2000,
+        )
+    return assigned
+
+
+def next_attempt_no(package):
+    """
+    Atomically bump `package.attempt_count` and return it: the attempt_no
+    for the DeliveryAttempt about to be inserted.
+
+    Call it inside the transaction that inserts the attempt. The UPDATE is
+    the transaction's first write and takes the row lock (the database
+    write lock on SQLite), so a concurrent confirm/fail on the same package
+    waits for this one to commit and then numbers after it. The counter is
+    never left below an existing attempt_no, in case attempts were recorded
+    without bumping it. `package` is refreshed with the stored attempt_count
+    and status.
+    """
+    last_attempt = (
+        DeliveryAttempt.objects.filter(package=OuterRef("pk")).order_by("-attempt_no").values("attempt_no")[:1]
+    )
+    type(package).objects.filter(pk=package.pk).update(
+        attempt_count=Greatest(F("attempt_count"), Coalesce(Subquery(last_attempt), 0)) + 1,
+        updated_at=timezone.now(),
+    )
+    package.refresh_from_db(fields=["attempt_count", "status"])
+    return package.attempt_count
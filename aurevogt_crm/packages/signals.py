@@ -1,16 +1,30 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Package, PackageEvent
+from .models import Package, PackageEvent, DeliveryAttempt, PodPhoto
+from .timeline import invalidate_timeline
 
 @receiver(pre_save, sender=Package)
 def _keep_prev_status(sender, instance, **kwargs):
+    # Normally captured in Package.from_db; only queries if status was deferred
     if instance.pk:
-        instance._prev_status = Package.objects.get(pk=instance.pk).status
+        instance.previous_status()
 
 @receiver(post_save, sender=Package)
-def _log_event(sender, instance, created, **kwargs):
-    prev = getattr(instance, "_prev_status", None)
+def _log_event(sender, instance, created, update_fields=None, **kwargs):
+    prev = instance._loaded_status
     if created:
         PackageEvent.objects.create(package=instance, type="created", status_from="", status_to=instance.status)
+    elif update_fields is not None and "status" not in update_fields:
+        return  # status was not written
     elif prev and prev != instance.status:
-        PackageEvent.objects.create(package=instance, type="updated", status_from=prev, status_to=instance.status)
\ No newline at end of file
+        event = instance.__dict__.pop("_transition_event", None) or {"type": "updated"}
+        PackageEvent.objects.create(package=instance, status_from=prev, status_to=instance.status, **event)
+
+@receiver(post_save, sender=PackageEvent)
+@receiver(post_save, sender=DeliveryAttempt)
+@receiver(post_save, sender=PodPhoto)
+@receiver(post_delete, sender=PackageEvent)
+@receiver(post_delete, sender=DeliveryAttempt)
+@receiver(post_delete, sender=PodPhoto)
+def _invalidate_timeline(sender, instance, **kwargs):
+    invalidate_timeline(instance.package_id)
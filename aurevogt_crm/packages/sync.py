@@ -0,0 +1,245 @@
+"""
+Batched offline sync of delivery confirmations and failures.
+
+Drivers queue confirm/fail operations while offline and replay the whole
+queue in one request. apply_sync() validates every item, then in a single
+transaction locks the packages involved, answers keys that were already
+applied with their stored result, and writes attempts, POD photos and
+events with one bulk insert each plus one bulk UPDATE of the packages.
+
+Every applied or rejected item records its idempotency key in
+SyncOperation together with its result, so retrying a batch (including one
+that committed after the client gave up waiting) is a no-op that returns
+the same answers. Two requests racing with the same keys: the loser hits
+the unique (driver, key) constraint, rolls back and runs once more, and on
+that pass those keys are replays. Any other IntegrityError propagates.
+
+Attempt numbers continue from the higher of attempt_count and the last
+stored attempt_no of each package, like next_attempt_no().
+
+Photos given as {upload_id} (see packages.uploads) are resolved for the
+whole batch in one query, among the uploads of the requesting user (the
+driver's own when there is none). An item whose upload isn't complete is
+answered "invalid" without recording its key, so it can be retried once
+it is.
+"""
+import decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import VALID_NEXT_STATUS, DeliveryAttempt, Package, PackageEvent, PodPhoto, SyncOperation
+from .uploads import resolve_photos
+
+# op -> (target status, DeliveryAttempt.result, PackageEvent.type), as in the confirm/fail actions
+OPERATIONS = {
+    "confirm": ("delivered", "delivered", "delivered"),
+    "fail": ("failed_attempt", "failed", "failed"),
+}
+MAX_OPERATIONS = 200
+KEY_MAX_LENGTH = SyncOperation._meta.get_field("key").max_length
+_COORDINATE_STEP = decimal.Decimal("0.000001")
+
+
+class SyncError(ValueError):
+    """The batch as a whole can't be processed."""
+
+
+def _coordinate(value, limit):
+    try:
+        number = decimal.Decimal(str(value)).quantize(_COORDINATE_STEP)
+    except decimal.InvalidOperation:
+        return None
+    return number if abs(number) <= limit else None
+
+
+def _photos(raw):
+    if raw is None:
+        return []
+    if not isinstance(raw, list):
+        return None
+    photos = []
+    for photo in raw:
+        if not isinstance(photo, dict):
+            return None
+        if photo.get("upload_id"):
+            # Resolved for the whole batch in apply_sync
+            photos.append({"upload_id": str(photo["upload_id"])})
+            continue
+        path, checksum = photo.get("path_local"), photo.get("checksum") or ""
+        if not isinstance(path, str) or not path or len(path) > 255 or not isinstance(checksum, str) or len(checksum) > 64:
+            return None
+        photos.append({"path_local": path, "checksum": checksum})
+    return photos
+
+
+def _parse(item):
+    """(operation, None) for a well-formed item, (None, result) otherwise."""
+    if not isinstance(item, dict):
+        return None, {"key": None, "status": "invalid", "detail": "Cada operación debe ser un objeto."}
+    key = item.get("key")
+    if not isinstance(key, str) or not key or len(key) > KEY_MAX_LENGTH:
+        return None, {"key": None, "status": "invalid", "detail": f"key es requerido (máx. {KEY_MAX_LENGTH} caracteres)."}
+
+    def invalid(detail):
+        return None, {"key": key, "status": "invalid", "detail": detail}
+
+    if item.get("op") not in OPERATIONS:
+        return invalid(f"op debe ser uno de: {', '.join(OPERATIONS)}.")
+    try:
+        package_id = int(item.get("package_id"))
+    except (TypeError, ValueError):
+        return invalid("package_id es requerido.")
+    gps = item.get("gps") if isinstance(item.get("gps"), dict) else {}
+    lat, lon = _coordinate(gps.get("lat"), 90), _coordinate(gps.get("lon"), 180)
+    if lat is None or lon is None:
+        return invalid("gps.lat y gps.lon son requeridos y deben ser coordenadas válidas.")
+    reason_code = item.get("reason_code") or ""
+    if item["op"] == "fail" and not reason_code:
+        return invalid("reason_code es requerido")
+    photos = _photos(item.get("photos"))
+    if photos is None:
+        return invalid("photos debe ser una lista de {upload_id} o {path_local, checksum}.")
+    return {
+        "key": key, "op": item["op"], "package_id": package_id, "lat": lat, "lon": lon,
+        "reason_code": str(reason_code)[:40], "notes": str(item.get("notes") or ""), "photos": photos,
+    }, None
+
+
+def apply_sync(driver, operations, user=None):
+    """
+    Apply a driver's queued operations; returns one result dict per item, in order:
+    status "applied" (with attempt_no), "rejected" or "invalid" (with detail),
+    plus replayed=True when the key had already been processed.
+    Raises SyncError if `operations` isn't a list or exceeds the batch limit.
+    """
+    if not isinstance(operations, list):
+        raise SyncError("operations debe ser una lista.")
+    limit = getattr(settings, "DELIVERY_SYNC_MAX_OPERATIONS", MAX_OPERATIONS)
+    if len(operations) > limit:
+        raise SyncError(f"Máximo {limit} operaciones por lote.")
+
+    results = [None] * len(operations)
+    parsed = []
+    for i, item in enumerate(operations):
+        op, error = _parse(item)
+        if error is not None:
+            results[i] = error
+        else:
+            parsed.append((i, op))
+    if any("upload_id" in photo for _, op in parsed for photo in op["photos"]):
+        resolved = resolve_photos([op["photos"] for _, op in parsed], user if user is not None else driver.user)
+        for (i, op), photos in zip(list(parsed), resolved):
+            if photos is None:
+                # Not recorded under its key: once the upload finishes the client can retry it
+                results[i] = {"key": op["key"], "status": "invalid", "detail": "photos: subida inexistente o incompleta."}
+                parsed.remove((i, op))
+            else:
+                op["photos"] = photos
+    if parsed:
+        for retry in (False, True):
+            done = {}
+            try:
+                with transaction.atomic():
+                    done = _done(driver, parsed)
+                    applied = _apply(driver, parsed, user, done)
+                break
+            except IntegrityError:
+                # Only worth another pass if a concurrent request claimed some of these keys first
+                if retry or not (_done(driver, parsed).keys() - done.keys()):
+                    raise
+        for i, result in applied.items():
+            results[i] = result
+    return results
+
+
+def _done(driver, parsed):
+    """{key: stored result} for the keys of `parsed` already recorded."""
+    return dict(
+        SyncOperation.objects.filter(driver=driver, key__in={op["key"] for _, op in parsed})
+        .values_list("key", "result")
+    )
+
+
+def _apply(driver, parsed, user, done):
+    can_override = user is not None and user.has_perm("packages.change_package")
+    packages = Package.objects.select_for_update().in_bulk(
+        {op["package_id"] for _, op in parsed if op["key"] not in done}
+    )
+    if packages:
+        # Attempts recorded without bumping attempt_count would collide with attempt_count + 1
+        last_numbers = dict(
+            DeliveryAttempt.objects.filter(package_id__in=packages).values("package_id")
+            .annotate(last=Max("attempt_no")).values_list("package_id", "last")
+        )
+        for pk, p in packages.items():
+            p.attempt_count = max(p.attempt_count, last_numbers.get(pk, 0))
+    now = timezone.now()
+    metadata = {"bulk": True, "sync": True}
+    if user is not None:
+        metadata["actor"] = user.pk
+
+    results, seen = {}, {}
+    records, attempts, events, touched = [], [], [], {}
+    for i, op in parsed:
+        key = op["key"]
+        if key in done or key in seen:
+            results[i] = {**(done.get(key) or seen[key]), "replayed": True}
+            continue
+        to_status, attempt_result, event_type = OPERATIONS[op["op"]]
+        p = packages.get(op["package_id"])
+        result = {"key": key, "package_id": op["package_id"]}
+        if p is None:
+            result.update(status="rejected", detail="Paquete inexistente.")
+        elif p.assigned_driver_id != driver.id and not can_override:
+            result.update(status="rejected", detail="Solo el conductor asignado o un usuario con permiso puede registrar el intento.")
+        elif to_status not in VALID_NEXT_STATUS.get(p.status, ()):
+            result.update(status="rejected", detail=f"Transición no permitida: {p.status} → {to_status}.")
+        else:
+            # Earlier items of the batch already moved p in memory: attempts number consecutively
+            attempt_no = p.attempt_count + 1
+            attempts.append((
+                DeliveryAttempt(
+                    package=p, driver=driver, attempt_no=attempt_no, result=attempt_result,
+                    reason_code=op["reason_code"], notes=op["notes"], lat=op["lat"], lon=op["lon"],
+                ),
+                op["photos"],
+            ))
+            events.append(PackageEvent(
+                package=p, type=event_type, status_from=p.status, status_to=to_status, driver=driver,
+                lat=op["lat"], lon=op["lon"], notes=op["notes"], metadata={**metadata, "key": key},
+            ))
+            p.status, p.attempt_count, p.last_event_at, p.updated_at = to_status, attempt_no, now, now
+            if to_status == "delivered":
+                p.delivered_at = now
+            touched[p.pk] = p
+            result.update(status="applied", attempt_no=attempt_no)
+        seen[key] = results[i] = result
+        records.append(SyncOperation(
+            driver=driver, key=key, op=op["op"], package_id=p.pk if p else None, result=result,
+        ))
+
+    # Keys first: a concurrent request with the same keys fails here, before writing anything else
+    SyncOperation.objects.bulk_create(records)
+    if attempts:
+        DeliveryAttempt.objects.bulk_create([attempt for attempt, _ in attempts])
+        if any(attempt.pk is None for attempt, _ in attempts):
+            # Backends without RETURNING don't set pks on bulk_create
+            ids = {
+                (package_id, attempt_no): pk
+                for package_id, attempt_no, pk in DeliveryAttempt.objects.filter(package_id__in=touched)
+                .values_list("package_id", "attempt_no", "id")
+            }
+            for attempt, _ in attempts:
+                attempt.pk = ids[(attempt.package_id, attempt.attempt_no)]
+        PodPhoto.objects.bulk_create([
+            PodPhoto(package_id=attempt.package_id, attempt=attempt, **photo)
+            for attempt, photos in attempts for photo in photos
+        ])
+        PackageEvent.objects.bulk_create(events)
+        Package.objects.bulk_update(
+            list(touched.values()), ["status", "attempt_count", "delivered_at", "last_event_at", "updated_at"]
+        )
+    return results
@@ -1,3 +1,561 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from drivers.models import Driver
+from . import search, sync, uploads
+from .models import DeliveryAttempt, Package, PackageEvent, PodPhoto, PodUpload, SyncOperation
+from .search import search_packages
+from .services import bulk_assign, bulk_transition
+from .sync import apply_sync
+from .timeline import TIMELINE_QUERIES, load_timeline, package_timeline
+from .views import PackageListView
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        cls.driver = Driver.objects.create(
+            user=User.objects.create_user("ana", first_name="Ana", last_name="Pérez"), license_number="L-1"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _package(self, attempts=0, photos_per_attempt=0):
+        p = Package.objects.create(
+            tracking_number=f"TL{Package.objects.count():06d}", recipient_name="Cliente",
+            addr_street="1 Main St", addr_city="Miami", addr_zip="33101",
+        )
+        for status in ("in_warehouse", "out_for_delivery"):
+            p.status = status
+            p.log_transition_as("ofd" if status == "out_for_delivery" else "updated", driver=self.driver)
+            p.save()
+        for n in range(1, attempts + 1):
+            attempt = DeliveryAttempt.objects.create(package=p, driver=self.driver, attempt_no=n, result="failed")
+            for i in range(photos_per_attempt):
+                PodPhoto.objects.create(package=p, attempt=attempt, path_local=f"pod/{p.pk}/{n}-{i}.jpg")
+        return p
+
+    def test_query_count_does_not_grow_with_history(self):
+        for attempts, photos in ((1, 1), (2, 0), (8, 3)):
+            p = self._package(attempts, photos)
+            with self.assertNumQueries(TIMELINE_QUERIES):
+                timeline = load_timeline(p.pk)
+                # Todo lo que usan la plantilla y el serializer ya está cargado
+                for ev in timeline.events:
+                    str(ev.driver or "")
+                for attempt in timeline.attempts:
+                    str(attempt.driver)
+                self.assertEqual(len(timeline.photos), attempts * photos)
+            self.assertEqual(len(timeline.events), 3)
+            self.assertEqual(len(timeline.attempts), attempts)
+
+    def test_cached_until_a_new_event(self):
+        p = self._package(attempts=1, photos_per_attempt=1)
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            package_timeline(p)
+        with self.assertNumQueries(0):
+            package_timeline(p)
+
+        bulk_transition(Package.objects.filter(pk=p.pk), "delivered", self.user)
+        p.refresh_from_db()
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            timeline = package_timeline(p)
+        self.assertEqual(timeline.events[0].type, "delivered")
+
+    def test_single_row_writes_drop_the_cached_entry(self):
+        p = self._package(attempts=1)
+        package_timeline(p)
+        attempt = DeliveryAttempt.objects.create(package=p, driver=self.driver, attempt_no=2, result="failed")
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            self.assertEqual(len(package_timeline(p).attempts), 2)
+        PodPhoto.objects.create(package=p, attempt=attempt, path_local="pod/x.jpg")
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            self.assertEqual(len(package_timeline(p).photos), 1)
+        attempt.delete()
+        with self.assertNumQueries(TIMELINE_QUERIES):
+            self.assertEqual(len(package_timeline(p).attempts), 1)
+
+    def test_photo_url_only_for_stored_files(self):
+        photo = PodPhoto(path_local="pod/sha256/ab/abc.jpg")
+        self.assertEqual(photo.url, "/media/pod/sha256/ab/abc.jpg")
+        for path in ("/storage/emulated/0/DCIM/1.jpg", "content://media/external/1", "pod/../config/x", "IMG_1.jpg"):
+            self.assertIsNone(PodPhoto(path_local=path).url, path)
+
+    def test_api_action_and_detail_view(self):
+        p = self._package(attempts=2, photos_per_attempt=2)
+        self.client.force_login(self.user)
+
+        data = self.client.get(f"/api/packages/{p.pk}/timeline/").json()
+        self.assertEqual(data["tracking_number"], p.tracking_number)
+        self.assertEqual([e["type"] for e in data["events"]], ["ofd", "updated", "created"])
+        self.assertEqual(data["events"][0]["driver_name"], "Ana Pérez")
+        self.assertEqual([a["attempt_no"] for a in data["attempts"]], [2, 1])
+        self.assertEqual(data["attempts"][0]["photos"][0]["url"], f"/media/pod/{p.pk}/2-0.jpg")
+
+        response = self.client.get(reverse("packages:detail", args=[p.pk]))
+        self.assertEqual(len(response.context["events"]), 3)
+        self.assertEqual(len(response.context["pod_photos"]), 4)
+        self.assertContains(response, "Ana Pérez")
+
+
+class TransitionEventTests(TestCase):
+    def test_partial_save_keeps_loaded_status_and_pending_event(self):
+        p = Package.objects.create(
+            tracking_number="EV000001", recipient_name="Cliente",
+            addr_street="1 Main St", addr_city="Miami", addr_zip="33101", status="in_warehouse",
+        )
+        p.log_transition_as("ofd", notes="ruta 4")
+        p.save()  # status sin cambios: el evento sigue pendiente
+        p.status = "out_for_delivery"
+        p.note = "frágil"
+        p.save(update_fields=["note"])  # no escribe status
+        self.assertEqual(p.previous_status(), "in_warehouse")
+        self.assertEqual(p.events.count(), 1)
+
+        p.save()
+        event = p.events.order_by("-id").first()
+        self.assertEqual((event.type, event.status_from, event.status_to), ("ofd", "in_warehouse", "out_for_delivery"))
+        self.assertEqual(event.notes, "ruta 4")
+        self.assertIsNone(getattr(p, "_transition_event", None))
+
+
+class BulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+
+    def _package(self, status, city="Miami"):
+        return Package.objects.create(
+            tracking_number=f"BT{Package.objects.count():06d}", recipient_name="Cliente",
+            addr_street="1 Main St", addr_city=city, addr_zip="33101", status=status,
+        )
+
+    def test_moves_allowed_sources_and_logs_one_event_each(self):
+        warehouse = [self._package("in_warehouse") for _ in range(3)]
+        failed = self._package("failed_attempt")
+        delivered = self._package("delivered")
+        elsewhere = self._package("in_warehouse", city="Tampa")
+
+        result = bulk_transition(Package.objects.filter(addr_city="Miami"), "out_for_delivery", self.user)
+
+        self.assertEqual(result, {
+            "transitioned": {"in_warehouse": 3, "failed_attempt": 1}, "rejected": {"delivered": 1},
+        })
+        for p in warehouse + [failed]:
+            p.refresh_from_db()
+            self.assertEqual(p.status, "out_for_delivery")
+            self.assertIsNotNone(p.out_for_delivery_at)
+            event = p.events.order_by("-id").first()
+            self.assertEqual((event.type, event.status_to), ("ofd", "out_for_delivery"))
+            self.assertEqual(event.metadata, {"bulk": True, "actor": self.user.pk})
+        delivered.refresh_from_db()
+        elsewhere.refresh_from_db()
+        self.assertEqual((delivered.status, elsewhere.status), ("delivered", "in_warehouse"))
+        self.assertFalse(PackageEvent.objects.filter(package__in=[delivered, elsewhere], type="ofd").exists())
+
+
+class BulkAssignTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        cls.driver = Driver.objects.create(user=User.objects.create_user("ana"), license_number="L-1")
+        cls.other = Driver.objects.create(user=User.objects.create_user("luis"), license_number="L-2")
+
+    def test_assigns_unclaimed_packages_and_logs_events(self):
+        packages = [
+            Package.objects.create(
+                tracking_number=f"BA{i:06d}", recipient_name="Cliente", addr_street="1 Main St",
+                addr_city="Miami", addr_zip="33101", status="in_warehouse",
+            )
+            for i in range(4)
+        ]
+        Package.objects.filter(pk=packages[0].pk).update(assigned_driver=self.other)
+
+        assigned = bulk_assign(Package.objects.filter(assigned_driver__isnull=True), self.driver, self.user)
+
+        self.assertEqual(assigned, 3)
+        self.assertEqual(Package.objects.filter(assigned_driver=self.driver).count(), 3)
+        self.assertEqual(Package.objects.get(pk=packages[0].pk).assigned_driver, self.other)
+        events = PackageEvent.objects.filter(type="assigned")
+        self.assertEqual(sorted(e.package_id for e in events), [p.pk for p in packages[1:]])
+        self.assertTrue(all(e.driver == self.driver and e.status_to == "in_warehouse" for e in events))
+        self.assertEqual(bulk_assign(Package.objects.filter(assigned_driver__isnull=True), self.driver), 0)
+
+
+class CSVExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana")
+        cls.driver = Driver.objects.create(
+            user=User.objects.create_user("luis", first_name="Luis", last_name="Gómez"), license_number="L-1"
+        )
+        cls.package = Package.objects.create(
+            tracking_number="CSV000001", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", assigned_driver=cls.driver,
+        )
+        Package.objects.create(
+            tracking_number="CSV000002", recipient_name="Cliente", addr_street="2 Main St",
+            addr_city="Tampa", addr_zip="33602",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_list_streams_the_filtered_queryset(self):
+        response = self.client.get("/api/packages/", {"format": "csv", "addr_city": "Miami"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "tracking_number,status,assigned_driver,addr_city,addr_zip,created_at")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("CSV000001,received,Luis Gómez,Miami,33101,"))
+
+    def test_only_the_list_offers_csv(self):
+        detail = f"/api/packages/{self.package.pk}/"
+        self.assertEqual(self.client.get(detail, {"format": "csv"}).status_code, 404)
+        self.assertEqual(self.client.get(detail, HTTP_ACCEPT="text/csv").status_code, 406)
+        self.assertEqual(self.client.get(f"{detail}timeline/", {"format": "csv"}).status_code, 404)
+        self.assertEqual(self.client.get(detail).status_code, 200)
+
+    def test_errors_render_as_csv_rows(self):
+        response = self.client.get("/api/packages/", {"format": "csv", "status": "bogus"})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.decode("utf-8").startswith("status,"))
+
+
+class SearchTests(TestCase):
+    PHONES = ("(305) 555-1234", "+1 786.555.9876", "305/555 0000 ext 12", "")
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, phone in enumerate(cls.PHONES):
+            Package.objects.create(
+                tracking_number=f"SPX{i:06d}", recipient_name=f"Cliente Núñez {i}", customer_phone=phone,
+                addr_street="1 Main St", addr_city="Miami", addr_zip="33101",
+            )
+
+    def _found(self, terms):
+        return sorted(search_packages(Package.objects.all(), terms).values_list("tracking_number", flat=True))
+
+    @skipUnless(connection.vendor == "sqlite" and search.FTS5_TRIGRAM, "índice FTS5 de SQLite")
+    def test_sqlite_index_stores_the_same_phone_key_as_python(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT phone FROM {search.FTS_TABLE} ORDER BY rowid")
+            stored = [phone for (phone,) in cursor.fetchall()]
+        self.assertEqual(stored, [search.phone_key(phone) for phone in self.PHONES])
+
+    def test_terms_match_tracking_name_and_phone(self):
+        self.assertEqual(self._found("SPX000002"), ["SPX000002"])
+        self.assertEqual(self._found("NÚÑEZ"), ["SPX000000", "SPX000001", "SPX000002", "SPX000003"])
+        self.assertEqual(self._found("SPX 0003"), ["SPX000003"])
+        self.assertEqual(self._found("305-555"), ["SPX000000", "SPX000002"])
+        self.assertEqual(self._found("(786) 555"), ["SPX000001"])
+        self.assertEqual(self._found("0000ext"), [])  # no parece teléfono: sólo tracking y nombre
+        self.assertEqual(self._found("5551234 cliente"), ["SPX000000"])
+
+    def test_postgres_sql_uses_the_model_table(self):
+        q = search._postgres_term(connection, "305-555")
+        sql, params = q.children[0].sql, q.children[0].params
+        table = connection.ops.quote_name(Package._meta.db_table)
+        self.assertIn(f"{table}.{connection.ops.quote_name('tracking_number')} ILIKE %s", sql)
+        self.assertIn(f"translate(coalesce({table}.{connection.ops.quote_name('customer_phone')}, ''), ' -()+./', '')", sql)
+        self.assertEqual(params, ["%305-555%", "%305-555%", "%305555%"])
+
+
+class PackageListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ana")
+        for i in range(5):
+            Package.objects.create(
+                tracking_number=f"LST{i:06d}", recipient_name="Cliente", addr_street="1 Main St",
+                addr_city="Miami" if i % 2 else "Doral", addr_zip="33101",
+            )
+        # Todos con el mismo created_at: el orden lo da el id
+        Package.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _trackings(self, response):
+        return [p.tracking_number for p in response.context["packages"]]
+
+    @mock.patch.object(PackageListView, "page_size", 2)
+    def test_next_and_previous_links_walk_the_list(self):
+        url = reverse("packages:list")
+        response = self.client.get(url)
+        pages = [self._trackings(response)]
+        self.assertIsNone(response.context["previous_url"])
+        while response.context["next_url"]:
+            response = self.client.get(url + response.context["next_url"])
+            pages.append(self._trackings(response))
+        self.assertEqual(pages, [["LST000004", "LST000003"], ["LST000002", "LST000001"], ["LST000000"]])
+        self.assertContains(response, "Anterior")
+
+        response = self.client.get(url + response.context["previous_url"])
+        self.assertEqual(self._trackings(response), pages[1])
+
+    @mock.patch.object(PackageListView, "page_size", 1)
+    def test_links_keep_the_filters(self):
+        response = self.client.get(reverse("packages:list"), {"city": "Miami"})
+        self.assertIn("city=Miami", response.context["next_url"])
+        response = self.client.get(reverse("packages:list") + response.context["next_url"])
+        self.assertEqual(self._trackings(response), ["LST000001"])
+        self.assertIsNone(response.context["next_url"])
+
+    def test_malformed_cursor_is_404(self):
+        self.assertEqual(self.client.get(reverse("packages:list"), {"cursor": "garbage"}).status_code, 404)
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = Driver.objects.create(user=User.objects.create_user("ana"), license_number="L-1")
+
+    def _package(self):
+        return Package.objects.create(
+            tracking_number=f"SY{Package.objects.count():06d}", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", status="out_for_delivery", assigned_driver=self.driver,
+        )
+
+    def _op(self, key, package, op="fail"):
+        return {"key": key, "op": op, "package_id": package.pk, "gps": {"lat": 25.7, "lon": -80.2}, "reason_code": "NA"}
+
+    def test_numbers_continue_after_attempts_recorded_without_the_counter(self):
+        p = self._package()
+        DeliveryAttempt.objects.create(package=p, driver=self.driver, attempt_no=1, result="failed")
+
+        results = apply_sync(self.driver, [self._op("k1", p), self._op("k2", p, "confirm")])
+
+        self.assertEqual([(r["status"], r.get("attempt_no")) for r in results], [("applied", 2), ("rejected", None)])
+        p.refresh_from_db()
+        self.assertEqual((p.status, p.attempt_count), ("failed_attempt", 2))
+
+    def test_only_key_conflicts_are_retried(self):
+        p = self._package()
+        with mock.patch("packages.sync._apply", side_effect=IntegrityError("CHECK constraint failed")) as apply:
+            with self.assertRaises(IntegrityError):
+                apply_sync(self.driver, [self._op("k1", p)])
+        self.assertEqual(apply.call_count, 1)
+
+        # Otro request registró k2 después de que este leyera las claves: choca, reintenta y es replay
+        SyncOperation.objects.create(
+            driver=self.driver, key="k2", op="fail", package_id=p.pk, result={"key": "k2", "status": "applied"},
+        )
+        reads = [{}]
+        real_done = sync._done
+        with mock.patch("packages.sync._done", side_effect=lambda *a: reads.pop() if reads else real_done(*a)):
+            results = apply_sync(self.driver, [self._op("k2", p)])
+        self.assertEqual(results, [{"key": "k2", "status": "applied", "replayed": True}])
+        self.assertFalse(DeliveryAttempt.objects.filter(package=p).exists())
+
+
+class ConcurrentAttemptTests(TransactionTestCase):
+    """confirm en paralelo sobre el mismo paquete: uno entrega, el resto recibe 409, sin 500."""
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.driver = Driver.objects.create(user=User.objects.create_user("ana"), license_number="L-1")
+        self.package = Package.objects.create(
+            tracking_number="RACE1", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", status="out_for_delivery", assigned_driver=self.driver,
+        )
+
+    def _post(self, client, barrier, responses):
+        body = {"package_id": self.package.pk, "driver_id": self.driver.pk, "gps": {"lat": 25.77, "lon": -80.19}}
+        try:
+            barrier.wait()
+            responses.append(client.post("/api/deliveries/confirm/", body, content_type="application/json"))
+        finally:
+            connection.close()
+
+    def test_double_taps_deliver_once(self):
+        clients = []
+        for _ in range(self.THREADS):
+            client = Client()
+            client.force_login(self.user)
+            clients.append(client)
+        barrier, responses = threading.Barrier(self.THREADS, timeout=30), []
+        threads = [threading.Thread(target=self._post, args=(client, barrier, responses)) for client in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(r.status_code for r in responses), [200] + [409] * (self.THREADS - 1))
+        self.assertEqual([r.json()["attempt_no"] for r in responses if r.status_code == 200], [1])
+        self.assertEqual(
+            {r.json()["detail"] for r in responses if r.status_code == 409},
+            {"Transición no permitida: delivered → delivered."},
+        )
+        self.package.refresh_from_db()
+        self.assertEqual((self.package.status, self.package.attempt_count), ("delivered", 1))
+        self.assertEqual(DeliveryAttempt.objects.filter(package=self.package).count(), 1)
+        self.assertEqual(self.package.events.filter(type="delivered").count(), 1)
+
+
+class PodUploadTests(TestCase):
+    PHOTO = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 600
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        cls.driver = Driver.objects.create(user=User.objects.create_user("ana"), license_number="L-1")
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+        self.checksum = hashlib.sha256(self.PHOTO).hexdigest()
+
+    def _patch(self, upload_id, offset, body):
+        return self.client.patch(
+            f"/api/pod-uploads/{upload_id}/", body, content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_resumed_upload_is_hashed_sniffed_and_deduplicated(self):
+        response = self.client.post("/api/pod-uploads/", {"size": len(self.PHOTO), "checksum": self.checksum})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()["id"]
+
+        half = len(self.PHOTO) // 2
+        self.assertEqual(self._patch(upload_id, 0, self.PHOTO[:half]).json()["offset"], half)
+        # Reintento con un offset viejo: 409 con el offset desde el que seguir
+        response = self._patch(upload_id, 0, self.PHOTO)
+        self.assertEqual((response.status_code, response.json()["offset"]), (409, half))
+        # Reanudación en otro proceso: el hash se reconstruye desde el archivo parcial
+        uploads._hashers.clear()
+        data = self._patch(upload_id, half, self.PHOTO[half:]).json()
+        self.assertEqual(data["status"], "complete")
+        self.assertEqual(data["checksum"], self.checksum)
+        self.assertEqual(data["mime_type"], "image/png")
+
+        upload = PodUpload.objects.get(pk=upload_id)
+        with open(os.path.join(self.media, upload.path_local), "rb") as f:
+            self.assertEqual(f.read(), self.PHOTO)
+        self.assertEqual(os.listdir(os.path.join(self.media, uploads.PARTIAL_DIR)), [])
+
+        # La misma foto otra vez: ya está guardada, no hay nada que enviar
+        with self.assertNumQueries(1):
+            self.assertEqual(uploads.open_upload(self.user, len(self.PHOTO), self.checksum), (upload, False))
+        response = self.client.post("/api/pod-uploads/", {"size": len(self.PHOTO), "checksum": self.checksum})
+        self.assertEqual((response.status_code, response.json()["id"]), (200, upload_id))
+
+        p = Package.objects.create(
+            tracking_number="POD1", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", status="out_for_delivery", assigned_driver=self.driver,
+        )
+        response = self.client.post("/api/deliveries/confirm/", {
+            "package_id": p.pk, "driver_id": self.driver.pk, "gps": {"lat": 25.77, "lon": -80.19},
+            "photos": [{"upload_id": upload_id}],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        photo = PodPhoto.objects.get(package=p)
+        self.assertEqual(
+            (photo.path_local, photo.checksum, photo.mime_type, photo.size_bytes),
+            (upload.path_local, self.checksum, "image/png", len(self.PHOTO)),
+        )
+
+    def _store_photo(self):
+        upload_id = self.client.post("/api/pod-uploads/", {"size": len(self.PHOTO), "checksum": self.checksum}).json()["id"]
+        self._patch(upload_id, 0, self.PHOTO)
+        return PodUpload.objects.get(pk=upload_id)
+
+    def test_stored_content_gives_each_user_their_own_upload(self):
+        upload = self._store_photo()
+        dispatcher = User.objects.create_user("luis", is_staff=True)
+        other = Client()
+        other.force_login(dispatcher)
+
+        response = other.post("/api/pod-uploads/", {"size": len(self.PHOTO), "checksum": self.checksum})
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertNotEqual(data["id"], str(upload.pk))
+        self.assertEqual((data["status"], data["offset"], data["url"]), ("complete", len(self.PHOTO), upload.url))
+        self.assertEqual(PodUpload.objects.get(pk=data["id"]).created_by, dispatcher)
+
+        self.assertEqual(other.get(f"/api/pod-uploads/{upload.pk}/").status_code, 404)
+        self.assertEqual(other.get(f"/api/pod-uploads/{data['id']}/").status_code, 200)
+        p = Package.objects.create(
+            tracking_number="POD3", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", status="out_for_delivery", assigned_driver=self.driver,
+        )
+        body = {"package_id": p.pk, "driver_id": self.driver.pk, "gps": {"lat": 25.77, "lon": -80.19}}
+        response = other.post("/api/deliveries/confirm/", {**body, "photos": [{"upload_id": str(upload.pk)}]},
+                              content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = other.post("/api/deliveries/confirm/", {**body, "photos": [{"upload_id": data["id"]}]},
+                              content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PodPhoto.objects.get(package=p).path_local, upload.path_local)
+
+    def test_expire_command_deletes_abandoned_uploads_and_part_files(self):
+        old = timezone.now() - timedelta(hours=25)
+
+        def part(upload_id, stale):
+            path = os.path.join(self.media, uploads.PARTIAL_DIR, f"{upload_id}.part")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x")
+            if stale:
+                os.utime(path, (old.timestamp(), old.timestamp()))
+            return path
+
+        abandoned, resumed, empty, recent = (
+            PodUpload.objects.create(created_by=self.user, size_bytes=10) for _ in range(4)
+        )
+        PodUpload.objects.filter(pk__in=[abandoned.pk, resumed.pk, empty.pk]).update(created_at=old)
+        abandoned_part, resumed_part, recent_part = part(abandoned.pk, True), part(resumed.pk, False), part(recent.pk, False)
+        orphan_part = part(uuid.uuid4(), True)
+        complete = self._store_photo()
+
+        out = io.StringIO()
+        call_command("expire_pod_uploads", stdout=out)
+
+        self.assertIn("2 subidas y 2 archivos .part borrados", out.getvalue())
+        self.assertEqual(
+            set(PodUpload.objects.values_list("pk", flat=True)), {resumed.pk, recent.pk, complete.pk},
+        )
+        self.assertFalse(os.path.exists(abandoned_part) or os.path.exists(orphan_part))
+        self.assertTrue(os.path.exists(resumed_part) and os.path.exists(recent_part))
+
+    def test_checksum_mismatch_and_non_images_fail(self):
+        upload_id = self.client.post("/api/pod-uploads/", {"size": 4, "checksum": self.checksum}).json()["id"]
+        self.assertEqual(self._patch(upload_id, 0, b"abcd").status_code, 422)
+        upload_id = self.client.post("/api/pod-uploads/", {"size": 4}).json()["id"]
+        self.assertEqual(self._patch(upload_id, 0, b"abcd").status_code, 415)
+        self.assertEqual(PodUpload.objects.filter(status="failed").count(), 2)
+
+        p = Package.objects.create(
+            tracking_number="POD2", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101", status="out_for_delivery", assigned_driver=self.driver,
+        )
+        response = self.client.post("/api/deliveries/sync/", {"driver_id": self.driver.pk, "operations": [{
+            "key": "k1", "op": "confirm", "package_id": p.pk, "gps": {"lat": 25.77, "lon": -80.19},
+            "photos": [{"upload_id": upload_id}],
+        }]}, content_type="application/json")
+        self.assertEqual(response.json()["results"][0]["status"], "invalid")
+        p.refresh_from_db()
+        self.assertEqual(p.status, "out_for_delivery")
@@ -0,0 +1,77 @@
+"""
+Package timeline: events with their driver, delivery attempts and POD photos.
+
+package_timeline() loads it in a fixed number of queries whatever the
+history size (events, attempts, photos: TIMELINE_QUERIES, one less when
+there are no attempts) and caches the loaded instances per package, tagged
+with the package's updated_at. Two things invalidate an entry:
+
+- the bulk writes (bulk_transition, bulk_assign, the import upserts, truck
+  receiving, sync) bulk_create their events without signals, but stamp
+  updated_at on the package, so the tag no longer matches;
+- a PackageEvent, DeliveryAttempt or PodPhoto saved or deleted one by one
+  (confirm/fail, admin, shell) deletes the entry from its post_save /
+  post_delete receiver (packages.signals), now and again on commit so a
+  reader inside the window can't cache the old history for good.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import DeliveryAttempt, PackageEvent, PodPhoto
+
+TIMELINE_QUERIES = 3
+
+
+class Timeline:
+    def __init__(self, events, attempts):
+        self.events = events
+        self.attempts = attempts
+
+    @property
+    def photos(self):
+        return [photo for attempt in self.attempts for photo in attempt.photos.all()]
+
+
+def _cache_key(package_id):
+    return f"packages:timeline:{package_id}"
+
+
+def _version(package):
+    return package.updated_at.timestamp() if package.updated_at else 0
+
+
+def invalidate_timeline(package_id):
+    """Drop the cached timeline of a package whose history changed."""
+    key = _cache_key(package_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def load_timeline(package_id):
+    """The timeline straight from the database, in TIMELINE_QUERIES queries."""
+    events = list(
+        PackageEvent.objects.filter(package_id=package_id)
+        .select_related("driver__user")
+        .order_by("-at_ts", "-id")
+    )
+    attempts = list(
+        DeliveryAttempt.objects.filter(package_id=package_id)
+        .select_related("driver__user")
+        .prefetch_related(Prefetch("photos", queryset=PodPhoto.objects.order_by("taken_at", "id")))
+        .order_by("-attempt_no")
+    )
+    return Timeline(events, attempts)
+
+
+def package_timeline(package):
+    """Cached timeline of `package` (an instance, so its updated_at is already loaded)."""
+    key = _cache_key(package.pk)
+    version = _version(package)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    timeline = load_timeline(package.pk)
+    cache.set(key, (version, timeline), getattr(settings, "TIMELINE_CACHE_TIMEOUT", 3600))
+    return timeline
@@ -0,0 +1,308 @@
+"""
+Resumable, chunked POD photo uploads into content-addressed storage.
+
+Protocol (PodUploadViewSet, /api/pod-uploads/):
+
+- POST {size, checksum}: opens an upload. `checksum` is the photo's hex
+  SHA-256 and optional, but when it's already stored the upload comes back
+  complete and the client sends nothing, so retrying a photo costs no disk
+  I/O. Uploads belong to the user who opened them: for content another
+  user stored, a new complete upload of this user points at the same file.
+  An unfinished upload of the same checksum by the same user is returned
+  to be resumed instead of starting over.
+- PATCH <id> with an Upload-Offset header and the bytes from that offset
+  as body. They are appended to MEDIA_ROOT/pod/partial/<id>.part as they
+  arrive, CHUNK_SIZE at a time, and hashed on the way. A body may carry
+  one chunk or the rest of the file. If the connection drops, whatever was
+  written is kept, and GET <id> says where to resume.
+- After the last byte, the SHA-256 must match the announced one and the
+  header must be JPEG, PNG, WebP or HEIC. The part file is then renamed
+  to pod/sha256/<aa>/<digest><ext>, or just deleted when that content is
+  already stored.
+
+Uploads left unfinished are deleted, with their part files, by the
+expire_pod_uploads command after POD_UPLOAD_EXPIRE_HOURS.
+
+The hash state stays in the worker that received the previous chunk. A
+chunk that lands on another worker, or after a restart, re-reads the part
+file once to rebuild it. A flock on the part file keeps two requests from
+writing the same upload at once.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import PodUpload
+
+CHUNK_SIZE = 64 * 1024
+MAX_BYTES = 25 * 1024 * 1024
+PARTIAL_DIR = "pod/partial"  # relative to MEDIA_ROOT
+STORE_DIR = "pod/sha256"
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+HASHER_CACHE_SIZE = 256
+EXPIRE_HOURS = 24
+
+# upload id -> (offset, sha256 of the bytes before offset)
+_hashers = OrderedDict()
+
+
+class UploadError(ValueError):
+    def __init__(self, detail, status=400, offset=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+        self.offset = offset
+
+
+def sniff_image(head):
+    """(mime type, extension) from the first bytes of a file, or (None, None)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", ".png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"hevc", b"heif", b"mif1", b"msf1"):
+        return "image/heic", ".heic"
+    return None, None
+
+
+def _partial_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f"{upload.pk}.part")
+
+
+def open_upload(user, size, checksum=""):
+    """(upload, created): the upload to send `size` bytes to, or the stored one for `checksum`."""
+    limit = getattr(settings, "POD_UPLOAD_MAX_BYTES", MAX_BYTES)
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size es requerido.")
+    if not 0 < size <= limit:
+        raise UploadError(f"size debe estar entre 1 y {limit} bytes.", status=413 if size > limit else 400)
+    checksum = (checksum or "").lower()
+    if checksum and not SHA256_HEX.fullmatch(checksum):
+        raise UploadError("checksum debe ser el SHA-256 en hexadecimal.")
+    if checksum:
+        stored = (
+            PodUpload.objects.filter(checksum=checksum, status="complete")
+            .order_by(Case(When(created_by=user, then=Value(0)), default=Value(1), output_field=IntegerField()))
+            .first()
+        )
+        if stored is not None and stored.created_by_id == user.pk:
+            return stored, False
+        if stored is not None:
+            # Someone else's upload of the same content: this user gets their own row, same file
+            return PodUpload.objects.create(
+                created_by=user, status="complete", offset=stored.size_bytes,
+                expected_checksum=checksum, completed_at=timezone.now(), **stored.photo_fields(),
+            ), True
+        pending = PodUpload.objects.filter(
+            created_by=user, expected_checksum=checksum, size_bytes=size, status="uploading",
+        ).first()
+        if pending is not None:
+            return pending, False
+    return PodUpload.objects.create(created_by=user, size_bytes=size, expected_checksum=checksum), True
+
+
+def _hasher(upload, offset, f):
+    cached = _hashers.pop(upload.pk, None)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    f.seek(0)
+    remaining = offset
+    while remaining:
+        chunk = f.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            # The part file lost its tail (disk trouble): resume from what is really there
+            PodUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=offset - remaining)
+            raise UploadError("Faltan datos en el servidor; reanudar desde offset.", 409, offset - remaining)
+        hasher.update(chunk)
+        remaining -= len(chunk)
+    return hasher
+
+
+def _remember(upload, offset, hasher):
+    _hashers[upload.pk] = (offset, hasher)
+    while len(_hashers) > HASHER_CACHE_SIZE:
+        _hashers.popitem(last=False)
+
+
+def receive(upload, offset, stream):
+    """
+    Write `stream` (a file-like request body) into `upload` starting at
+    `offset`; returns the upload, complete once its last byte arrived.
+    """
+    if upload.status == "complete":
+        return upload  # retried last chunk: nothing to write
+    if upload.status != "uploading":
+        raise UploadError("La subida falló; hay que empezar otra.", 409)
+    path = _partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Otra petición está subiendo este archivo.", 409, upload.offset)
+        upload.refresh_from_db(fields=["status", "offset"])
+        if upload.status == "complete":
+            return upload
+        if offset != upload.offset:
+            raise UploadError("Upload-Offset no coincide con lo recibido.", 409, upload.offset)
+
+        hasher = _hasher(upload, offset, f)
+        f.seek(offset)
+        received = offset
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if received + len(chunk) > upload.size_bytes:
+                    f.truncate(offset)
+                    raise UploadError("El cuerpo excede el tamaño anunciado.", 413, offset)
+                f.write(chunk)
+                hasher.update(chunk)
+                received += len(chunk)
+        except OSError:
+            pass  # client went away mid-body: keep what arrived, it resumes from there
+        finally:
+            f.flush()
+        f.truncate(received)
+
+        PodUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=received)
+        upload.offset = received
+        if received < upload.size_bytes:
+            _remember(upload, received, hasher)
+            return upload
+        _finish(upload, hasher.hexdigest(), f, path)
+    return upload
+
+
+def _fail(upload, path, detail, status):
+    os.remove(path)
+    upload.status = "failed"
+    upload.save(update_fields=["status"])
+    raise UploadError(detail, status)
+
+
+def _finish(upload, digest, f, path):
+    if upload.expected_checksum and digest != upload.expected_checksum:
+        _fail(upload, path, "El SHA-256 recibido no coincide con checksum.", 422)
+    f.seek(0)
+    mime_type, ext = sniff_image(f.read(16))
+    if mime_type is None:
+        _fail(upload, path, "El archivo no es una imagen JPEG, PNG, WebP o HEIC.", 415)
+    relative = f"{STORE_DIR}/{digest[:2]}/{digest}{ext}"
+    final = os.path.join(settings.MEDIA_ROOT, relative)
+    if os.path.exists(final):
+        os.remove(path)  # same photo already stored
+    else:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(path, final)
+    upload.status = "complete"
+    upload.checksum = digest
+    upload.mime_type = mime_type
+    upload.path_local = relative
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["status", "checksum", "mime_type", "path_local", "completed_at"])
+
+
+def resolve_photos(batches, user):
+    """
+    PodPhoto fields for each list of photo entries in `batches`: entries are
+    {"upload_id"} (fields come from `user`'s finished upload) or the older
+    {"path_local", "checksum"}. One query for all upload ids; a list with an
+    unknown, unfinished, someone else's or malformed entry comes back as None.
+    """
+    ids = set()
+    for entries in batches:
+        for entry in entries:
+            try:
+                ids.add(uuid.UUID(str(entry["upload_id"])))
+            except (KeyError, TypeError, ValueError):
+                pass
+    uploads = (
+        {u.pk: u for u in PodUpload.objects.filter(pk__in=ids, created_by=user, status="complete")} if ids else {}
+    )
+
+    resolved = []
+    for entries in batches:
+        fields = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                fields = None
+                break
+            if entry.get("upload_id"):
+                try:
+                    upload = uploads.get(uuid.UUID(str(entry["upload_id"])))
+                except ValueError:
+                    upload = None
+                if upload is None:
+                    fields = None
+                    break
+                fields.append(upload.photo_fields())
+            elif entry.get("path_local"):
+                fields.append({"path_local": entry["path_local"], "checksum": entry.get("checksum") or ""})
+            else:
+                fields = None
+                break
+        resolved.append(fields)
+    return resolved
+
+
+def _part_files():
+    """{upload id: path} of the part files on disk."""
+    partial_dir = os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR)
+    if not os.path.isdir(partial_dir):
+        return {}
+    parts = {}
+    for name in os.listdir(partial_dir):
+        stem, ext = os.path.splitext(name)
+        try:
+            if ext == ".part":
+                parts[uuid.UUID(stem)] = os.path.join(partial_dir, name)
+        except ValueError:
+            pass
+    return parts
+
+
+def expire_uploads(now=None):
+    """
+    Delete uploads still "uploading" with no bytes received for
+    POD_UPLOAD_EXPIRE_HOURS, with their part files, and part files that old
+    left without an unfinished upload. A part file some request is writing
+    (flocked) is kept, and so is its upload. Returns (uploads, part files)
+    deleted.
+    """
+    cutoff = (now or timezone.now()) - timedelta(hours=getattr(settings, "POD_UPLOAD_EXPIRE_HOURS", EXPIRE_HOURS))
+    parts = _part_files()
+    pending = set(PodUpload.objects.filter(status="uploading", created_at__lt=cutoff).values_list("pk", flat=True))
+    live = set(PodUpload.objects.filter(pk__in=parts, status="uploading").values_list("pk", flat=True))
+    expired = pending - set(parts)  # never received a byte
+    deleted_files = 0
+    for pk, path in parts.items():
+        if pk in live and pk not in pending:
+            continue
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_mtime >= cutoff.timestamp():
+                    continue  # written recently: still being resumed
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.remove(path)
+        except (BlockingIOError, FileNotFoundError):
+            continue  # being written, or finished meanwhile
+        deleted_files += 1
+        if pk in pending:
+            expired.add(pk)
+    deleted, _ = PodUpload.objects.filter(pk__in=expired, status="uploading").delete()
+    return deleted, deleted_files
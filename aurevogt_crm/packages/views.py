@@ -1,17 +1,31 @@
+import csv
+import io
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS, BasePermission
 from rest_framework import filters
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q
-from .models import Package, DeliveryAttempt, PodPhoto, PackageEvent
-from .serializers import PackageSerializer, DeliveryAttemptSerializer
+from .models import VALID_NEXT_STATUS, Package, DeliveryAttempt, PodPhoto, PodUpload
+from .serializers import PackageSerializer, DeliveryAttemptSerializer, TimelineSerializer
+from core.mixins import ConditionalGetMixin, ValuesListMixin
+from core.pagination import KeysetPagination, InvalidCursor, estimated_count, keyset_page
+from .exports import stream_csv
+from .search import search_packages
+from .services import bulk_assign, bulk_transition, next_attempt_no
+from .sync import SyncError, apply_sync
+from .timeline import package_timeline
+from .uploads import UploadError, open_upload, receive, resolve_photos
 
 class CanEditPackages(BasePermission):
     """Allow writes only to staff/superuser or users with packages change permission."""
@@ -27,14 +41,41 @@ class CanEditPackages(BasePermission):
             )
         )
 
-class PackageViewSet(viewsets.ModelViewSet):
+class PackageCSVRenderer(BaseRenderer):
+    """
+    Lets ?format=csv / Accept: text/csv negotiate on the list action, which
+    streams the export itself. Only error responses are rendered here, as
+    one "field,message" row per message.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for field, messages in (data.items() if isinstance(data, dict) else [('detail', data)]):
+            for message in (messages if isinstance(messages, list) else [messages]):
+                writer.writerow([field, message])
+        return out.getvalue().encode('utf-8')
+
+class PackageSearchFilter(filters.SearchFilter):
+    """?search= through the package search index instead of icontains on search_fields."""
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        return search_packages(queryset, terms) if terms else queryset
+
+class PackageViewSet(ConditionalGetMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Package.objects.all().order_by('-created_at')
     serializer_class = PackageSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, PackageCSVRenderer]
+    pagination_class = KeysetPagination
     filterset_fields = ['status','assigned_driver','addr_zip','addr_city','warehouse']
     search_fields = ['tracking_number','recipient_name','customer_phone']
     ordering_fields = ['created_at','promised_date','priority']
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, PackageSearchFilter, filters.OrderingFilter]
 
     def get_permissions(self):
         # Only privileged users can modify or assign
@@ -42,6 +83,28 @@ class PackageViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), CanEditPackages()]
         return [IsAuthenticated()]
 
+    def get_renderers(self):
+        # CSV is the list export only: ?format=csv elsewhere is a 404, Accept: text/csv a 406
+        renderers = super().get_renderers()
+        if self.action != 'list':
+            renderers = [r for r in renderers if not isinstance(r, PackageCSVRenderer)]
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        # ?format=csv: the whole filtered queryset, unpaginated, streamed row by row
+        if request.accepted_renderer.format == 'csv':
+            return stream_csv(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """Eventos, intentos y fotos POD del paquete (ver packages.timeline)."""
+        p = self.get_object()
+        return Response({
+            'id': p.pk, 'tracking_number': p.tracking_number, 'status': p.status,
+            **TimelineSerializer(package_timeline(p), context=self.get_serializer_context()).data,
+        })
+
     @action(detail=False, methods=['post'])
     def assign(self, request):
         """
@@ -53,11 +116,7 @@ class PackageViewSet(viewsets.ModelViewSet):
         if not driver_id or not isinstance(ids, list) or not ids:
             return Response({'detail': 'driver_id y package_ids[] son requeridos.'}, status=status.HTTP_400_BAD_REQUEST)
         driver = get_object_or_404(Driver, id=driver_id)
-        now = timezone.now()
-        qs = Package.objects.filter(id__in=ids)
-        updated = qs.update(assigned_driver=driver, assigned_at=now)
-        for p in qs:
-            PackageEvent.objects.create(package=p, type='assigned', status_from=p.status, status_to=p.status, driver=driver)
+        updated = bulk_assign(Package.objects.filter(id__in=ids), driver, request.user)
         return Response({'assigned': updated})
 
     @action(detail=False, methods=['post'])
@@ -78,42 +137,44 @@ class PackageViewSet(viewsets.ModelViewSet):
             qs = qs.filter(addr_zip=zipcode)
         if city:
             qs = qs.filter(addr_city__iexact=city)
-        now = timezone.now()
-        ids = list(qs.values_list('id', flat=True))
-        if not ids:
-            return Response({'assigned_count': 0})
-        qs.update(assigned_driver=driver, assigned_at=now)
-        for p in Package.objects.filter(id__in=ids):
-            PackageEvent.objects.create(package=p, type='assigned', status_from=p.status, status_to=p.status, driver=driver)
-        return Response({'assigned_count': len(ids)})
+        # Conditional on assigned_driver IS NULL: concurrent dispatchers never take the same package
+        return Response({'assigned_count': bulk_assign(qs, driver, request.user)})
 
 class DeliveryViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
         # Only privileged users can mutate delivery state
-        if self.action in ['start_route', 'confirm', 'fail']:
+        if self.action in ['start_route', 'confirm', 'fail', 'sync']:
             return [IsAuthenticated(), CanEditPackages()]
         return [IsAuthenticated()]
 
     @action(detail=False, methods=['post'])
     def start_route(self, request):
-        # marca OFD para todos los paquetes asignados a un driver en fecha
+        """
+        Marca OFD los paquetes asignados a un driver (`driver_id`) o a varios
+        a la vez (`driver_ids`, arranque del día). Los que la FSM no permite
+        mover se devuelven en `rejected` por estado.
+        """
         from drivers.models import Driver
-        driver = get_object_or_404(Driver, id=request.data.get('driver_id'))
-        now = timezone.now()
-        qs = driver.assigned_packages.filter(status__in=['in_warehouse','received'])
-        if not qs.exists():
-            return Response({'ofded': 0})
-        for p in qs:
-            PackageEvent.objects.create(package=p, type='ofd', status_from=p.status, status_to='out_for_delivery', driver=driver)
-        qs.update(status='out_for_delivery', out_for_delivery_at=now)
-        return Response({'ofded': qs.count()})
+        driver_ids = request.data.get('driver_ids')
+        if driver_ids:
+            if not isinstance(driver_ids, list):
+                return Response({'detail': 'driver_ids debe ser una lista'}, status=status.HTTP_400_BAD_REQUEST)
+            drivers = list(Driver.objects.filter(id__in=driver_ids).values_list('id', flat=True))
+            missing = sorted(set(map(str, driver_ids)) - set(map(str, drivers)))
+            if missing:
+                return Response({'detail': f'Drivers inexistentes: {", ".join(missing)}'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            drivers = [get_object_or_404(Driver, id=request.data.get('driver_id')).id]
+        qs = Package.objects.filter(assigned_driver_id__in=drivers, status__in=['in_warehouse', 'received'])
+        result = bulk_transition(qs, 'out_for_delivery', request.user)
+        return Response({'ofded': sum(result['transitioned'].values()), **result})
 
     @action(detail=False, methods=['post'])
     def confirm(self, request):
         """
-        Body: { package_id, photos:[{path_local, checksum}], gps:{lat,lon}, notes }
+        Body: { package_id, photos:[{upload_id} | {path_local, checksum}], gps:{lat,lon}, notes }
         """
         p = get_object_or_404(Package, id=request.data.get('package_id'))
         from drivers.models import Driver
@@ -124,26 +185,35 @@ class DeliveryViewSet(viewsets.ViewSet):
         gps = request.data.get('gps') or {}
         if 'lat' not in gps or 'lon' not in gps:
             return Response({'detail': 'gps.lat y gps.lon son requeridos'}, status=status.HTTP_400_BAD_REQUEST)
-        attempt_no = p.attempt_count + 1
-        att = DeliveryAttempt.objects.create(
-            package=p, driver=driver, attempt_no=attempt_no,
-            result='delivered', lat=gps['lat'], lon=gps['lon']
-        )
-        for ph in request.data.get('photos', []):
-            PodPhoto.objects.create(package=p, attempt=att, path_local=ph['path_local'], checksum=ph.get('checksum',''))
-        p.status = 'delivered'
-        p.delivered_at = timezone.now()
-        p.attempt_count = attempt_no
-        p.last_event_at = timezone.now()
-        p.save(update_fields=['status','delivered_at','attempt_count','last_event_at'])
-        PackageEvent.objects.create(package=p, type='delivered', status_from='out_for_delivery', status_to='delivered', driver=driver,
-                                    lat=att.lat, lon=att.lon, notes=request.data.get('notes',''))
-        return Response({'ok': True})
+        photos = resolve_photos([request.data.get('photos') or []], request.user)[0]
+        if photos is None:
+            return Response({'detail': 'photos: subida inexistente o incompleta, o falta path_local.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Numerar, insertar el intento y guardar el paquete en una transacción corta:
+        # un doble toque o un despachador en paralelo esperan y toman el número siguiente
+        with transaction.atomic():
+            attempt_no = next_attempt_no(p)
+            # Con el estado ya releído bajo el bloqueo: un doble toque llega aquí como 'delivered'
+            if 'delivered' not in VALID_NEXT_STATUS.get(p.status, ()):
+                transaction.set_rollback(True)
+                return Response({'detail': f'Transición no permitida: {p.status} → delivered.'}, status=status.HTTP_409_CONFLICT)
+            att = DeliveryAttempt.objects.create(
+                package=p, driver=driver, attempt_no=attempt_no,
+                result='delivered', lat=gps['lat'], lon=gps['lon']
+            )
+            for ph in photos:
+                PodPhoto.objects.create(package=p, attempt=att, **ph)
+            p.status = 'delivered'
+            p.delivered_at = timezone.now()
+            p.last_event_at = timezone.now()
+            # El signal registra el evento de la transición (uno solo, con GPS y notas)
+            p.log_transition_as('delivered', driver=driver, lat=att.lat, lon=att.lon, notes=request.data.get('notes',''))
+            p.save(update_fields=['status','delivered_at','attempt_count','last_event_at'])
+        return Response({'ok': True, 'attempt_no': attempt_no})
 
     @action(detail=False, methods=['post'])
     def fail(self, request):
         """
-        Body: { package_id, reason_code, gps:{lat,lon}, photos:[{path_local}] }
+        Body: { package_id, reason_code, gps:{lat,lon}, photos:[{upload_id} | {path_local}] }
         """
         p = get_object_or_404(Package, id=request.data.get('package_id'))
         from drivers.models import Driver
@@ -154,31 +224,104 @@ class DeliveryViewSet(viewsets.ViewSet):
         gps = request.data.get('gps') or {}
         if 'lat' not in gps or 'lon' not in gps:
             return Response({'detail': 'gps.lat y gps.lon son requeridos'}, status=status.HTTP_400_BAD_REQUEST)
+        photos = resolve_photos([request.data.get('photos') or []], request.user)[0]
+        if photos is None:
+            return Response({'detail': 'photos: subida inexistente o incompleta, o falta path_local.'}, status=status.HTTP_400_BAD_REQUEST)
         reason_code = request.data.get('reason_code')
         if not reason_code:
             return Response({'detail': 'reason_code es requerido'}, status=status.HTTP_400_BAD_REQUEST)
-        attempt_no = p.attempt_count + 1
-        att = DeliveryAttempt.objects.create(
-            package=p, driver=driver, attempt_no=attempt_no,
-            result='failed', reason_code=reason_code,
-            lat=gps['lat'], lon=gps['lon']
-        )
-        for ph in request.data.get('photos', []):
-            PodPhoto.objects.create(package=p, attempt=att, path_local=ph['path_local'])
-        p.status = 'failed_attempt'
-        p.attempt_count = attempt_no
-        p.last_event_at = timezone.now()
-        p.save(update_fields=['status','attempt_count','last_event_at'])
-        PackageEvent.objects.create(package=p, type='failed', status_from='out_for_delivery', status_to='failed_attempt', driver=driver,
-                                    lat=att.lat, lon=att.lon, notes=request.data.get('notes',''))
-        return Response({'ok': True})
+        with transaction.atomic():
+            attempt_no = next_attempt_no(p)
+            if 'failed_attempt' not in VALID_NEXT_STATUS.get(p.status, ()):
+                transaction.set_rollback(True)
+                return Response({'detail': f'Transición no permitida: {p.status} → failed_attempt.'}, status=status.HTTP_409_CONFLICT)
+            att = DeliveryAttempt.objects.create(
+                package=p, driver=driver, attempt_no=attempt_no,
+                result='failed', reason_code=reason_code,
+                lat=gps['lat'], lon=gps['lon']
+            )
+            for ph in photos:
+                PodPhoto.objects.create(package=p, attempt=att, **ph)
+            p.status = 'failed_attempt'
+            p.last_event_at = timezone.now()
+            p.log_transition_as('failed', driver=driver, lat=att.lat, lon=att.lon, notes=request.data.get('notes',''))
+            p.save(update_fields=['status','attempt_count','last_event_at'])
+        return Response({'ok': True, 'attempt_no': attempt_no})
+
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Body: { driver_id, operations: [{ key, op: "confirm"|"fail", package_id, gps:{lat,lon},
+                notes, reason_code, photos:[{upload_id} | {path_local, checksum}] }, ...] }
+        Cola offline del conductor en una sola transacción; las key ya aplicadas
+        devuelven su resultado original sin volver a escribir (ver packages.sync).
+        """
+        from drivers.models import Driver
+        driver = get_object_or_404(Driver, id=request.data.get('driver_id'))
+        try:
+            results = apply_sync(driver, request.data.get('operations'), request.user)
+        except SyncError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results})
+
+
+class PodUploadViewSet(viewsets.ViewSet):
+    """
+    Subida reanudable de fotos POD (protocolo en packages.uploads):
+    POST {size, checksum} abre o reutiliza, PATCH con Upload-Offset y los
+    bytes desde ahí, GET para saber dónde seguir. La subida completa se usa
+    en confirm/fail/sync como photos:[{upload_id}].
+    """
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[0-9a-fA-F-]{36}'
+
+    def _payload(self, upload):
+        return {
+            'id': str(upload.pk), 'status': upload.status, 'size_bytes': upload.size_bytes,
+            'offset': upload.offset, 'checksum': upload.checksum or None,
+            'mime_type': upload.mime_type or None, 'url': upload.url,
+        }
+
+    def _error(self, e):
+        body = {'detail': e.detail}
+        if e.offset is not None:
+            body['offset'] = e.offset
+        return Response(body, status=e.status)
+
+    def _get(self, request, pk):
+        # Cada subida es de quien la abrió (open_upload le da la suya aunque el archivo sea compartido)
+        return get_object_or_404(PodUpload, pk=pk, created_by=request.user)
+
+    def create(self, request):
+        try:
+            upload, created = open_upload(request.user, request.data.get('size'), request.data.get('checksum'))
+        except UploadError as e:
+            return self._error(e)
+        return Response(self._payload(upload), status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def retrieve(self, request, pk=None):
+        return Response(self._payload(self._get(request, pk)))
+
+    def partial_update(self, request, pk=None):
+        upload = self._get(request, pk)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({'detail': 'Upload-Offset es requerido.', 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # El cuerpo se lee del request de Django a medida que llega, sin parsers de DRF
+            upload = receive(upload, offset, request._request)
+        except UploadError as e:
+            return self._error(e)
+        return Response(self._payload(upload))
 
 # =========  Vistas HTML (CBV) =========
 class PackageListView(LoginRequiredMixin, ListView):
     model = Package
     template_name = 'packages/package_list.html'
     context_object_name = 'packages'
-    paginate_by = 25
+    page_size = 25
+    filter_params = ('q', 'status', 'zip', 'city')
 
     def get_queryset(self):
         qs = Package.objects.all().select_related('assigned_driver', 'warehouse').order_by('-created_at')
@@ -187,11 +330,7 @@ class PackageListView(LoginRequiredMixin, ListView):
         zip_f = self.request.GET.get('zip')
         city_f = self.request.GET.get('city')
         if q:
-            qs = qs.filter(
-                Q(tracking_number__icontains=q)
-                | Q(recipient_name__icontains=q)
-                | Q(customer_phone__icontains=q)
-            )
+            qs = search_packages(qs, q)
         if status_f:
             qs = qs.filter(status=status_f)
         if zip_f:
@@ -200,11 +339,42 @@ class PackageListView(LoginRequiredMixin, ListView):
             qs = qs.filter(addr_city__icontains=city_f)
         return qs
 
+    def get_context_data(self, **kwargs):
+        # Paginación por keyset (?cursor=): sin COUNT ni OFFSET, cualquier página cuesta lo mismo
+        try:
+            page = keyset_page(self.object_list, 'created_at', self.request.GET.get('cursor'), self.page_size)
+        except InvalidCursor:
+            raise Http404('Cursor inválido')
+        context = super().get_context_data(object_list=page.items, **kwargs)
+        context['next_url'] = self._page_url(page.next_cursor)
+        context['previous_url'] = self._page_url(page.previous_cursor)
+        filtered = any(self.request.GET.get(p) for p in self.filter_params)
+        context['estimated_total'] = None if filtered else estimated_count(Package)
+        return context
+
+    def _page_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return '?' + params.urlencode()
+
 class PackageDetailView(LoginRequiredMixin, DetailView):
     model = Package
     template_name = 'packages/package_detail.html'
     context_object_name = 'package'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('warehouse', 'assigned_driver__user')
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        timeline = package_timeline(self.object)
+        ctx['events'] = timeline.events
+        ctx['attempts'] = timeline.attempts
+        ctx['pod_photos'] = timeline.photos
+        return ctx
+
 class PackageCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     model = Package
     permission_required = 'packages.add_package'
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_inventory_counters(sender, using, **kwargs):
+    from .counters import install
+    install(using)
 
 
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        post_migrate.connect(install_inventory_counters, sender=self)
@@ -0,0 +1,172 @@
+"""
+Contadores de inventario por (almacén, estado, zip, ciudad).
+
+Triggers sobre packages_package mantienen reports_inventorycounter en la
+misma transacción que cualquier escritura: save() y delete(), los upserts
+del import, bulk_transition, la recepción de camiones y cualquier
+queryset.update(). Así los reportes leen unas pocas filas de contadores en
+vez de hacer GROUP BY sobre todos los paquetes.
+
+- SQLite: triggers por fila; el de UPDATE sólo actúa si cambia alguna columna
+  de la clave, así que asignar o tocar last_event_at o updated_at no escribe
+  contadores.
+- PostgreSQL: triggers por sentencia con tablas de transición, un único
+  upsert agregado por UPDATE/INSERT masivo.
+
+install() es idempotente y corre en post_migrate (el rebuild de tablas de
+SQLite borra los triggers); si faltaba alguno, reconcilia.
+"""
+import logging
+
+from django.db import connections, transaction
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+TABLE = "reports_inventorycounter"
+KEY = "warehouse_key, status, addr_zip, addr_city"
+
+
+def _key(row):
+    return f"coalesce({row}.warehouse_id, 0), {row}.status, {row}.addr_zip, {row}.addr_city"
+
+
+def _sqlite_add(row, delta):
+    return (
+        f"INSERT INTO {TABLE} ({KEY}, count) VALUES ({_key(row)}, {delta}) "
+        f"ON CONFLICT ({KEY}) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+_SQLITE_TRIGGERS = {
+    f"{TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON packages_package BEGIN
+            {_sqlite_add("new", 1)}
+        END""",
+    f"{TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE ON packages_package
+        WHEN old.warehouse_id IS NOT new.warehouse_id OR old.status IS NOT new.status
+            OR old.addr_zip IS NOT new.addr_zip OR old.addr_city IS NOT new.addr_city
+        BEGIN
+            {_sqlite_add("old", -1)}
+            {_sqlite_add("new", 1)}
+        END""",
+    f"{TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON packages_package BEGIN
+            {_sqlite_add("old", -1)}
+        END""",
+}
+
+_PG_DELTAS = {
+    "INSERT": f"SELECT {_key('r')}, 1 FROM new_rows r",
+    "DELETE": f"SELECT {_key('r')}, -1 FROM old_rows r",
+    "UPDATE": f"SELECT {_key('r')}, 1 FROM new_rows r UNION ALL SELECT {_key('r')}, -1 FROM old_rows r",
+}
+
+_PG_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {TABLE}_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO {TABLE} AS c ({KEY}, count)
+        SELECT w, s, z, ci, sum(n) FROM ({_PG_DELTAS["INSERT"]}) AS d (w, s, z, ci, n) GROUP BY 1, 2, 3, 4
+        ON CONFLICT ({KEY}) DO UPDATE SET count = c.count + excluded.count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO {TABLE} AS c ({KEY}, count)
+        SELECT w, s, z, ci, sum(n) FROM ({_PG_DELTAS["DELETE"]}) AS d (w, s, z, ci, n) GROUP BY 1, 2, 3, 4
+        ON CONFLICT ({KEY}) DO UPDATE SET count = c.count + excluded.count;
+    ELSE
+        -- Filas cuya clave no cambió se anulan (+1 -1) y no escriben nada
+        INSERT INTO {TABLE} AS c ({KEY}, count)
+        SELECT w, s, z, ci, sum(n) FROM ({_PG_DELTAS["UPDATE"]}) AS d (w, s, z, ci, n) GROUP BY 1, 2, 3, 4
+        HAVING sum(n) <> 0
+        ON CONFLICT ({KEY}) DO UPDATE SET count = c.count + excluded.count;
+    END IF;
+    RETURN NULL;
+END
+$$"""
+
+_PG_TRIGGERS = {
+    f"{TABLE}_ai": "AFTER INSERT ON packages_package REFERENCING NEW TABLE AS new_rows",
+    f"{TABLE}_au": "AFTER UPDATE ON packages_package REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    f"{TABLE}_ad": "AFTER DELETE ON packages_package REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def _missing_triggers(connection, cursor, names):
+    if connection.vendor == "sqlite":
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'packages_package'")
+    else:
+        cursor.execute("SELECT tgname FROM pg_trigger WHERE tgrelid = 'packages_package'::regclass")
+    return set(names) - {name for (name,) in cursor.fetchall()}
+
+
+def install(using="default"):
+    """Crea los triggers que falten; si faltaba alguno, reconcilia los contadores."""
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        triggers = _SQLITE_TRIGGERS
+    elif connection.vendor == "postgresql":
+        triggers = _PG_TRIGGERS
+    else:
+        logger.warning("Inventory counters are not maintained on %s; run reconcile_inventory_counters", connection.vendor)
+        return
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        missing = _missing_triggers(connection, cursor, triggers)
+        if not missing:
+            return
+        if connection.vendor == "postgresql":
+            cursor.execute(_PG_FUNCTION)
+        for name in missing:
+            if connection.vendor == "sqlite":
+                cursor.execute(triggers[name])
+            else:
+                cursor.execute(f"CREATE TRIGGER {name} {triggers[name]} FOR EACH STATEMENT EXECUTE FUNCTION {TABLE}_apply()")
+        reconcile(using)
+
+
+def reconcile(using="default", *, dry_run=False):
+    """
+    Recalcula los contadores con un GROUP BY sobre packages_package y corrige
+    los que difieran. Devuelve {clave: (contador, real)} de lo que estaba mal.
+    """
+    from packages.models import Package
+    from .models import InventoryCounter
+
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == "postgresql":
+            # Nadie escribe paquetes mientras se compara (los triggers moverían los contadores)
+            with connection.cursor() as cursor:
+                cursor.execute("LOCK TABLE packages_package IN SHARE MODE")
+        actual = {}
+        rows = (
+            Package.objects.using(using).order_by()
+            .values_list("warehouse_id", "status", "addr_zip", "addr_city")
+            .annotate(n=Count("id"))
+        )
+        for warehouse_id, status, zip_, city, n in rows:
+            actual[(warehouse_id or 0, status, zip_, city)] = n
+        stored = {
+            (c.warehouse_key, c.status, c.addr_zip, c.addr_city): c
+            for c in InventoryCounter.objects.using(using).select_for_update()
+        }
+        drift = {}
+        for key in stored.keys() | actual.keys():
+            have = stored[key].count if key in stored else 0
+            if have != actual.get(key, 0):
+                drift[key] = (have, actual.get(key, 0))
+        if dry_run:
+            return drift
+        # Las claves a cero se borran: así la tabla no crece con combinaciones ya vacías
+        InventoryCounter.objects.using(using).filter(
+            pk__in=[c.pk for key, c in stored.items() if key not in actual]
+        ).delete()
+        fixed = [
+            InventoryCounter(warehouse_key=k[0], status=k[1], addr_zip=k[2], addr_city=k[3], count=actual[k])
+            for k in drift if k in actual
+        ]
+        InventoryCounter.objects.using(using).bulk_create(
+            fixed, update_conflicts=True,
+            unique_fields=["warehouse_key", "status", "addr_zip", "addr_city"], update_fields=["count"],
+        )
+    return drift
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reports.counters import install, reconcile
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de inventario (almacén/estado/zip/ciudad) y corrige desvíos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Sólo muestra los desvíos; no corrige nada")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **opts):
+        if not opts["dry_run"]:
+            install(opts["database"])  # recrea triggers que falten antes de corregir
+        drift = reconcile(opts["database"], dry_run=opts["dry_run"])
+        for (warehouse_key, status, zip_, city), (have, actual) in sorted(drift.items()):
+            self.stdout.write(f"  almacén {warehouse_key} {status} {zip_} {city}: {have} -> {actual}")
+        verb = "con desvío" if opts["dry_run"] else "corregidos"
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} contadores {verb}"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('warehouse_key', models.BigIntegerField(default=0)),
+                ('status', models.CharField(max_length=32)),
+                ('addr_zip', models.CharField(max_length=16)),
+                ('addr_city', models.CharField(max_length=80)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('warehouse_key', 'status', 'addr_zip', 'addr_city'), name='reports_inventorycounter_key')],
+            },
+        ),
+    ]
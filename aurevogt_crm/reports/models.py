@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class InventoryCounter(models.Model):
+    """
+    Paquetes por (almacén, estado, zip, ciudad). Lo mantienen triggers sobre
+    packages_package (ver reports.counters) dentro de la misma transacción que
+    cada escritura; `reconcile_inventory_counters` corrige cualquier desvío.
+    """
+    warehouse_key = models.BigIntegerField(default=0)  # Warehouse.pk; 0 = sin almacén
+    status = models.CharField(max_length=32)
+    addr_zip = models.CharField(max_length=16)
+    addr_city = models.CharField(max_length=80)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["warehouse_key", "status", "addr_zip", "addr_city"], name="reports_inventorycounter_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.warehouse_key}/{self.status}/{self.addr_zip}/{self.addr_city}: {self.count}"
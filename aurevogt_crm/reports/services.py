@@ -1,11 +1,38 @@
-from django.db.models import Count
-from packages.models import Package
+from django.db.models import Sum
 
-def inventory_by_status():
-    return Package.objects.values("status").annotate(n=Count("id")).order_by("-n")
+from .models import InventoryCounter
 
-def inventory_by_zip():
-    return Package.objects.values("addr_zip","status").annotate(n=Count("id")).order_by("addr_zip","status")
+# Los inventarios leen los contadores (reports.counters), no la tabla de paquetes:
+# el costo depende de cuántas combinaciones almacén/estado/zip/ciudad hay, no de cuántos paquetes.
 
-def inventory_by_city():
-    return Package.objects.values("addr_city","status").annotate(n=Count("id")).order_by("addr_city","status")
\ No newline at end of file
+
+def _counters(warehouse=None):
+    qs = InventoryCounter.objects.filter(count__gt=0)
+    if warehouse is not None:
+        qs = qs.filter(warehouse_key=getattr(warehouse, "pk", warehouse))
+    return qs
+
+
+def inventory_by_status(warehouse=None):
+    return _counters(warehouse).values("status").annotate(n=Sum("count")).order_by("-n")
+
+def inventory_by_zip(warehouse=None):
+    return _counters(warehouse).values("addr_zip","status").annotate(n=Sum("count")).order_by("addr_zip","status")
+
+def inventory_by_city(warehouse=None):
+    return _counters(warehouse).values("addr_city","status").annotate(n=Sum("count")).order_by("addr_city","status")
+
+def inventory_kpis(warehouse=None):
+    """Totales para el dashboard: paquetes activos, en ruta, entregados y % de éxito."""
+    by_status = {row["status"]: row["n"] for row in inventory_by_status(warehouse)}
+    delivered = by_status.get("delivered", 0)
+    failed = by_status.get("failed_attempt", 0)
+    closed = ("delivered", "returned", "cancelled")
+    return {
+        "total": sum(by_status.values()),
+        "active": sum(n for status, n in by_status.items() if status not in closed),
+        "ofd": by_status.get("out_for_delivery", 0),
+        "delivered": delivered,
+        "failed": failed,
+        "success_rate": 100.0 * delivered / (delivered + failed) if delivered + failed else 0.0,
+    }
@@ -1,3 +1,67 @@
+import csv
+import io
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from drivers.models import Driver
+from imports import receiving
+from imports.models import ImportBatch, TruckReceipt, TruckReceiptItem
+from imports.services import PackageUpserter
+from packages.models import Package, Warehouse
+from packages.services import bulk_assign, bulk_transition
+from .counters import reconcile
+from .models import InventoryCounter
+
+MANIFEST = (
+    "tracking_number,recipient_name,addr_street,addr_city,addr_zip\n"
+    "INV1,Cliente,1 Main St,Tampa,33602\n"
+    "INV2,Cliente,2 Main St,Miami,33101\n"
+    "INV3,Cliente,3 Main St,Miami,33101\n"
+)
+
+
+class InventoryCounterTests(TestCase):
+    """Los triggers dejan los contadores igual que el GROUP BY de reconcile tras cada tipo de escritura."""
+
+    def assertInSync(self):
+        self.assertEqual(reconcile(dry_run=True), {})
+
+    def test_counters_follow_every_write_path(self):
+        warehouse = Warehouse.objects.create(name="Doral")
+        driver = Driver.objects.create(user=User.objects.create_user("ana"), license_number="L-1")
+
+        p = Package.objects.create(
+            tracking_number="INV1", recipient_name="Cliente", addr_street="1 Main St",
+            addr_city="Miami", addr_zip="33101",
+        )
+        self.assertInSync()
+
+        # Upsert del import: actualiza INV1 (cambia de ciudad) y crea INV2/INV3 como recibidos
+        batch = ImportBatch.objects.create(source="speedx_csv", status="processing")
+        upserter = PackageUpserter(batch, status="received")
+        for n, row in enumerate(csv.DictReader(io.StringIO(MANIFEST)), start=1):
+            upserter.feed(n, row)
+        upserter.close()
+        self.assertInSync()
+
+        receipt = TruckReceipt.objects.create(code="TRK-1", warehouse=warehouse)
+        for tracking in ("INV2", "INV3"):
+            TruckReceiptItem.objects.create(receipt=receipt, tracking_number=tracking)
+        receiving.scan_batch(receipt, ["INV2", "INV3"])
+        self.assertInSync()
+
+        bulk_transition(Package.objects.filter(tracking_number="INV2"), "out_for_delivery")
+        bulk_assign(Package.objects.all(), driver)  # no toca la clave: no escribe contadores
+        self.assertInSync()
+
+        Package.objects.filter(tracking_number="INV3").update(addr_city="Hialeah", addr_zip="33010")
+        p.delete()
+        self.assertInSync()
+        self.assertEqual(
+            {(c.warehouse_key, c.status, c.addr_zip, c.addr_city): c.count for c in InventoryCounter.objects.filter(count__gt=0)},
+            {
+                (warehouse.pk, "out_for_delivery", "33101", "Miami"): 1,
+                (warehouse.pk, "in_warehouse", "33010", "Hialeah"): 1,
+            },
+        )